@@ -0,0 +1,185 @@
+"""
+Loss-ratio and claim-frequency analytics for a user's book.
+
+The database does the heavy lifting: three GROUP BY queries return premiums,
+claims (accidents) and paid amounts per (vehicle type, model year, policy type)
+cell, and two more return monthly accident counts and payouts. The few hundred
+cells are then combined and rolled up per dimension with NumPy. Results are
+cached per user, data version (see insapp.fragments), window and day.
+"""
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, QuerySet, Sum
+from django.db.models.functions import TruncMonth
+
+from .fragments import data_version
+from .models import Accident, Payment, Policy
+from .search import TIME_RANGES
+
+# Policy cohorts by start date; "all" is the whole book.
+WINDOWS = TIME_RANGES + ("all",)
+DEFAULT_WINDOW = "365"
+MODEL_YEAR_BAND = 5
+CACHE_KEY = "analytics:v2:{user_id}:{version}:{window}:{today}"
+
+# (vehicle type, model year, policy type) as reached from each source table.
+_CELL = {
+    Policy: ("vehicle__vehicle_type", "vehicle__model_year", "policy_type"),
+    Accident: ("policy__vehicle__vehicle_type", "policy__vehicle__model_year", "policy__policy_type"),
+    Payment: ("policy__vehicle__vehicle_type", "policy__vehicle__model_year", "policy__policy_type"),
+}
+
+
+def _since(window: str, today: date) -> Optional[date]:
+    return today - timedelta(days=int(window)) if window in TIME_RANGES else None
+
+
+def cell_queries(user_id: int, since: Optional[date]) -> Dict[str, QuerySet]:
+    """GROUP BY cell queries: policy count and premium, claim count, paid amount."""
+    policies = Policy.objects.filter(user_id=user_id)
+    accidents = Accident.objects.filter(policy__user_id=user_id)
+    payments = Payment.objects.filter(policy__user_id=user_id)
+    if since:
+        policies = policies.filter(start_date__gte=since)
+        accidents = accidents.filter(policy__start_date__gte=since)
+        payments = payments.filter(policy__start_date__gte=since)
+    return {
+        "policies": policies.values_list(*_CELL[Policy]).annotate(Count("id"), Sum("premium_amount")).order_by(),
+        "claims": accidents.values_list(*_CELL[Accident]).annotate(Count("id")).order_by(),
+        "paid": payments.values_list(*_CELL[Payment]).annotate(Sum("amount")).order_by(),
+    }
+
+
+def monthly_queries(user_id: int, since: Optional[date], today: date) -> Dict[str, QuerySet]:
+    """GROUP BY month queries: accident count by accident date, paid amount by payment date."""
+    accidents = Accident.objects.filter(owner__user_id=user_id, date_of_accident__lte=today)
+    payments = Payment.objects.filter(user_id=user_id, payment_date__lte=today)
+    if since:
+        accidents = accidents.filter(date_of_accident__gte=since)
+        payments = payments.filter(payment_date__gte=since)
+    return {
+        "accidents": accidents.annotate(month=TruncMonth("date_of_accident"))
+                              .values_list("month").annotate(Count("id")).order_by(),
+        "paid": payments.annotate(month=TruncMonth("payment_date"))
+                        .values_list("month").annotate(Sum("amount")).order_by(),
+    }
+
+
+def _cells(user_id: int, since: Optional[date]) -> Dict[str, np.ndarray]:
+    """Per-cell policy count, premium, claim count and paid amount as parallel arrays."""
+    index: Dict[Tuple, int] = {}
+    columns: Dict[str, List] = {"policies": [], "premium": [], "claims": [], "paid": []}
+    for name, rows in cell_queries(user_id, since).items():
+        for row in rows:
+            position = index.setdefault(row[:3], len(index))
+            for column in columns.values():
+                column.extend([0.0] * (len(index) - len(column)))
+            if name == "policies":
+                columns["policies"][position], columns["premium"][position] = row[3], float(row[4] or 0)
+            else:
+                columns[name][position] = float(row[3] or 0)
+
+    keys = list(index)
+    return {
+        "vehicle_type": np.array([key[0] for key in keys], dtype=object),
+        "model_year": np.array([key[1] for key in keys], dtype=np.int64),
+        "policy_type": np.array([key[2] for key in keys], dtype=object),
+        **{name: np.array(values, dtype=np.float64) for name, values in columns.items()},
+    }
+
+
+def _ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    return np.divide(numerator, denominator, out=np.zeros_like(numerator), where=denominator > 0)
+
+
+def _rollup(labels: np.ndarray, cells: Dict[str, np.ndarray]) -> List[Dict]:
+    """Sum the measures per distinct label and derive claim frequency and loss ratio."""
+    if not len(labels):
+        return []
+    keys, inverse = np.unique(labels, return_inverse=True)
+    sums = {name: np.bincount(inverse, weights=cells[name], minlength=len(keys))
+            for name in ("policies", "premium", "claims", "paid")}
+    frequency = _ratio(sums["claims"], sums["policies"])
+    loss_ratio = _ratio(sums["paid"], sums["premium"])
+    return [
+        {
+            "key": str(keys[i]),
+            "policies": int(sums["policies"][i]),
+            "claims": int(sums["claims"][i]),
+            "premium": round(float(sums["premium"][i]), 2),
+            "paid": round(float(sums["paid"][i]), 2),
+            "claim_frequency": round(float(frequency[i]), 4),
+            "loss_ratio": round(float(loss_ratio[i]), 4),
+        }
+        for i in range(len(keys))
+    ]
+
+
+def _monthly(user_id: int, since: Optional[date], today: date) -> List[Dict]:
+    """Accidents and payouts per calendar month, with empty months filled in."""
+    queries = monthly_queries(user_id, since, today)
+    accident_rows, payment_rows = list(queries["accidents"]), list(queries["paid"])
+    if not accident_rows and not payment_rows:
+        return []
+
+    def to_months(rows):
+        return np.array([row[0] for row in rows], dtype="datetime64[M]")
+
+    accident_months, payment_months = to_months(accident_rows), to_months(payment_rows)
+    first = np.datetime64(since, "M") if since else min(np.concatenate([accident_months, payment_months]))
+    months = np.arange(first, np.datetime64(today, "M") + 1)
+    counts = np.zeros(len(months), dtype=np.int64)
+    paid = np.zeros(len(months), dtype=np.float64)
+    np.add.at(counts, np.searchsorted(months, accident_months), [row[1] for row in accident_rows])
+    np.add.at(paid, np.searchsorted(months, payment_months), [float(row[1] or 0) for row in payment_rows])
+    return [
+        {"month": str(month), "accidents": int(count), "paid": round(float(amount), 2)}
+        for month, count, amount in zip(months, counts, paid)
+    ]
+
+
+def compute_analytics(user_id: int, window: str = DEFAULT_WINDOW, today: Optional[date] = None) -> Dict:
+    """Uncached analytics for one user and window (see WINDOWS)."""
+    today = today or date.today()
+    window = window if window in WINDOWS else DEFAULT_WINDOW
+    since = _since(window, today)
+    cells = _cells(user_id, since)
+
+    totals = {name: float(cells[name].sum()) for name in ("policies", "premium", "claims", "paid")}
+    bands = (cells["model_year"] // MODEL_YEAR_BAND) * MODEL_YEAR_BAND
+    band_labels = np.char.add(np.char.add(bands.astype(str), "-"), (bands + MODEL_YEAR_BAND - 1).astype(str))
+    return {
+        "window": window,
+        "totals": {
+            "policies": int(totals["policies"]),
+            "claims": int(totals["claims"]),
+            "premium": round(totals["premium"], 2),
+            "paid": round(totals["paid"], 2),
+            "claim_frequency": round(totals["claims"] / totals["policies"], 4) if totals["policies"] else 0.0,
+            "loss_ratio": round(totals["paid"] / totals["premium"], 4) if totals["premium"] else 0.0,
+        },
+        "by_vehicle_type": _rollup(cells["vehicle_type"], cells),
+        "by_model_year": _rollup(band_labels, cells),
+        "by_policy_type": _rollup(cells["policy_type"], cells),
+        "monthly": _monthly(user_id, since, today),
+    }
+
+
+def get_analytics(user, window: str = DEFAULT_WINDOW, today: Optional[date] = None) -> Dict:
+    """
+    compute_analytics() behind the cache, for ANALYTICS_CACHE_TTL seconds per
+    user, window and day; any write to the user's data starts a new entry.
+    """
+    today = today or date.today()
+    window = window if window in WINDOWS else DEFAULT_WINDOW
+    key = CACHE_KEY.format(user_id=user.pk, version=data_version(user), window=window, today=today.isoformat())
+    result = cache.get(key)
+    if result is None:
+        result = compute_analytics(user.pk, window, today)
+        cache.set(key, result, getattr(settings, "ANALYTICS_CACHE_TTL", 300))
+    return result
+
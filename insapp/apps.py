@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class InsappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'insapp'
+
+    def ready(self):
+        # Register model signal receivers (dashboard counters) and system checks.
+        from . import checks, signals  # noqa: F401
@@ -0,0 +1,158 @@
+"""
+Dashboard chart rendering.
+
+Matplotlib holds the GIL for the whole render, so charts are drawn by
+insapp.chartgen in a small process pool (CHART_WORKERS processes, started with
+Matplotlib already imported) and only the PNG bytes come back. Each web process
+admits at most CHART_QUEUE_SIZE renders at a time, running or queued; beyond
+that, and when a render takes longer than CHART_RENDER_TIMEOUT seconds,
+get_chart_png raises ChartsBusy and the view answers 503, so a burst of
+dashboard loads cannot hold up the other requests. CHART_WORKERS = 0 draws in
+the web process instead.
+
+Rendered PNGs are kept in a small LRU cache keyed by (user, chart type, data
+fingerprint), so only changed data is drawn at all.
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Hashable, Optional, Tuple
+
+from django.conf import settings
+
+from . import chartgen
+
+CHART_TYPES = ("bar", "pie")
+# Bump when the drawing code changes so clients drop PNGs cached under old ETags.
+CHART_STYLE_VERSION = 1
+# Seconds a client is asked to wait after a 503.
+BUSY_RETRY_AFTER = 5
+
+
+class ChartsBusy(Exception):
+    """The render queue is full, or the render did not finish in time."""
+
+
+class ChartCache:
+    """Thread-safe LRU cache of rendered PNG bytes."""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[bytes]:
+        with self._lock:
+            png = self._entries.get(key)
+            if png is not None:
+                self._entries.move_to_end(key)
+            return png
+
+    def set(self, key: Hashable, png: bytes) -> None:
+        with self._lock:
+            self._entries[key] = png
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+chart_cache = ChartCache(getattr(settings, "CHART_CACHE_SIZE", 256))
+
+
+def data_fingerprint(chart_type: str, data: Dict[str, int]) -> str:
+    """Stable hash of everything that affects the rendered image; doubles as the ETag."""
+    payload = json.dumps([CHART_STYLE_VERSION, chart_type, sorted(data.items())])
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+# ------------------- POOL -------------------
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_pid: Optional[int] = None
+_pool_lock = threading.Lock()
+_slots: Optional[threading.BoundedSemaphore] = None
+
+
+def _workers() -> int:
+    return getattr(settings, "CHART_WORKERS", 1)
+
+
+def _get_pool() -> Tuple[ProcessPoolExecutor, threading.BoundedSemaphore]:
+    """
+    The process's chart pool and its admission slots, created on first use (and
+    again in a forked child, which cannot share its parent's pool).
+    """
+    global _pool, _pool_pid, _slots
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            # spawn: the workers never inherit the web process's threads, locks or database connections.
+            _pool = ProcessPoolExecutor(_workers(), mp_context=multiprocessing.get_context("spawn"),
+                                        initializer=chartgen.init_worker)
+            _pool_pid = os.getpid()
+            _slots = threading.BoundedSemaphore(getattr(settings, "CHART_QUEUE_SIZE", 4 * _workers()))
+        return _pool, _slots
+
+
+def _discard_pool(pool: ProcessPoolExecutor) -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def start_chart_pool() -> None:
+    """Start the workers now rather than on the first chart request (see insapp.warmup)."""
+    if _workers() > 0:
+        pool, _ = _get_pool()
+        pool.submit(chartgen.init_worker).result()
+
+
+def render_chart_png(chart_type: str, data: Dict[str, int]) -> bytes:
+    """Render a chart to PNG bytes in the pool; raises ChartsBusy when the pool is saturated or slow."""
+    if _workers() <= 0:
+        return chartgen.render_png(chart_type, data)
+    pool, slots = _get_pool()
+    if not slots.acquire(blocking=False):
+        raise ChartsBusy("Chart queue is full.")
+    try:
+        future = pool.submit(chartgen.render_png, chart_type, data)
+    except BaseException:
+        slots.release()
+        raise
+    # The slot is held until the render really ends, even when this request stops waiting for it.
+    future.add_done_callback(lambda _: slots.release())
+    try:
+        return future.result(timeout=getattr(settings, "CHART_RENDER_TIMEOUT", 10))
+    except FutureTimeout:
+        future.cancel()
+        raise ChartsBusy("Chart render timed out.")
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory); the next request starts a fresh pool.
+        _discard_pool(pool)
+        raise ChartsBusy("Chart workers restarted.")
+
+
+def get_chart_png(user_id: int, chart_type: str, data: Dict[str, int]) -> Tuple[str, bytes]:
+    """
+    Return (etag, png) for the chart, rendering only on a cache miss.
+    """
+    etag = data_fingerprint(chart_type, data)
+    key = (user_id, chart_type, etag)
+    png = chart_cache.get(key)
+    if png is None:
+        png = render_chart_png(chart_type, data)
+        chart_cache.set(key, png)
+    return etag, png
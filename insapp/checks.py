@@ -0,0 +1,29 @@
+"""
+System checks for database state that migrations alone do not guarantee.
+
+Database checks run with `manage.py check --database default` (and before the
+test suite), not on every management command.
+"""
+from django.core.checks import Error, Tags, register
+from django.db import connections
+
+from .sharding import shards
+from .typeahead import missing_search_triggers
+
+
+@register(Tags.database)
+def check_search_triggers(app_configs=None, databases=None, **kwargs):
+    """insapp.E001: a shard's FTS search index has lost the triggers that keep it current."""
+    errors = []
+    for alias in shards():
+        if databases is None or alias not in databases:
+            continue
+        missing = missing_search_triggers(connections[alias])
+        if missing:
+            errors.append(Error(
+                f"The typeahead search index on {alias!r} is missing triggers: {', '.join(missing)}.",
+                hint="A migration rebuilt insapp_owner or insapp_vehicle, which drops their triggers. "
+                     "Recreate them as in migration 0006_search_index.",
+                id="insapp.E001",
+            ))
+    return errors
@@ -0,0 +1,64 @@
+"""
+Per-user data versions for cached page fragments (and analytics).
+
+The owners, vehicles and payment pages wrap their tables in {% cache %} blocks
+keyed by the user and the user's data version, so a repeat view is rendered
+from the cache without touching the ORM. Every write to a user's owners,
+vehicles, policies, accidents or payments bumps the version (the receivers in
+insapp.signals, plus the bulk paths that bypass them), and the next view
+renders afresh. Superseded fragments are never deleted; they expire after
+FRAGMENT_CACHE_TTL seconds.
+
+Versions live in the default cache, which every worker must share (see
+CACHES in settings). A bump writes a new, time-based version rather than
+incrementing, so it needs no atomic incr and concurrent bumps cannot cancel out:
+whichever lands last was set after both writes committed.
+"""
+import time
+from typing import Dict, Iterable
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .routers import reading_replica, sticky_seconds
+
+VERSION_KEY = "data_version:v1:{user_id}"
+
+
+def _user_id(user) -> int:
+    return user if isinstance(user, int) else user.pk
+
+
+def _fresh() -> int:
+    # Nanoseconds, so two bumps never share a version.
+    return time.time_ns()
+
+
+def data_version(user) -> int:
+    """The user's current data version, starting one if the cache has none."""
+    key = VERSION_KEY.format(user_id=_user_id(user))
+    version = cache.get(key)
+    if version is None:
+        version = _fresh()
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_data_version(user) -> None:
+    """Invalidate the user's cached fragments and analytics; call once the write is committed."""
+    cache.set(VERSION_KEY.format(user_id=_user_id(user)), _fresh(), timeout=None)
+
+
+def bump_data_versions(users: Iterable) -> None:
+    for user in users:
+        bump_data_version(user)
+
+
+def fragment_context(user) -> Dict:
+    """Template context for a page's {% cache fragment_ttl <name> request.user.id data_version ... %} blocks."""
+    ttl = getattr(settings, "FRAGMENT_CACHE_TTL", 600)
+    if reading_replica():
+        # A replica may trail the version it was read under by up to the sticky window.
+        ttl = min(ttl, sticky_seconds())
+    return {"data_version": data_version(user), "fragment_ttl": ttl}
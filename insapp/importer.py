@@ -0,0 +1,329 @@
+"""
+Streaming bulk import of owners, vehicles and policies.
+
+A file holds one record per vehicle, as CSV with a header row or as NDJSON
+(one JSON object per line). Columns:
+
+  owner_id                         an existing owner of the importing user, or
+  owner, phone_number, address,    the owner's details; an owner of the user with the
+  dob (optional, YYYY-MM-DD)       same name and phone number is reused, else created
+  vehicle_number, vin, title,      the vehicle (title is optional)
+  model_name, model_year, vehicle_type
+  policy_type, start_date          optional: also issue a policy for the vehicle
+
+Records are read lazily and processed in batches: each batch is validated,
+resolved against the database with a handful of IN queries and written with
+bulk_create in one transaction, so memory stays flat whatever the file size.
+Each batch's policies are priced together by the risk-based pricing engine.
+Invalid rows are rejected with their line number; the rest of the file goes on.
+"""
+import csv
+import io
+import json
+import logging
+from datetime import date
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+from django.db import IntegrityError, transaction
+
+from .fragments import bump_data_version
+from .ledger import POLICY_OPTIONS, policy_end_date
+from .lifecycle import policy_state
+from .models import Owner, Vehicle, Policy
+from .premiums import claim_counts, counts_for
+from .pricing import price
+from .sharding import tenant_db, values_in_use
+from .sequences import allocate_policy_numbers
+from .stats import rebuild_user_stats
+from .validators import is_valid_vehicle_number, is_valid_vin
+
+logger = logging.getLogger(__name__)
+
+FIELDS = (
+    "owner_id", "owner", "phone_number", "address", "dob",
+    "vehicle_number", "vin", "title", "model_name", "model_year", "vehicle_type",
+    "policy_type", "start_date",
+)
+FORMATS = ("csv", "ndjson")
+BATCH_SIZE = 1000
+CHUNK_SIZE = 500
+# Rejections kept in the returned summary; later ones are only counted (and passed to on_reject).
+MAX_REPORTED_REJECTS = 1000
+# Largest upload the /api/import/ view imports within the request (IMPORT_MAX_UPLOAD_BYTES);
+# bigger files go through `manage.py import_data`.
+MAX_UPLOAD_BYTES = 5 * 1024 * 1024
+
+# Field -> max_length of the model column it is written to.
+MAX_LENGTHS = {
+    "owner": 100, "address": 255, "phone_number": 15,
+    "vehicle_number": 20, "title": 100, "model_name": 100, "vehicle_type": 50,
+}
+
+# A parsed record, or the reason its line could not be parsed.
+Record = Union[Dict, str]
+Rejection = Tuple[int, Dict, List[str]]
+
+
+def detect_format(filename: str) -> Optional[str]:
+    """"csv" or "ndjson" from a file name's extension, or None if unknown."""
+    name = (filename or "").lower()
+    if name.endswith(".csv"):
+        return "csv"
+    if name.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    return None
+
+
+def iter_records(stream, fmt: str) -> Iterator[Tuple[int, Record]]:
+    """
+    Lazily yield (line number, record) from a binary or text stream.
+    Lines that cannot be parsed yield an error message instead of a dict.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown import format {fmt!r}; expected one of {', '.join(FORMATS)}.")
+    if not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+        return
+
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            yield line_number, f"Malformed JSON: {exc}"
+            continue
+        yield line_number, record if isinstance(record, dict) else "Each line must be a JSON object."
+
+
+def _text(record: Dict, field: str) -> str:
+    value = record.get(field)
+    return "" if value is None else str(value).strip()
+
+
+def _parse_date(value: str) -> Optional[date]:
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+def clean_record(record: Record, today: date) -> Tuple[Optional[Dict], List[str]]:
+    """Validate one record with the same rules as the owner, vehicle and policy forms."""
+    if isinstance(record, str):
+        return None, [record]
+
+    cleaned = {field: _text(record, field) for field in FIELDS}
+    cleaned["vehicle_number"] = cleaned["vehicle_number"].upper()
+    cleaned["vin"] = cleaned["vin"].upper()
+    cleaned["title"] = cleaned["title"] or "Unknown Vehicle"
+    errors = []
+
+    for field in ("vehicle_number", "vin", "model_name", "model_year", "vehicle_type"):
+        if not cleaned[field]:
+            errors.append(f"{field} is required.")
+    if cleaned["vehicle_number"] and not is_valid_vehicle_number(cleaned["vehicle_number"]):
+        errors.append("Invalid vehicle number format. Use KA-01-AB-1234 or KA-03-A-2882.")
+    if cleaned["vin"] and not is_valid_vin(cleaned["vin"]):
+        errors.append("VIN must be exactly 10 characters.")
+    if cleaned["model_year"]:
+        if not cleaned["model_year"].isdigit() or not 1900 <= int(cleaned["model_year"]) <= today.year + 1:
+            errors.append("model_year must be a year between 1900 and next year.")
+
+    if cleaned["owner_id"]:
+        if not cleaned["owner_id"].isdigit():
+            errors.append("owner_id must be an integer.")
+    else:
+        for field in ("owner", "phone_number", "address"):
+            if not cleaned[field]:
+                errors.append(f"{field} is required when owner_id is not given.")
+        if cleaned["dob"] and _parse_date(cleaned["dob"]) is None:
+            errors.append("dob must be a date (YYYY-MM-DD).")
+
+    if cleaned["policy_type"]:
+        if cleaned["policy_type"] not in POLICY_OPTIONS:
+            errors.append("Invalid policy type.")
+        if _parse_date(cleaned["start_date"]) is None:
+            errors.append("start_date (YYYY-MM-DD) is required with policy_type.")
+
+    for field, limit in MAX_LENGTHS.items():
+        if len(cleaned[field]) > limit:
+            errors.append(f"{field} is longer than {limit} characters.")
+
+    return (None, errors) if errors else (cleaned, [])
+
+
+def _reject_duplicates(rows: List[Tuple[int, Dict]], rejects: List[Rejection]) -> List[Tuple[int, Dict]]:
+    """
+    Drop rows whose vehicle number or VIN repeats inside the batch or already
+    exists for any tenant: every shard is checked, since each shard's unique
+    index only sees its own tenants.
+    """
+    taken_numbers = values_in_use(Vehicle, "vehicle_number", (row["vehicle_number"] for _, row in rows))
+    taken_vins = values_in_use(Vehicle, "vin", (row["vin"] for _, row in rows))
+
+    kept = []
+    for line, row in rows:
+        errors = []
+        if row["vehicle_number"] in taken_numbers:
+            errors.append(f"Vehicle number {row['vehicle_number']} already exists.")
+        if row["vin"] in taken_vins:
+            errors.append(f"VIN {row['vin']} already exists.")
+        if errors:
+            rejects.append((line, row, errors))
+            continue
+        taken_numbers.add(row["vehicle_number"])
+        taken_vins.add(row["vin"])
+        kept.append((line, row))
+    return kept
+
+
+def _resolve_owners(user, rows: List[Tuple[int, Dict]],
+                    rejects: List[Rejection]) -> Tuple[List[Tuple[int, Dict, Owner]], int]:
+    """
+    Attach an Owner to every row: by owner_id among the user's owners, or by
+    (name, phone number), creating the owners that do not exist yet.
+    Returns the resolved rows and the number of owners created.
+    """
+    ids = {int(row["owner_id"]) for _, row in rows if row["owner_id"]}
+    names = {row["owner"] for _, row in rows if not row["owner_id"]}
+    by_id = {owner.id: owner for owner in Owner.objects.filter(user=user, id__in=ids).only("id", "dob")} if ids else {}
+    by_key = {}
+    if names:
+        for owner in Owner.objects.filter(user=user, owner__in=names).only("id", "owner", "phone_number", "dob"):
+            by_key.setdefault((owner.owner, owner.phone_number), owner)
+
+    new_owners = {}
+    for _, row in rows:
+        key = (row["owner"], row["phone_number"])
+        if not row["owner_id"] and key not in by_key and key not in new_owners:
+            new_owners[key] = Owner(user=user, owner=row["owner"], phone_number=row["phone_number"],
+                                    address=row["address"], dob=_parse_date(row["dob"]) if row["dob"] else None)
+    Owner.objects.bulk_create(new_owners.values(), batch_size=CHUNK_SIZE)
+    by_key.update(new_owners)
+
+    resolved = []
+    for line, row in rows:
+        owner = by_id.get(int(row["owner_id"])) if row["owner_id"] else by_key[(row["owner"], row["phone_number"])]
+        if owner is None:
+            rejects.append((line, row, [f"Owner {row['owner_id']} not found."]))
+            continue
+        resolved.append((line, row, owner))
+    return resolved, len(new_owners)
+
+
+def _premiums(insured: List[Tuple[Dict, Owner, Vehicle]], today: date) -> List[float]:
+    """Risk-based premiums for a batch of new policies, priced in one pass (see insapp.pricing)."""
+    owner_ids = np.array([owner.id for _, owner, _ in insured], dtype=np.int64)
+    rated = price(
+        policy_types=[row["policy_type"] for row, _, _ in insured],
+        vehicle_types=[vehicle.vehicle_type for _, _, vehicle in insured],
+        model_years=[vehicle.model_year for _, _, vehicle in insured],
+        owner_dobs=[owner.dob for _, owner, _ in insured],
+        claim_counts=counts_for(owner_ids, claim_counts(today, owner_ids=set(owner_ids.tolist()))),
+        on=[_parse_date(row["start_date"]) for row, _, _ in insured],
+    )
+    return rated["premium"].tolist()
+
+
+def _write_batch(user, rows: List[Tuple[int, Dict]], rejects: List[Rejection], chunk_size: int,
+                 today: date) -> Dict[str, int]:
+    rows = _reject_duplicates(rows, rejects)
+    resolved, owners_created = _resolve_owners(user, rows, rejects)
+
+    vehicles = [
+        Vehicle(user=user, owner=owner, title=row["title"], vehicle_number=row["vehicle_number"],
+                model_name=row["model_name"], model_year=int(row["model_year"]),
+                vehicle_type=row["vehicle_type"], vin=row["vin"])
+        for _, row, owner in resolved
+    ]
+    Vehicle.objects.bulk_create(vehicles, batch_size=chunk_size)
+
+    insured = [(row, owner, vehicle) for (_, row, owner), vehicle in zip(resolved, vehicles) if row["policy_type"]]
+    numbers = allocate_policy_numbers(len(insured)) if insured else []
+    premiums = _premiums(insured, today) if insured else []
+    policies = []
+    for number, premium, (row, owner, vehicle) in zip(numbers, premiums, insured):
+        start_date = _parse_date(row["start_date"])
+        end_date = policy_end_date(start_date, row["policy_type"])
+        policies.append(Policy(
+            user=user, owner=owner, vehicle=vehicle, policy_number=number, policy_type=row["policy_type"],
+            start_date=start_date, end_date=end_date, status=policy_state(start_date, end_date, today),
+            premium_amount=f"{premium:.2f}",
+        ))
+    Policy.objects.bulk_create(policies, batch_size=chunk_size)
+    return {"owners": owners_created, "vehicles": len(vehicles), "policies": len(policies)}
+
+
+def import_records(user, records: Iterable[Tuple[int, Record]], batch_size: int = BATCH_SIZE,
+                   chunk_size: int = CHUNK_SIZE, today: Optional[date] = None,
+                   on_reject: Optional[Callable[[int, Dict, List[str]], None]] = None,
+                   progress: Optional[Callable[[Dict], None]] = None) -> Dict:
+    """
+    Import (line number, record) pairs for `user`, one transaction per batch.
+
+    Returns row counts, the number of rejected rows and the first
+    MAX_REPORTED_REJECTS rejections as {"line", "errors"}. Every rejection is
+    also passed to on_reject(line, record, errors) if given.
+    """
+    today = today or date.today()
+    summary = {"rows": 0, "owners": 0, "vehicles": 0, "policies": 0, "rejected": 0, "errors": []}
+    records = iter(records)
+
+    def reject(line, record, errors):
+        summary["rejected"] += 1
+        if len(summary["errors"]) < MAX_REPORTED_REJECTS:
+            summary["errors"].append({"line": line, "errors": errors})
+        if on_reject:
+            on_reject(line, record, errors)
+
+    while True:
+        batch = list(islice(records, batch_size))
+        if not batch:
+            break
+        summary["rows"] += len(batch)
+
+        valid = []
+        invalid: List[Rejection] = []
+        for line, record in batch:
+            cleaned, errors = clean_record(record, today)
+            if errors:
+                invalid.append((line, record, errors))
+            else:
+                valid.append((line, cleaned))
+
+        rejects: List[Rejection] = []
+        try:
+            with transaction.atomic(using=tenant_db(user)):
+                counts = _write_batch(user, valid, rejects, chunk_size, today) if valid else {}
+        except IntegrityError as exc:
+            # A concurrent write took a vehicle number between the check and the insert.
+            logger.warning("Import batch ending at line %s rolled back: %s", batch[-1][0], exc)
+            rejects = [(line, row, ["Conflicting concurrent write; import this row again."]) for line, row in valid]
+            counts = {}
+        for line, record, errors in sorted(invalid + rejects, key=lambda rejection: rejection[0]):
+            reject(line, record, errors)
+        for key, count in counts.items():
+            summary[key] += count
+        if progress:
+            progress(summary)
+
+    return summary
+
+
+def import_file(user, stream, fmt: str, **options) -> Dict:
+    """Stream-import a CSV or NDJSON file for `user` and refresh their dashboard counters and analytics."""
+    summary = import_records(user, iter_records(stream, fmt), **options)
+    # bulk_create bypasses the signal receivers that maintain the dashboard counters and the data version.
+    if summary["owners"] or summary["vehicles"]:
+        rebuild_user_stats(user.id)
+    if summary["owners"] or summary["vehicles"] or summary["policies"]:
+        bump_data_version(user)
+    return summary
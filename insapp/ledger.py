@@ -0,0 +1,266 @@
+import hashlib
+import json
+import logging
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import Case, CharField, Count, Exists, IntegerField, OuterRef, Q, QuerySet, Value, When
+
+from .lifecycle import ACTIVE, EXPIRED, POLICY_STATES, UPCOMING, policy_state
+from .models import Accident, Payment, Policy
+from .pricing import POLICY_OPTIONS
+from .sharding import shards
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 25
+MAX_PAGE_SIZE = 200
+# Most policy ids accepted by one batch status request.
+MAX_STATUS_BATCH = 500
+
+# Sort key -> ORDER BY, which is also the keyset a page cursor records. Every
+# order ends in id so the position is unique; "state_rank" is annotated by policy_ledger().
+LEDGER_SORTS = {
+    "start": ("-start_date", "-id"),
+    "expiry": ("end_date", "id"),
+    "-expiry": ("-end_date", "-id"),
+    "status": ("state_rank", "end_date", "id"),
+}
+DEFAULT_SORT = "start"
+# How each keyset column is read back out of a cursor.
+CURSOR_PARSERS = {"start_date": date.fromisoformat, "end_date": date.fromisoformat, "state_rank": int, "id": int}
+
+
+def policy_end_date(start_date: date, policy_type: str) -> date:
+    """End date of a policy_type term (approximation, assuming 30 days per month, plus 10 days' grace)."""
+    return start_date + timedelta(days=POLICY_OPTIONS[policy_type]["term_months"] * 30 + 10)
+
+
+def state_filter(state: str, today: date) -> Q:
+    """Date-range condition a policy in `state` satisfies on `today` (see lifecycle.policy_state)."""
+    if state == UPCOMING:
+        return Q(start_date__gt=today)
+    if state == EXPIRED:
+        return Q(end_date__lt=today)
+    return Q(start_date__lte=today, end_date__gte=today)
+
+
+def state_case(today: date) -> Case:
+    """SQL for lifecycle.policy_state() on `today`: the state worked out from the dates."""
+    return Case(
+        When(state_filter(UPCOMING, today), then=Value(UPCOMING)),
+        When(state_filter(EXPIRED, today), then=Value(EXPIRED)),
+        default=Value(ACTIVE),
+        output_field=CharField(),
+    )
+
+
+def state_rank_case(today: date) -> Case:
+    """Position of each policy's current state in POLICY_STATES, for the "status" sort."""
+    return Case(
+        When(state_filter(UPCOMING, today), then=Value(POLICY_STATES.index(UPCOMING))),
+        When(state_filter(EXPIRED, today), then=Value(POLICY_STATES.index(EXPIRED))),
+        default=Value(POLICY_STATES.index(ACTIVE)),
+        output_field=IntegerField(),
+    )
+
+
+def sweep_policy_states(today: Optional[date] = None) -> Dict[str, int]:
+    """
+    Move every policy whose dates have crossed a boundary into its current state:
+    one UPDATE per target state, each seeking the (status, start_date/end_date)
+    indexes, in a single transaction per shard. Returns the number of policies moved
+    per state. Run daily (e.g. from cron via `manage.py sweep_policies`).
+
+    Nothing on the read side depends on it: the ledger, the status endpoints and
+    the exporter all work the state out from the dates, so a missed or late sweep
+    only leaves the stored column stale, never the pages.
+    """
+    today = today or date.today()
+    moved = dict.fromkeys(POLICY_STATES, 0)
+    for alias in shards():
+        with transaction.atomic(using=alias):
+            for state in POLICY_STATES:
+                others = [other for other in POLICY_STATES if other != state]
+                moved[state] += (Policy.objects.using(alias).filter(status__in=others)
+                                 .filter(state_filter(state, today))
+                                 .update(status=state))
+    return moved
+
+
+def _keyset_fields(sort: str) -> Tuple[str, ...]:
+    return tuple(term.lstrip("-") for term in LEDGER_SORTS[sort])
+
+
+def encode_cursor(policy: Policy, sort: str) -> str:
+    """Encode the keyset position of the last row on a page under `sort`, e.g. "2024-05-01.1234"."""
+    values = (getattr(policy, field) for field in _keyset_fields(sort))
+    return ".".join(value.isoformat() if isinstance(value, date) else str(value) for value in values)
+
+
+def decode_cursor(cursor: Optional[str], sort: str) -> Optional[Tuple]:
+    """Decode a cursor produced by encode_cursor for `sort`. Returns None for missing or malformed cursors."""
+    if not cursor:
+        return None
+    fields = _keyset_fields(sort)
+    parts = cursor.split(".")
+    if len(parts) != len(fields):
+        logger.debug("Ignoring ledger cursor %r for sort %r", cursor, sort)
+        return None
+    try:
+        return tuple(CURSOR_PARSERS[field](part) for field, part in zip(fields, parts))
+    except ValueError:
+        logger.debug("Ignoring malformed ledger cursor %r", cursor)
+        return None
+
+
+def after_position(sort: str, position: Tuple) -> Q:
+    """Rows after `position` in the LEDGER_SORTS[sort] order: (a > x) OR (a = x AND b > y) OR ..."""
+    condition, equal = Q(), {}
+    for term, value in zip(LEDGER_SORTS[sort], position):
+        field = term.lstrip("-")
+        condition |= Q(**equal, **{f"{field}__{'lt' if term.startswith('-') else 'gt'}": value})
+        equal[field] = value
+    return condition
+
+
+def user_policies(user, owner_id: Optional[int] = None) -> QuerySet:
+    """The user's policies, optionally narrowed to one owner."""
+    queryset = Policy.objects.filter(user=user)
+    if owner_id:
+        queryset = queryset.filter(owner_id=owner_id)
+    return queryset
+
+
+def state_counts(queryset: QuerySet, today: date) -> Dict[str, int]:
+    """Per-state counts as of `today` plus the total ("all") from one GROUP BY query."""
+    counts = dict.fromkeys(POLICY_STATES, 0)
+    for row in queryset.order_by().annotate(state=state_case(today)).values("state").annotate(n=Count("id")):
+        counts[row["state"]] = row["n"]
+    counts["all"] = sum(counts.values())
+    return counts
+
+
+def policy_ledger(user, owner_id: Optional[int] = None, state: Optional[str] = None,
+                  sort: Optional[str] = None, cursor: Optional[str] = None, page_size: int = PAGE_SIZE,
+                  today: Optional[date] = None) -> Dict:
+    """
+    One page of a user's policy ledger, filtered and sorted on each policy's
+    state as of `today` (default: the current date), worked out from its dates
+    like policy_statuses() so the tabs never depend on sweep_policies having run.
+
+    Issues two queries whatever the number of policies: one GROUP BY state for
+    the state tabs and one keyset-paginated page (rows after `cursor` in the sort
+    order) with the vehicle joined in. Each policy comes back with a `state`
+    attribute. Unknown states and sorts fall back to "all" and the default sort;
+    a malformed cursor or one from another sort means the first page.
+    """
+    today = today or date.today()
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+    sort = sort if sort in LEDGER_SORTS else DEFAULT_SORT
+
+    base = user_policies(user, owner_id)
+    counts = state_counts(base, today)
+    total = counts[state] if state in POLICY_STATES else counts["all"]
+
+    queryset = base.filter(state_filter(state, today)) if state in POLICY_STATES else base
+    if sort == "status":
+        queryset = queryset.annotate(state_rank=state_rank_case(today))
+    position = decode_cursor(cursor, sort)
+    if position:
+        queryset = queryset.filter(after_position(sort, position))
+    policies = list(
+        queryset.annotate(state=state_case(today)).select_related("vehicle")
+        .only("id", "policy_number", "policy_type", "start_date", "end_date", "premium_amount",
+              "vehicle__id", "vehicle__title", "vehicle__vehicle_number")
+        .order_by(*LEDGER_SORTS[sort])[:page_size + 1]
+    )
+
+    next_cursor = None
+    if len(policies) > page_size:
+        policies = policies[:page_size]
+        next_cursor = encode_cursor(policies[-1], sort)
+
+    return {
+        "policies": policies,
+        "state_counts": counts,
+        "total_count": total,
+        "next_cursor": next_cursor,
+        "sort": sort,
+        "state": state if state in POLICY_STATES else None,
+    }
+
+
+def serialize_policy(policy: Policy) -> Dict:
+    """JSON shape of one policy_ledger() row."""
+    return {
+        "id": policy.id,
+        "policy_number": policy.policy_number,
+        "policy_type": policy.policy_type,
+        "vehicle": {
+            "id": policy.vehicle.id,
+            "title": policy.vehicle.title,
+            "vehicle_number": policy.vehicle.vehicle_number,
+        },
+        "start_date": policy.start_date.isoformat(),
+        "end_date": policy.end_date.isoformat(),
+        "premium_amount": str(policy.premium_amount),
+        "status": policy.state,
+    }
+
+
+def _status_rows(user, policy_ids: Optional[Iterable[int]], owner_id: Optional[int],
+                 vehicle_id: Optional[int]) -> QuerySet:
+    queryset = user_policies(user, owner_id)
+    if policy_ids is not None:
+        queryset = queryset.filter(id__in=list(policy_ids))
+    if vehicle_id:
+        queryset = queryset.filter(vehicle_id=vehicle_id)
+    return (
+        queryset.annotate(
+            has_accident=Exists(Accident.objects.filter(policy=OuterRef("pk"))),
+            has_payment=Exists(Payment.objects.filter(policy=OuterRef("pk"))),
+        )
+        .order_by("id")
+        .values("id", "policy_number", "start_date", "end_date", "has_accident", "has_payment")
+    )
+
+
+def _status(row: Dict, today: date) -> Dict:
+    # From the dates, not the stored status, which sweep_policies may not have caught up on today.
+    state = policy_state(row["start_date"], row["end_date"], today)
+    return {
+        "id": row["id"],
+        "policy_number": row["policy_number"],
+        "end_date": row["end_date"].isoformat(),
+        "state": state,
+        "is_active": state == ACTIVE,
+        "has_accident": row["has_accident"],
+        "has_payment": row["has_payment"],
+    }
+
+
+def policy_statuses(user, policy_ids: Optional[Iterable[int]] = None, owner_id: Optional[int] = None,
+                    vehicle_id: Optional[int] = None, today: Optional[date] = None) -> List[Dict]:
+    """
+    Lifecycle, claim and payment state for a batch of the user's policies, selected
+    by id and/or narrowed to one owner or vehicle. One query: the policy dates plus
+    correlated EXISTS subqueries for the accident and payment checks; the state is
+    worked out from the dates as of `today` (default: the current date).
+    Rows come back ordered by id; ids the user does not own are simply absent.
+    """
+    today = today or date.today()
+    return [_status(row, today) for row in _status_rows(user, policy_ids, owner_id, vehicle_id)]
+
+
+async def apolicy_statuses(user, policy_ids: Optional[Iterable[int]] = None, owner_id: Optional[int] = None,
+                           vehicle_id: Optional[int] = None, today: Optional[date] = None) -> List[Dict]:
+    """policy_statuses() through the async ORM, for async views."""
+    today = today or date.today()
+    return [_status(row, today) async for row in _status_rows(user, policy_ids, owner_id, vehicle_id)]
+
+
+def statuses_fingerprint(statuses: List[Dict]) -> str:
+    """Stable hash of a policy_statuses() result, used as the batch endpoint's ETag."""
+    return hashlib.sha1(json.dumps(statuses, sort_keys=True).encode()).hexdigest()
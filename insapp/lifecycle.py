@@ -0,0 +1,22 @@
+"""
+Policy lifecycle states. Kept free of Django imports so the model, the seed
+generator workers and the importer share one definition.
+"""
+from datetime import date
+
+ACTIVE = "active"
+UPCOMING = "upcoming"
+EXPIRED = "expired"
+
+# In the order used by the ledger's "status" sort.
+POLICY_STATES = (ACTIVE, UPCOMING, EXPIRED)
+POLICY_STATE_CHOICES = [(state, state.title()) for state in POLICY_STATES]
+
+
+def policy_state(start_date: date, end_date: date, today: date) -> str:
+    """Lifecycle state of a policy running from start_date to end_date (inclusive) on `today`."""
+    if start_date > today:
+        return UPCOMING
+    if end_date < today:
+        return EXPIRED
+    return ACTIVE
@@ -0,0 +1,126 @@
+import random
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections, transaction
+from django.db.models import F
+
+from insapp.models import Policy
+
+# Settings compared by the benchmark: SQLite defaults with a connection per request,
+# against the OPTIONS / CONN_MAX_AGE configured for the default database.
+PROFILES = {
+    "baseline": {"OPTIONS": {}, "reuse": False, "journal_mode": "DELETE"},
+    "tuned": {"OPTIONS": None, "reuse": True, "journal_mode": None},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Concurrency benchmark of mixed reads and writes on a scratch copy of the default SQLite database, "
+        "comparing SQLite defaults with a connection per request against the configured tuning "
+        "(SQLITE_PRAGMAS, transaction_mode, CONN_MAX_AGE)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8, help="Concurrent workers.")
+        parser.add_argument("--seconds", type=float, default=10.0, help="Duration of each profile's run.")
+        parser.add_argument("--write-ratio", type=float, default=0.2, help="Fraction of operations that write.")
+        parser.add_argument("--profile", choices=PROFILES, action="append", dest="profiles", default=None,
+                            help="Profile to run (repeatable; default: all).")
+
+    def handle(self, *args, **options):
+        database = connections.settings["default"]
+        if database["ENGINE"] != "django.db.backends.sqlite3":
+            raise CommandError("benchmark_db only applies to the SQLite backend.")
+        policies = list(Policy.objects.values_list("id", "owner_id")[:10000])
+        if not policies:
+            raise CommandError("The database has no policies; seed it first (manage.py seed_data).")
+
+        with tempfile.TemporaryDirectory() as scratch:
+            for name in options["profiles"] or PROFILES:
+                path = Path(scratch) / f"{name}.sqlite3"
+                self._copy(Path(database["NAME"]), path, PROFILES[name]["journal_mode"])
+                alias = f"benchmark_{name}"
+                profile = PROFILES[name]
+                connections.settings[alias] = {
+                    **database,
+                    "NAME": str(path),
+                    "OPTIONS": database["OPTIONS"] if profile["OPTIONS"] is None else profile["OPTIONS"],
+                    "CONN_MAX_AGE": database["CONN_MAX_AGE"] if profile["reuse"] else 0,
+                }
+                try:
+                    self._report(name, self._run(alias, profile["reuse"], policies, options))
+                finally:
+                    connections[alias].close()
+                    del connections.settings[alias]
+
+    @staticmethod
+    def _copy(source: Path, target: Path, journal_mode) -> None:
+        """Consistent copy via the backup API (WAL contents included), in the profile's journal mode."""
+        with sqlite3.connect(source) as src, sqlite3.connect(target) as dst:
+            src.backup(dst)
+            if journal_mode:
+                dst.execute(f"PRAGMA journal_mode={journal_mode}")
+        src.close()
+        dst.close()
+
+    def _run(self, alias, reuse, policies, options):
+        deadline = time.monotonic() + options["seconds"]
+        lock = threading.Lock()
+        stats = {"reads": [], "writes": [], "errors": 0}
+
+        def worker(seed):
+            rng = random.Random(seed)
+            reads, writes, errors = [], [], 0
+            while time.monotonic() < deadline:
+                policy_id, owner_id = rng.choice(policies)
+                write = rng.random() < options["write_ratio"]
+                started = time.perf_counter()
+                try:
+                    if write:
+                        # Read-then-write, like the policy / accident / payment POSTs.
+                        with transaction.atomic(using=alias):
+                            Policy.objects.using(alias).filter(id=policy_id).values_list("premium_amount").get()
+                            Policy.objects.using(alias).filter(id=policy_id).update(
+                                premium_amount=F("premium_amount"))
+                    else:
+                        list(Policy.objects.using(alias).filter(owner_id=owner_id)
+                             .order_by("-start_date").values_list("id", "policy_number")[:25])
+                    (writes if write else reads).append(time.perf_counter() - started)
+                except OperationalError:
+                    errors += 1
+                finally:
+                    if not reuse:
+                        # One connection per request, as with CONN_MAX_AGE = 0.
+                        connections[alias].close()
+            connections[alias].close()
+            with lock:
+                stats["reads"] += reads
+                stats["writes"] += writes
+                stats["errors"] += errors
+
+        threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(max(1, options["threads"]))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats["seconds"] = options["seconds"]
+        return stats
+
+    def _report(self, name, stats):
+        def p95(samples):
+            return statistics.quantiles(samples, n=20)[18] * 1000 if len(samples) > 1 else 0.0
+
+        total = len(stats["reads"]) + len(stats["writes"])
+        self.stdout.write(self.style.SUCCESS(
+            f"{name:>8}: {total / stats['seconds']:.0f} ops/s "
+            f"({len(stats['reads'])} reads, p95 {p95(stats['reads']):.1f} ms; "
+            f"{len(stats['writes'])} writes, p95 {p95(stats['writes']):.1f} ms; "
+            f"{stats['errors']} 'database is locked' errors)"
+        ))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from insapp.queryplans import check_query_plans
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN the hot insapp queries and fail if any of them needs a full table scan."
+
+    def handle(self, *args, **options):
+        failures = []
+        for name, plan, scans in check_query_plans():
+            if scans:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(f"FULL SCAN {name}: {', '.join(scans)}"))
+            else:
+                self.stdout.write(f"ok {name}")
+            if options["verbosity"] > 1 or scans:
+                for line in plan.splitlines():
+                    self.stdout.write(f"    {line}")
+
+        if failures:
+            raise CommandError(f"{len(failures)} hot quer{'y' if len(failures) == 1 else 'ies'} "
+                               f"fall back to a full table scan: {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS("All hot queries use an index."))
@@ -0,0 +1,63 @@
+import json
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from insapp.importer import BATCH_SIZE, CHUNK_SIZE, FORMATS, detect_format, import_file
+from insapp.sharding import tenant
+
+
+class Command(BaseCommand):
+    help = "Stream-import owners, vehicles and policies for a user from a CSV or NDJSON file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to import (one record per vehicle; see insapp.importer).")
+        parser.add_argument("--user", required=True, help="Username that will own the imported records.")
+        parser.add_argument("--format", choices=FORMATS, default=None,
+                            help="File format (default: from the extension).")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Records per transaction.")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Rows per bulk_create INSERT.")
+        parser.add_argument("--rejects", default=None,
+                            help="Write every rejected record with its errors to this NDJSON file.")
+
+    def handle(self, *args, **options):
+        fmt = options["format"] or detect_format(options["path"])
+        if fmt is None:
+            raise CommandError("Cannot tell the file format from its name; pass --format.")
+        try:
+            user = User.objects.get(username=options["user"])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['user']!r} does not exist.")
+
+        started = time.monotonic()
+        verbosity = options["verbosity"]
+        rejects_file = open(options["rejects"], "w") if options["rejects"] else None
+
+        def on_reject(line, record, errors):
+            if rejects_file:
+                rejects_file.write(json.dumps({"line": line, "errors": errors, "record": record}) + "\n")
+
+        def progress(summary):
+            if verbosity > 1:
+                self.stdout.write(f"  {summary['rows']} rows read, {summary['rejected']} rejected "
+                                  f"({time.monotonic() - started:.1f}s)")
+
+        try:
+            with open(options["path"], "rb") as stream, tenant(user):
+                summary = import_file(user, stream, fmt, batch_size=max(1, options["batch_size"]),
+                                      chunk_size=max(1, options["chunk_size"]),
+                                      on_reject=on_reject, progress=progress)
+        except OSError as exc:
+            raise CommandError(f"Cannot read {options['path']}: {exc}")
+        finally:
+            if rejects_file:
+                rejects_file.close()
+
+        if verbosity > 0:
+            for error in summary["errors"][:20]:
+                self.stderr.write(f"  line {error['line']}: {' '.join(error['errors'])}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {summary['owners']} owners, {summary['vehicles']} vehicles and {summary['policies']} policies "
+            f"from {summary['rows']} rows ({summary['rejected']} rejected) in {time.monotonic() - started:.1f}s."
+        ))
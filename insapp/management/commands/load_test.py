@@ -0,0 +1,124 @@
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from importlib import import_module
+
+import requests
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+DEFAULT_PATHS = ("/news/", "/api/check-policy-status/?policy_id=1")
+
+
+class _SlowNewsHandler(BaseHTTPRequestHandler):
+    """Stand-in for NewsAPI that answers every request after `delay` seconds."""
+
+    delay = 1.0
+    body = json.dumps({"articles": [
+        {"title": f"Stub article {i}", "description": "", "url": "", "source": {"name": "stub"}}
+        for i in range(10)
+    ]}).encode()
+
+    def do_GET(self):
+        time.sleep(self.delay)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test a running server: N concurrent clients hammer the given paths as a user and report "
+        "throughput and latency. Compare the WSGI and ASGI deployments by pointing it at each in turn. "
+        "--stub-port starts a slow fake news upstream: start the server with NEWS_API_URL aimed at it and "
+        "NEWS_CACHE_ENABLED=False so every /news/ request waits on it, and use --together to see whether "
+        "those waits starve the other paths of worker threads."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000", help="Base URL of the server under test.")
+        parser.add_argument("--path", action="append", dest="paths", default=None,
+                            help=f"Path to request (repeatable; default: {', '.join(DEFAULT_PATHS)}).")
+        parser.add_argument("--user", required=True, help="Username to send requests as (a session is created).")
+        parser.add_argument("--concurrency", type=int, default=100, help="Concurrent clients.")
+        parser.add_argument("--requests", type=int, default=1000, help="Requests per path.")
+        parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds.")
+        parser.add_argument("--stub-port", type=int, default=None,
+                            help="Serve a fake news upstream on this port while the test runs.")
+        parser.add_argument("--stub-delay-ms", type=int, default=1000, help="Stub upstream response delay.")
+        parser.add_argument("--together", action="store_true",
+                            help="Interleave all paths in one run instead of testing them one after another.")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options["user"])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['user']!r} does not exist.")
+
+        stub = None
+        if options["stub_port"]:
+            _SlowNewsHandler.delay = options["stub_delay_ms"] / 1000
+            stub = ThreadingHTTPServer(("127.0.0.1", options["stub_port"]), _SlowNewsHandler)
+            threading.Thread(target=stub.serve_forever, daemon=True).start()
+            self.stdout.write(f"Stub news upstream on http://127.0.0.1:{options['stub_port']}/ "
+                              f"({options['stub_delay_ms']} ms); start the server with NEWS_API_URL set to it.")
+
+        cookies = {settings.SESSION_COOKIE_NAME: self._session_key(user)}
+        try:
+            urls = [options["url"].rstrip("/") + path for path in options["paths"] or DEFAULT_PATHS]
+            for batch in ([urls] if options["together"] else [[url] for url in urls]):
+                self._run(batch, cookies, options)
+        finally:
+            if stub:
+                stub.shutdown()
+
+    @staticmethod
+    def _session_key(user) -> str:
+        """A logged-in session for `user`, created directly in the session store."""
+        session = import_module(settings.SESSION_ENGINE).SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.save()
+        return session.session_key
+
+    def _run(self, urls, cookies, options):
+        local = threading.local()
+
+        def fetch(index):
+            url = urls[index % len(urls)]
+            if not hasattr(local, "session"):
+                local.session = requests.Session()
+                local.session.cookies.update(cookies)
+            started = time.perf_counter()
+            try:
+                response = local.session.get(url, timeout=options["timeout"], allow_redirects=False)
+                ok = response.status_code < 300  # a redirect here means the login was refused
+            except requests.RequestException:
+                ok = False
+            return url, ok, (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, options["concurrency"])) as pool:
+            results = list(pool.map(fetch, range(options["requests"] * len(urls))))
+        elapsed = time.perf_counter() - started
+
+        for url in urls:
+            timings = sorted(ms for target, _, ms in results if target == url)
+            errors = sum(1 for target, ok, _ in results if target == url and not ok)
+            centiles = statistics.quantiles(timings, n=100) if len(timings) > 1 else timings * 99
+            self.stdout.write(self.style.SUCCESS(
+                f"{url}: {len(timings)} requests, {options['concurrency']} concurrent, {errors} errors; "
+                f"{len(timings) / elapsed:.1f} req/s; latency p50 {centiles[49]:.0f} ms, "
+                f"p95 {centiles[94]:.0f} ms, p99 {centiles[98]:.0f} ms, max {timings[-1]:.0f} ms"
+            ))
@@ -0,0 +1,63 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+from django.db.models import Count
+
+from insapp.models import Policy, TenantShard
+from insapp.sharding import MOVE_CHUNK_SIZE, move_tenant, shard_for, shards
+
+
+class Command(BaseCommand):
+    help = (
+        "Move a tenant's owners, vehicles, policies, accidents and payments to another shard "
+        "(--user and --to), or with no arguments list the tenants and policies on each shard. "
+        "Moved rows get new database ids (policy numbers, payment ids and vehicle numbers are kept): "
+        "the edit pages and ?owner= links redirect from the old ids, but API clients holding ids "
+        "must fetch them again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", default=None, help="Username of the tenant to move.")
+        parser.add_argument("--to", dest="target", choices=shards(), default=None, help="Destination shard.")
+        parser.add_argument("--chunk-size", type=int, default=MOVE_CHUNK_SIZE, help="Rows copied per INSERT.")
+
+    def handle(self, *args, **options):
+        if not options["user"] and not options["target"]:
+            return self._report()
+        if not (options["user"] and options["target"]):
+            raise CommandError("Pass both --user and --to to move a tenant.")
+        try:
+            user = User.objects.get(username=options["user"])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['user']!r} does not exist.")
+
+        source = shard_for(user)
+        if source == options["target"]:
+            self.stdout.write(f"{user.username} is already on {source}.")
+            return
+        started = time.monotonic()
+        verbosity = options["verbosity"]
+
+        def progress(name, count):
+            if verbosity > 1:
+                self.stdout.write(f"  {count} {name} copied ({time.monotonic() - started:.1f}s)")
+
+        try:
+            copied = move_tenant(user, options["target"], chunk_size=max(1, options["chunk_size"]),
+                                 progress=progress)
+        except (IntegrityError, RuntimeError) as exc:
+            # e.g. a vehicle number or payment id already taken on the destination shard.
+            raise CommandError(f"Move aborted; {user.username} stays on {source}: {exc}")
+        summary = ", ".join(f"{count} {name}" for name, count in copied.items())
+        self.stdout.write(self.style.SUCCESS(
+            f"Moved {user.username} from {source} to {options['target']} ({summary}) "
+            f"in {time.monotonic() - started:.1f}s."
+        ))
+
+    def _report(self):
+        tenants = dict(TenantShard.objects.values_list("shard").annotate(Count("user")))
+        for alias in shards():
+            policies = Policy.objects.using(alias).count()
+            self.stdout.write(f"{alias}: {tenants.get(alias, 0)} tenants, {policies} policies")
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from insapp.stats import rebuild_all_stats
+
+
+class Command(BaseCommand):
+    help = "Rebuild the materialized per-user dashboard counters from the source tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, action="append", dest="user_ids",
+                            help="Only rebuild this user id (repeatable). Defaults to every user.")
+
+    def handle(self, *args, **options):
+        written = rebuild_all_stats(options["user_ids"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt dashboard stats for {written} user(s)."))
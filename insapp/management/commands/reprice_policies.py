@@ -0,0 +1,59 @@
+import time
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from insapp.ledger import state_filter
+from insapp.lifecycle import POLICY_STATES, UPCOMING
+from insapp.models import Policy
+from insapp.premiums import REPRICE_BATCH_SIZE, reprice_policies
+from insapp.sharding import shards, tenant_db
+
+
+class Command(BaseCommand):
+    help = "Re-rate policies with the risk-based pricing engine (by default upcoming renewals) and save new premiums."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", default=None, help="Only this username's policies (default: every user).")
+        parser.add_argument("--status", choices=POLICY_STATES + ("all",), default=UPCOMING,
+                            help="Lifecycle state to reprice (default: upcoming).")
+        parser.add_argument("--batch-size", type=int, default=REPRICE_BATCH_SIZE, help="Policies priced per pass.")
+        parser.add_argument("--today", type=date.fromisoformat, default=None,
+                            help="Reference date for the claims history (YYYY-MM-DD); defaults to today.")
+        parser.add_argument("--dry-run", action="store_true", help="Report the changes without saving them.")
+
+    def handle(self, *args, **options):
+        queryset = Policy.objects.all()
+        user = None
+        if options["user"]:
+            try:
+                user = User.objects.get(username=options["user"])
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['user']!r} does not exist.")
+            queryset = queryset.filter(user=user)
+        if options["status"] != "all":
+            # From the dates, like the ledger, so a late sweep_policies run cannot hide renewals.
+            queryset = queryset.filter(state_filter(options["status"], options["today"] or date.today()))
+
+        started = time.monotonic()
+        verbosity = options["verbosity"]
+
+        def progress(summary):
+            if verbosity > 1:
+                self.stdout.write(f"  {summary['policies']} policies priced, {summary['repriced']} changed "
+                                  f"({time.monotonic() - started:.1f}s)")
+
+        summary = {}
+        for alias in [tenant_db(user)] if user else shards():
+            shard_summary = reprice_policies(queryset.using(alias), today=options["today"],
+                                             batch_size=max(1, options["batch_size"]), dry_run=options["dry_run"],
+                                             user=user, progress=progress)
+            for key, value in shard_summary.items():
+                summary[key] = round(summary.get(key, 0) + value, 2)
+        verb = "Would reprice" if options["dry_run"] else "Repriced"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {summary['repriced']} of {summary['policies']} policies "
+            f"(premiums {summary['premium_before']:.2f} -> {summary['premium_after']:.2f}; "
+            f"{summary['unpriced']} of unknown products left unchanged) in {time.monotonic() - started:.1f}s."
+        ))
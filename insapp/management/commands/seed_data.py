@@ -0,0 +1,54 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from insapp.seed import bulk_seed
+
+
+class Command(BaseCommand):
+    help = "Bulk-seed synthetic owners, vehicles, policies, accidents and payments for load testing."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1, help="Number of users to seed (default 1).")
+        parser.add_argument("--owners", type=int, default=1000, help="Owners per user (default 1000).")
+        parser.add_argument("--vehicles", type=int, default=2, help="Vehicles (and policies) per owner (default 2).")
+        parser.add_argument("--claim-rate", type=float, default=0.3, help="Fraction of policies with an accident.")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed for deterministic output.")
+        parser.add_argument("--prefix", default="loaduser", help="Username prefix (users are <prefix>1..N).")
+        parser.add_argument("--workers", type=int, default=None, help="Generator processes (default: CPUs - 1).")
+        parser.add_argument("--batch-owners", type=int, default=500, help="Owners generated per batch/transaction.")
+        parser.add_argument("--chunk-size", type=int, default=2000, help="Rows per bulk_create INSERT.")
+        parser.add_argument("--today", type=date.fromisoformat, default=None,
+                            help="Reference date (YYYY-MM-DD) for reproducible runs across days.")
+
+    def handle(self, *args, **options):
+        if options["users"] < 1 or options["owners"] < 0 or options["vehicles"] < 0:
+            raise CommandError("--users must be at least 1 and sizes must not be negative.")
+        if not 0 <= options["claim_rate"] <= 1:
+            raise CommandError("--claim-rate must be between 0 and 1.")
+
+        started = time.monotonic()
+        verbosity = options["verbosity"]
+
+        def progress(totals):
+            if verbosity > 1:
+                self.stdout.write(f"  {totals['policies']} policies written ({time.monotonic() - started:.1f}s)")
+
+        totals = bulk_seed(
+            num_users=options["users"],
+            owners_per_user=options["owners"],
+            vehicles_per_owner=options["vehicles"],
+            claim_rate=options["claim_rate"],
+            seed=options["seed"],
+            username_prefix=options["prefix"],
+            workers=options["workers"],
+            owners_per_batch=max(1, options["batch_owners"]),
+            chunk_size=options["chunk_size"],
+            today=options["today"],
+            progress=progress,
+        )
+        summary = ", ".join(f"{count} {name}" for name, count in totals.items())
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {summary} in {time.monotonic() - started:.1f}s."
+        ))
@@ -0,0 +1,18 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from insapp.ledger import sweep_policy_states
+
+
+class Command(BaseCommand):
+    help = "Move policies into their current lifecycle state (active/upcoming/expired). Run daily."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--today", type=date.fromisoformat, default=None,
+                            help="Reference date (YYYY-MM-DD); defaults to today.")
+
+    def handle(self, *args, **options):
+        moved = sweep_policy_states(options["today"])
+        summary = ", ".join(f"{count} to {state}" for state, count in moved.items())
+        self.stdout.write(self.style.SUCCESS(f"Swept policy states: {summary}."))
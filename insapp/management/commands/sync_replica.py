@@ -0,0 +1,52 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the primary SQLite database onto the DATABASE_REPLICAS files (a local stand-in for "
+        "replication). Uses SQLite's online backup, so the primary stays writable and replica readers "
+        "see either the old or the new snapshot. With --interval, repeats until interrupted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", action="append", dest="aliases", default=None,
+                            help="Replica alias to sync (repeatable; default: all).")
+        parser.add_argument("--interval", type=float, default=0,
+                            help="Seconds between syncs; 0 syncs once. Keep it below REPLICA_STICKY_SECONDS.")
+
+    def handle(self, *args, **options):
+        replicas = options["aliases"] or list(settings.DATABASE_REPLICAS)
+        if not replicas:
+            raise CommandError("No replicas configured; set DB_REPLICAS (e.g. DB_REPLICAS=db.replica.sqlite3).")
+        unknown = set(replicas) - set(settings.DATABASE_REPLICAS)
+        if unknown:
+            raise CommandError(f"Not a replica alias: {', '.join(sorted(unknown))}.")
+        for alias in (DEFAULT_DB_ALIAS, *replicas):
+            if connections[alias].vendor != "sqlite":
+                raise CommandError("sync_replica only applies to the SQLite backend.")
+
+        while True:
+            for alias in replicas:
+                started = time.perf_counter()
+                self._sync(connections[DEFAULT_DB_ALIAS].settings_dict["NAME"], connections[alias].settings_dict["NAME"])
+                self.stdout.write(self.style.SUCCESS(
+                    f"Synced {alias} ({connections[alias].settings_dict['NAME']}) "
+                    f"in {(time.perf_counter() - started) * 1000:.0f} ms."
+                ))
+            if options["interval"] <= 0:
+                break
+            time.sleep(options["interval"])
+
+    @staticmethod
+    def _sync(source, target) -> None:
+        src, dst = sqlite3.connect(source), sqlite3.connect(target)
+        try:
+            src.backup(dst)
+        finally:
+            src.close()
+            dst.close()
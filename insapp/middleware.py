@@ -0,0 +1,244 @@
+import heapq
+import json
+import logging
+import random
+import re
+import time
+from contextlib import ExitStack
+from typing import Dict, List, Tuple
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+
+from . import routers, sharding
+
+logger = logging.getLogger("insapp.sql")
+
+DEFAULTS = {
+    "ENABLED": True,
+    # Add a Server-Timing header (db and app durations, query count) to every response.
+    "SERVER_TIMING": True,
+    # Requests at least this slow (ms) are candidates for the slow-request log...
+    "SLOW_REQUEST_MS": 500,
+    # ...and this fraction of them is actually logged.
+    "SAMPLE_RATE": 1.0,
+    # Slowest statements included in a log record.
+    "TOP_STATEMENTS": 3,
+    # A normalized statement run this many times in one request is reported as a likely N+1.
+    "REPEAT_THRESHOLD": 5,
+}
+
+_IN_LIST_RE = re.compile(r'IN \((?:%s, )*%s\)')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_sql(sql: str) -> str:
+    """Signature of a statement: Django already parameterizes values, so only collapse IN lists and spacing."""
+    return _WHITESPACE_RE.sub(' ', _IN_LIST_RE.sub('IN (...)', sql)).strip()
+
+
+class QueryRecorder:
+    """
+    connection.execute_wrapper hook that times every statement. Per query it only
+    does a dict update and a bounded heap push; grouping by normalized SQL is
+    deferred until the request has finished.
+    """
+
+    def __init__(self, top_n: int):
+        self.top_n = top_n
+        self.count = 0
+        self.total = 0.0
+        self.by_sql: Dict[str, List] = {}
+        self.slowest: List[Tuple[float, str]] = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.total += elapsed
+            entry = self.by_sql.get(sql)
+            if entry is None:
+                self.by_sql[sql] = [1, elapsed]
+            else:
+                entry[0] += 1
+                entry[1] += elapsed
+            if len(self.slowest) < self.top_n:
+                heapq.heappush(self.slowest, (elapsed, sql))
+            elif elapsed > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, (elapsed, sql))
+
+    def repeated(self, threshold: int) -> List[Dict]:
+        """Normalized statements executed at least `threshold` times, most frequent first."""
+        grouped: Dict[str, List] = {}
+        for sql, (count, elapsed) in self.by_sql.items():
+            entry = grouped.setdefault(normalize_sql(sql), [0, 0.0])
+            entry[0] += count
+            entry[1] += elapsed
+        return [
+            {"sql": sql, "count": count, "ms": round(elapsed * 1000, 2)}
+            for sql, (count, elapsed) in sorted(grouped.items(), key=lambda item: -item[1][0])
+            if count >= threshold
+        ]
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Records per-request SQL statistics for every configured database: query count,
+    total DB time, slowest statements and repeated (N+1) statement signatures.
+    Emits them as a Server-Timing header and, for slow requests, as a sampled
+    JSON log record on the "insapp.sql" logger. Configure with the
+    SQL_INSTRUMENTATION setting (see DEFAULTS).
+
+    Sync and async capable, so under ASGI async views are not pushed back onto a thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.config = {**DEFAULTS, **getattr(settings, "SQL_INSTRUMENTATION", {})}
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not self.config["ENABLED"]:
+            return self.get_response(request)
+
+        recorder = QueryRecorder(self.config["TOP_STATEMENTS"])
+        started = time.perf_counter()
+        with self._recording(recorder):
+            response = self.get_response(request)
+        return self._finish(request, response, recorder, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        if not self.config["ENABLED"]:
+            return await self.get_response(request)
+
+        recorder = QueryRecorder(self.config["TOP_STATEMENTS"])
+        started = time.perf_counter()
+        # Connections belong to the thread that creates them, so set up on the async ORM's thread.
+        with await sync_to_async(self._recording)(recorder):
+            response = await self.get_response(request)
+        return self._finish(request, response, recorder, time.perf_counter() - started)
+
+    @staticmethod
+    def _recording(recorder) -> ExitStack:
+        stack = ExitStack()
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(recorder))
+        return stack
+
+    def _finish(self, request, response, recorder, elapsed):
+        config = self.config
+        db_ms = recorder.total * 1000
+        total_ms = elapsed * 1000
+        if config["SERVER_TIMING"]:
+            timing = f'db;dur={db_ms:.1f};desc="{recorder.count} queries", app;dur={total_ms - db_ms:.1f}'
+            existing = response.get("Server-Timing")
+            response["Server-Timing"] = f"{existing}, {timing}" if existing else timing
+
+        if total_ms >= config["SLOW_REQUEST_MS"] and random.random() < config["SAMPLE_RATE"]:
+            self._log_slow_request(request, response, recorder, total_ms, db_ms)
+        return response
+
+    def _log_slow_request(self, request, response, recorder, total_ms, db_ms):
+        match = getattr(request, "resolver_match", None)
+        record = {
+            "event": "slow_request",
+            "method": request.method,
+            "path": request.path,
+            "view": match.view_name if match else None,
+            "status": response.status_code,
+            "total_ms": round(total_ms, 2),
+            "db_ms": round(db_ms, 2),
+            "queries": recorder.count,
+            "slowest": [
+                {"sql": normalize_sql(sql), "ms": round(seconds * 1000, 2)}
+                for seconds, sql in sorted(recorder.slowest, reverse=True)
+            ],
+            "repeated": recorder.repeated(self.config["REPEAT_THRESHOLD"]),
+        }
+        logger.warning(json.dumps(record))
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Holds the per-request state insapp.routers.PrimaryReplicaRouter routes by, and
+    pins a client to the primary for REPLICA_STICKY_SECONDS after a request that
+    wrote. Goes before SessionMiddleware, so session saves count as writes.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        token = routers.begin_request(request)
+        return routers.end_request(token, self.get_response(request))
+
+    async def __acall__(self, request):
+        token = routers.begin_request(request)
+        return routers.end_request(token, await self.get_response(request))
+
+
+class TenantShardMiddleware:
+    """
+    Binds request.user as the tenant insapp.routers.TenantShardRouter routes by,
+    and answers 503 to writes by a tenant that `manage.py rebalance_tenants` is
+    moving. Goes after AuthenticationMiddleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+    retry_after = 30
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def _moving_response(self):
+        response = HttpResponse("This account is being moved; try again shortly.", status=503,
+                                content_type="text/plain")
+        response["Retry-After"] = str(self.retry_after)
+        return response
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        token = sharding.bind_request(request)
+        try:
+            if (request.method not in routers.SAFE_METHODS and sharding.enabled()
+                    and request.user.is_authenticated and sharding.is_moving(request.user)):
+                return self._moving_response()
+            return self.get_response(request)
+        finally:
+            sharding.unbind(token)
+
+    async def __acall__(self, request):
+        token = sharding.bind_request(request)
+        try:
+            if request.method not in routers.SAFE_METHODS and sharding.enabled():
+                user = await request.auser()
+                if user.is_authenticated and await sync_to_async(sharding.is_moving)(user):
+                    return self._moving_response()
+            return await self.get_response(request)
+        finally:
+            sharding.unbind(token)
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('insapp', '0002_owner_dob_vehicle_vehicle_type_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='insapp_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('owner_count', models.IntegerField(default=0)),
+                ('vehicle_count', models.IntegerField(default=0)),
+                ('policy_count', models.IntegerField(default=0)),
+                ('payment_count', models.IntegerField(default=0)),
+                ('accident_count', models.IntegerField(default=0)),
+            ],
+        ),
+    ]
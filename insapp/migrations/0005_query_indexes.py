@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:08
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('insapp', '0004_sequence'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='accident',
+            index=models.Index(fields=['owner', '-date_of_accident', '-id'], name='accident_owner_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='accident',
+            index=models.Index(fields=['-date_of_accident', '-id'], name='accident_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='owner',
+            index=models.Index(fields=['user', 'owner'], name='owner_user_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='policy',
+            index=models.Index(fields=['user', 'owner', '-start_date'], name='policy_user_owner_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vehicle',
+            index=models.Index(fields=['user', 'owner'], name='vehicle_user_owner_idx'),
+        ),
+    ]
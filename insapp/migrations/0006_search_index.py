@@ -0,0 +1,80 @@
+from django.db import migrations
+
+# FTS5 index over owner names/phones and vehicle plates/VINs for the typeahead API.
+# Rows are keyed rowid = id * 2 (owners) / id * 2 + 1 (vehicles) and maintained by
+# triggers, so bulk_create and raw SQL writes stay in sync too. SQLite only; other
+# backends fall back to LIKE queries in insapp.typeahead.
+# Note: Django rebuilds SQLite tables for some ALTER operations, which drops their
+# triggers; a later migration that rebuilds insapp_owner or insapp_vehicle must
+# recreate the triggers below.
+
+# Digits-only copy of a phone number so "9876543210" matches "+91 98765 43210".
+PHONE_DIGITS = "replace(replace(replace(replace(replace(replace({col}, ' ', ''), '-', ''), '+', ''), '(', ''), ')', ''), '.', '')"
+
+OWNER_ROW = (
+    "{row}.id * 2, 'owner', {row}.id, {row}.id, 'u' || ifnull({row}.user_id, 0), "
+    "{row}.owner || ' (' || {row}.phone_number || ')', "
+    "{row}.owner || ' ' || {row}.phone_number || ' ' || " + PHONE_DIGITS.format(col="{row}.phone_number")
+)
+VEHICLE_ROW = (
+    "{row}.id * 2 + 1, 'vehicle', {row}.id, {row}.owner_id, 'u' || ifnull({row}.user_id, 0), "
+    "{row}.vehicle_number || ' - ' || {row}.title, "
+    "{row}.vehicle_number || ' ' || replace({row}.vehicle_number, '-', '') || ' ' || {row}.vin || ' ' || "
+    "{row}.title || ' ' || {row}.model_name"
+)
+COLUMNS = "rowid, kind, obj_id, owner_id, tenant, label, body"
+
+CREATE_SQL = [
+    "CREATE VIRTUAL TABLE insapp_search USING fts5("
+    "kind, obj_id UNINDEXED, owner_id UNINDEXED, tenant, label UNINDEXED, body, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '1 2 3')",
+
+    f"INSERT INTO insapp_search({COLUMNS}) SELECT {OWNER_ROW.format(row='o')} FROM insapp_owner o",
+    f"INSERT INTO insapp_search({COLUMNS}) SELECT {VEHICLE_ROW.format(row='v')} FROM insapp_vehicle v",
+
+    f"CREATE TRIGGER insapp_search_owner_ai AFTER INSERT ON insapp_owner BEGIN "
+    f"INSERT INTO insapp_search({COLUMNS}) VALUES ({OWNER_ROW.format(row='new')}); END",
+    "CREATE TRIGGER insapp_search_owner_ad AFTER DELETE ON insapp_owner BEGIN "
+    "DELETE FROM insapp_search WHERE rowid = old.id * 2; END",
+    f"CREATE TRIGGER insapp_search_owner_au AFTER UPDATE ON insapp_owner BEGIN "
+    f"DELETE FROM insapp_search WHERE rowid = old.id * 2; "
+    f"INSERT INTO insapp_search({COLUMNS}) VALUES ({OWNER_ROW.format(row='new')}); END",
+
+    f"CREATE TRIGGER insapp_search_vehicle_ai AFTER INSERT ON insapp_vehicle BEGIN "
+    f"INSERT INTO insapp_search({COLUMNS}) VALUES ({VEHICLE_ROW.format(row='new')}); END",
+    "CREATE TRIGGER insapp_search_vehicle_ad AFTER DELETE ON insapp_vehicle BEGIN "
+    "DELETE FROM insapp_search WHERE rowid = old.id * 2 + 1; END",
+    f"CREATE TRIGGER insapp_search_vehicle_au AFTER UPDATE ON insapp_vehicle BEGIN "
+    f"DELETE FROM insapp_search WHERE rowid = old.id * 2 + 1; "
+    f"INSERT INTO insapp_search({COLUMNS}) VALUES ({VEHICLE_ROW.format(row='new')}); END",
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS insapp_search_owner_ai",
+    "DROP TRIGGER IF EXISTS insapp_search_owner_ad",
+    "DROP TRIGGER IF EXISTS insapp_search_owner_au",
+    "DROP TRIGGER IF EXISTS insapp_search_vehicle_ai",
+    "DROP TRIGGER IF EXISTS insapp_search_vehicle_ad",
+    "DROP TRIGGER IF EXISTS insapp_search_vehicle_au",
+    "DROP TABLE IF EXISTS insapp_search",
+]
+
+
+def _run(statements):
+    def apply(apps, schema_editor):
+        if schema_editor.connection.vendor != "sqlite":
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return apply
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('insapp', '0005_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(_run(CREATE_SQL), _run(DROP_SQL)),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:25
+
+from datetime import date
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_status(apps, schema_editor):
+    # Every row starts as "active"; two set-based UPDATEs move the rest.
+    Policy = apps.get_model('insapp', 'Policy')
+    today = date.today()
+    Policy.objects.filter(start_date__gt=today).update(status='upcoming')
+    Policy.objects.filter(end_date__lt=today).update(status='expired')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('insapp', '0007_vehicle_vin_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='policy',
+            name='status',
+            field=models.CharField(choices=[('active', 'Active'), ('upcoming', 'Upcoming'), ('expired', 'Expired')], default='active', max_length=10),
+        ),
+        migrations.RunPython(backfill_status, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='policy',
+            index=models.Index(fields=['user', 'owner', 'status'], name='policy_user_owner_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='policy',
+            index=models.Index(fields=['status', 'start_date'], name='policy_status_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='policy',
+            index=models.Index(fields=['status', 'end_date'], name='policy_status_end_idx'),
+        ),
+    ]
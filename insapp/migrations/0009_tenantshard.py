@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def place_existing_users(apps, schema_editor):
+    # Data written before sharding stays where it is: every existing user is on "default".
+    if schema_editor.connection.alias != 'default':
+        return
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    TenantShard = apps.get_model('insapp', 'TenantShard')
+    TenantShard.objects.bulk_create(
+        (TenantShard(user_id=user_id, shard='default') for user_id in User.objects.values_list('id', flat=True).iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('insapp', '0008_policy_status'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TenantShard',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='insapp_shard', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('shard', models.CharField(max_length=50)),
+                ('moving', models.BooleanField(default=False)),
+            ],
+        ),
+        migrations.RunPython(place_existing_users, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,11 @@
+from datetime import date
+
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
 
+from .lifecycle import ACTIVE, POLICY_STATE_CHOICES, policy_state
+
 # ------------------- OWNER MODEL -------------------
 
 class Owner(models.Model):
@@ -11,6 +15,12 @@ class Owner(models.Model):
     phone_number = models.CharField(max_length=15)
     dob = models.DateField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # owners list and search box: WHERE user_id = ? [AND owner ...]
+            models.Index(fields=['user', 'owner'], name='owner_user_name_idx'),
+        ]
+
     def __str__(self):
         return self.owner
 
@@ -26,6 +36,14 @@ class Vehicle(models.Model):
     vehicle_type = models.CharField(max_length=50, default='Unknown')
     vin = models.CharField(max_length=17)
 
+    class Meta:
+        indexes = [
+            # vehicle dropdowns: WHERE user_id = ? AND owner_id = ?
+            models.Index(fields=['user', 'owner'], name='vehicle_user_owner_idx'),
+            # bulk import duplicate check: WHERE vin IN (...)
+            models.Index(fields=['vin'], name='vehicle_vin_idx'),
+        ]
+
     def __str__(self):
         return f"{self.title} ({self.vehicle_number})"
 
@@ -40,10 +58,29 @@ class Policy(models.Model):
     start_date = models.DateField()
     end_date = models.DateField()
     premium_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    # Stored lifecycle state; kept in step with the dates by save() and the sweep_policies command.
+    status = models.CharField(max_length=10, choices=POLICY_STATE_CHOICES, default=ACTIVE)
+
+    class Meta:
+        indexes = [
+            # policy ledger: WHERE user_id = ? AND owner_id = ? ORDER BY start_date DESC
+            models.Index(fields=['user', 'owner', '-start_date'], name='policy_user_owner_start_idx'),
+            # ledger status tabs and counts: WHERE user_id = ? AND owner_id = ? AND status = ?
+            models.Index(fields=['user', 'owner', 'status'], name='policy_user_owner_status_idx'),
+            # sweeper: WHERE status IN (...) AND start_date / end_date crosses today
+            models.Index(fields=['status', 'start_date'], name='policy_status_start_idx'),
+            models.Index(fields=['status', 'end_date'], name='policy_status_end_idx'),
+        ]
 
     def __str__(self):
         return f"Policy {self.policy_number} - {self.policy_type}"
 
+    def save(self, *args, **kwargs):
+        start_date = self._meta.get_field('start_date').to_python(self.start_date)
+        end_date = self._meta.get_field('end_date').to_python(self.end_date)
+        self.status = policy_state(start_date, end_date, date.today())
+        super().save(*args, **kwargs)
+
 # ------------------- ACCIDENT MODEL -------------------
 
 class Accident(models.Model):
@@ -56,6 +93,13 @@ class Accident(models.Model):
     policy_status = models.CharField(max_length=20, choices=[("Active", "Active"), ("Lapsed", "Lapsed")])
     reported_at = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [
+            # /filter/ keyset pages and time-range buckets, per owner of the user
+            models.Index(fields=['owner', '-date_of_accident', '-id'], name='accident_owner_date_idx'),
+            models.Index(fields=['-date_of_accident', '-id'], name='accident_date_id_idx'),
+        ]
+
     def __str__(self):
         return f"Accident on {self.date_of_accident} - {self.vehicle.vehicle_number}"
 
@@ -73,4 +117,76 @@ class Payment(models.Model):
     payment_method = models.CharField(max_length=50)
 
     def __str__(self):
-        return f"Payment {self.payment_id}: ₹{self.amount} on {self.payment_date} for Policy {self.policy.policy_number}"
\ No newline at end of file
+        return f"Payment {self.payment_id}: ₹{self.amount} on {self.payment_date} for Policy {self.policy.policy_number}"
+
+# ------------------- USER STATS MODEL -------------------
+
+class UserStats(models.Model):
+    """
+    Materialized per-user entity counts for the dashboard.
+    Kept current by the receivers in insapp.signals; rebuild with `manage.py rebuild_user_stats`.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='insapp_stats')
+    owner_count = models.IntegerField(default=0)
+    vehicle_count = models.IntegerField(default=0)
+    policy_count = models.IntegerField(default=0)
+    payment_count = models.IntegerField(default=0)
+    accident_count = models.IntegerField(default=0)
+
+    def has_required_data(self):
+        """True when the user has at least one owner, vehicle, policy, payment and accident."""
+        return all([self.owner_count, self.vehicle_count, self.policy_count, self.payment_count, self.accident_count])
+
+    def __str__(self):
+        return f"Stats for {self.user}"
+
+
+# ------------------- SEQUENCE MODEL -------------------
+
+class Sequence(models.Model):
+    """
+    Named counter row used to hand out identifiers (e.g. policy numbers).
+    Allocate through insapp.sequences, never by editing next_value directly.
+    """
+    name = models.CharField(max_length=50, primary_key=True)
+    next_value = models.BigIntegerField()
+
+    def __str__(self):
+        return f"{self.name} -> {self.next_value}"
+
+
+# ------------------- TENANT SHARD MODEL -------------------
+
+class TenantShard(models.Model):
+    """
+    Which database shard holds a user's insapp rows. Lives on the default database only;
+    resolve and move tenants through insapp.sharding, never by editing rows directly.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='insapp_shard')
+    shard = models.CharField(max_length=50)
+    # Set while `manage.py rebalance_tenants` copies the tenant; writes are refused meanwhile.
+    moving = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f"{self.user_id} -> {self.shard}"
+
+
+class MovedRow(models.Model):
+    """
+    The id a tenant's row got when `manage.py rebalance_tenants` moved it to
+    another shard (ids are per shard), so links to the old id can be redirected.
+    Lives on the default database only, like TenantShard; written by insapp.sharding.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    # Model label, e.g. "insapp.owner".
+    model = models.CharField(max_length=50)
+    old_id = models.BigIntegerField()
+    new_id = models.BigIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'model', 'old_id'], name='movedrow_user_model_old_id_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.model} {self.old_id} -> {self.new_id}"
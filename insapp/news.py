@@ -1,58 +1,353 @@
-
+import asyncio
 import os
+import time
 import logging
-from typing import List, Dict, Optional
-import requests
+import threading
+from functools import lru_cache
+from typing import List, Dict, Optional, Tuple
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from requests.exceptions import RequestException, Timeout
+from django.core.cache import cache
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_NEWS_API_URL = "https://newsapi.org/v2/everything"
+
 
 def _get_api_key() -> Optional[str]:
     return getattr(settings, "NEWS_API_KEY", None) or os.getenv("NEWS_API_KEY","your_api_key")
 
 
-def fetch_accident_news(limit: int = 10) -> List[Dict]:
-    """
-    Fetch recent news only about vehicle/car/road accidents and collisions.
-    Returns a list of simplified article dicts. Empty list on error or when API key is missing.
-    """
-    api_key = _get_api_key()
-    if not api_key:
-        logger.warning("NEWS_API_KEY not set; fetch_accident_news returning empty list.")
-        return []
+def _get_api_url() -> str:
+    # Overridable so tests can point the client at a local stub server.
+    return getattr(settings, "NEWS_API_URL", None) or DEFAULT_NEWS_API_URL
+
 
-    url = "https://newsapi.org/v2/everything"
+def _request_params(limit: int) -> Dict:
     # focused query for vehicle/car/road accidents and collisions
     query = (
         "vehicle crash OR car crash OR traffic accident OR road accident OR "
         "vehicle accident OR collision OR multi-vehicle crash"
     )
-    params = {
+    return {
         "q": query,
         "language": "en",
         "sortBy": "publishedAt",
         "pageSize": max(1, min(limit, 100)),
-        "apiKey": api_key,
+        "apiKey": _get_api_key(),
     }
 
+
+# The HTTP clients are imported on the first upstream call, not when a worker boots.
+
+@lru_cache(maxsize=None)
+def _httpx():
     try:
-        resp = requests.get(url, params=params, timeout=6)
+        import httpx
+    except ImportError:  # optional: without it the async path runs the blocking client in a worker thread
+        return None
+    return httpx
+
+
+@lru_cache(maxsize=None)
+def _fetch_errors() -> tuple:
+    """Failures of either client that the callers degrade on."""
+    from requests.exceptions import RequestException, Timeout
+    httpx = _httpx()
+    return (RequestException, Timeout, ValueError) + ((httpx.HTTPError,) if httpx else ())
+
+
+def _request_accident_news(limit: int) -> List[Dict]:
+    """
+    Call NewsAPI and return simplified articles.
+    Raises RequestException / ValueError on failure; callers decide how to degrade.
+    """
+    import requests
+
+    resp = requests.get(_get_api_url(), params=_request_params(limit),
+                        timeout=getattr(settings, "NEWS_API_TIMEOUT", 6))
+    resp.raise_for_status()
+    return _simplify(resp.json())
+
+
+async def _arequest_accident_news(limit: int) -> List[Dict]:
+    """_request_accident_news without blocking the event loop; raises _fetch_errors() on failure."""
+    httpx = _httpx()
+    if httpx is None:
+        return await sync_to_async(_request_accident_news, thread_sensitive=False)(limit)
+    async with httpx.AsyncClient(timeout=getattr(settings, "NEWS_API_TIMEOUT", 6)) as client:
+        resp = await client.get(_get_api_url(), params=_request_params(limit))
         resp.raise_for_status()
-        payload = resp.json()
-        articles = payload.get("articles", []) if isinstance(payload, dict) else []
-        results: List[Dict] = []
-        for a in articles:
-            results.append({
-                "title": a.get("title", ""),
-                "description": a.get("description", ""),
-                "url": a.get("url", ""),
-                "source": (a.get("source") or {}).get("name", ""),
-                "publishedAt": a.get("publishedAt", ""),
-                "image": a.get("urlToImage", ""),
-            })
-        return results
-    except (RequestException, Timeout, ValueError) as exc:
+        return _simplify(resp.json())
+
+
+def _simplify(payload) -> List[Dict]:
+    articles = payload.get("articles", []) if isinstance(payload, dict) else []
+    results: List[Dict] = []
+    for a in articles:
+        results.append({
+            "title": a.get("title", ""),
+            "description": a.get("description", ""),
+            "url": a.get("url", ""),
+            "source": (a.get("source") or {}).get("name", ""),
+            "publishedAt": a.get("publishedAt", ""),
+            "image": a.get("urlToImage", ""),
+        })
+    return results
+
+
+def fetch_accident_news(limit: int = 10) -> List[Dict]:
+    """
+    Fetch recent news only about vehicle/car/road accidents and collisions.
+    Returns a list of simplified article dicts. Empty list on error or when API key is missing.
+    """
+    api_key = _get_api_key()
+    if not api_key:
+        logger.warning("NEWS_API_KEY not set; fetch_accident_news returning empty list.")
+        return []
+
+    try:
+        return _request_accident_news(limit)
+    except _fetch_errors() as exc:
         logger.error("Error fetching accident news: %s", exc)
         return []
+
+
+async def afetch_accident_news(limit: int = 10) -> List[Dict]:
+    """fetch_accident_news for async callers."""
+    if not _get_api_key():
+        logger.warning("NEWS_API_KEY not set; afetch_accident_news returning empty list.")
+        return []
+    try:
+        return await _arequest_accident_news(limit)
+    except _fetch_errors() as exc:
+        logger.error("Error fetching accident news: %s", exc)
+        return []
+
+
+def _cache_enabled() -> bool:
+    # Off (every call goes upstream) only to load-test the uncached path; see manage.py load_test.
+    return getattr(settings, "NEWS_CACHE_ENABLED", True)
+
+
+# ------------------- CACHE -------------------
+#
+# Entries live both in this process (no round-trip on the hot path) and in the
+# Django cache (shared between workers). An entry is "fresh" until expires_at and
+# may still be served, while a background refresh runs, until stale_until.
+# Failed refreshes are negatively cached for NEWS_CACHE_ERROR_TTL seconds.
+
+_local_entries: Dict[str, Dict] = {}
+_inflight = set()
+_inflight_lock = threading.Lock()
+
+
+def _cache_settings():
+    return (
+        getattr(settings, "NEWS_CACHE_TTL", 600),
+        getattr(settings, "NEWS_CACHE_STALE_TTL", 24 * 60 * 60),
+        getattr(settings, "NEWS_CACHE_ERROR_TTL", 60),
+    )
+
+
+def _cache_key(limit: int) -> str:
+    return f"insapp:news:{limit}"
+
+
+def _store(key: str, entry: Dict) -> None:
+    _local_entries[key] = entry
+    cache.set(key, entry, timeout=max(1, int(entry["stale_until"] - time.time())))
+
+
+def _lookup(key: str, now: float) -> Optional[Dict]:
+    """Local entry if fresh, else whatever another worker left in the shared cache."""
+    entry = _local_entries.get(key)
+    if entry and now < entry["expires_at"]:
+        return entry
+    shared = cache.get(key)
+    if shared and (not entry or shared["expires_at"] > entry["expires_at"]):
+        _local_entries[key] = shared
+        return shared
+    return entry
+
+
+def _fresh_entry(articles: List[Dict], now: float) -> Dict:
+    ttl, stale_ttl, _ = _cache_settings()
+    return {"articles": articles, "expires_at": now + ttl, "stale_until": now + ttl + stale_ttl, "error": False}
+
+
+def _failed_entry(previous: Optional[Dict], now: float) -> Dict:
+    """Negative entry that keeps serving the last good articles."""
+    _, _, error_ttl = _cache_settings()
+    previous = previous or {}
+    return {
+        "articles": previous.get("articles", []),
+        "expires_at": now + error_ttl,
+        "stale_until": max(previous.get("stale_until", 0), now + error_ttl),
+        "error": True,
+    }
+
+
+def _refresh(key: str, limit: int) -> Dict:
+    """Fetch from upstream and store the outcome, keeping the last good articles on failure."""
+    now = time.time()
+    try:
+        entry = _fresh_entry(_request_accident_news(limit) if _get_api_key() else [], now)
+    except _fetch_errors() as exc:
+        logger.error("Error refreshing accident news: %s", exc)
+        entry = _failed_entry(_local_entries.get(key) or cache.get(key), now)
+    _store(key, entry)
+    return entry
+
+
+async def _arefresh(key: str, limit: int) -> Dict:
+    """_refresh for async callers: the upstream call and cache writes do not block the event loop."""
+    now = time.time()
+    try:
+        entry = _fresh_entry(await _arequest_accident_news(limit) if _get_api_key() else [], now)
+    except _fetch_errors() as exc:
+        logger.error("Error refreshing accident news: %s", exc)
+        entry = _failed_entry(_local_entries.get(key) or await cache.aget(key), now)
+    _local_entries[key] = entry
+    await cache.aset(key, entry, timeout=max(1, int(entry["stale_until"] - time.time())))
+    return entry
+
+
+def _claim_refresh(key: str) -> bool:
+    """Single-flight guard: True if the caller should run the refresh for key."""
+    with _inflight_lock:
+        if key in _inflight:
+            return False
+        # cache.add is atomic in Redis and Memcached, so only one worker refreshes at a time
+        # (the file-based default checks then writes, so two may occasionally both refresh).
+        if not cache.add(f"{key}:refreshing", 1, timeout=getattr(settings, "NEWS_API_TIMEOUT", 6) * 2):
+            return False
+        _inflight.add(key)
+        return True
+
+
+def _release_refresh(key: str) -> None:
+    with _inflight_lock:
+        _inflight.discard(key)
+    cache.delete(f"{key}:refreshing")
+
+
+def _refresh_in_background(key: str, limit: int) -> None:
+    def run():
+        try:
+            _refresh(key, limit)
+        finally:
+            _release_refresh(key)
+
+    threading.Thread(target=run, name="news-refresh", daemon=True).start()
+
+
+# What _plan() tells a caller to do.
+_SERVE = "serve"  # return the entry's articles
+_FETCH = "fetch"  # cold, and this caller holds the refresh claim: fetch, store, release
+_WAIT = "wait"  # cold, and another caller is fetching: wait for its result
+# Seconds between checks for the entry another caller is fetching.
+_WAIT_POLL = 0.05
+
+
+def _plan(key: str, limit: int) -> Tuple[str, Optional[Dict]]:
+    """
+    The cache state machine shared by get_accident_news and aget_accident_news:
+    look the key up and return what to do with the entry found. A fresh entry is
+    served; a stale one is served while one background refresh updates it; a cold
+    (missing or past stale_until) one is fetched by whichever caller claims it.
+    """
+    now = time.time()
+    entry = _lookup(key, now)
+    if entry and now < entry["expires_at"]:
+        return _SERVE, entry
+    if entry and now < entry["stale_until"]:
+        if _claim_refresh(key):
+            _refresh_in_background(key, limit)
+        return _SERVE, entry
+    return (_FETCH if _claim_refresh(key) else _WAIT), entry
+
+
+def _newer_entry(key: str, entry: Optional[Dict]) -> Optional[Dict]:
+    """The entry for key if one has been stored since `entry` was looked up, else None."""
+    latest = _lookup(key, time.time())
+    if latest and (not entry or latest["expires_at"] > entry["expires_at"]):
+        return latest
+    return None
+
+
+def _wait_deadline() -> float:
+    # The fetcher gives up after NEWS_API_TIMEOUT, so waiting longer cannot help.
+    return time.monotonic() + getattr(settings, "NEWS_API_TIMEOUT", 6)
+
+
+def _wait_for_refresh(key: str, entry: Optional[Dict]) -> List[Dict]:
+    """Poll (this process and the shared cache) for the entry another caller is fetching."""
+    deadline = _wait_deadline()
+    while time.monotonic() < deadline:
+        time.sleep(_WAIT_POLL)
+        newer = _newer_entry(key, entry)
+        if newer:
+            return newer["articles"]
+    return entry["articles"] if entry else []
+
+
+async def _await_refresh(key: str, entry: Optional[Dict]) -> List[Dict]:
+    """_wait_for_refresh for async callers: sleeps on the event loop between checks."""
+    deadline = _wait_deadline()
+    while time.monotonic() < deadline:
+        await asyncio.sleep(_WAIT_POLL)
+        newer = await sync_to_async(_newer_entry, thread_sensitive=False)(key, entry)
+        if newer:
+            return newer["articles"]
+    return entry["articles"] if entry else []
+
+
+def get_accident_news(limit: int = 10) -> List[Dict]:
+    """
+    Cached fetch_accident_news. Fresh entries are returned directly; stale entries
+    are returned immediately while one background refresh updates them. Only a
+    cold cache blocks: a single caller fetches, and the others wait for its
+    result for up to NEWS_API_TIMEOUT before falling back to [].
+    """
+    if not _cache_enabled():
+        return fetch_accident_news(limit)
+    key = _cache_key(limit)
+    action, entry = _plan(key, limit)
+    if action == _SERVE:
+        return entry["articles"]
+    if action == _WAIT:
+        return _wait_for_refresh(key, entry)
+    try:
+        return _refresh(key, limit)["articles"]
+    finally:
+        _release_refresh(key)
+
+
+async def aget_accident_news(limit: int = 10) -> List[Dict]:
+    """
+    get_accident_news for async views. Same fresh / stale / cold behaviour, but a
+    cold fetch awaits the async client, so a slow upstream holds no worker thread.
+    """
+    if not _cache_enabled():
+        return await afetch_accident_news(limit)
+    key = _cache_key(limit)
+    entry = _local_entries.get(key)
+    if entry and time.time() < entry["expires_at"]:
+        return entry["articles"]  # the hot path: no cache I/O, so no thread hop
+    action, entry = await sync_to_async(_plan, thread_sensitive=False)(key, limit)
+    if action == _SERVE:
+        return entry["articles"]
+    if action == _WAIT:
+        return await _await_refresh(key, entry)
+    try:
+        return (await _arefresh(key, limit))["articles"]
+    finally:
+        await sync_to_async(_release_refresh, thread_sensitive=False)(key)
+
+
+def clear_news_cache() -> None:
+    """Drop cached news in this process and the shared cache."""
+    for key in list(_local_entries):
+        cache.delete(key)
+    _local_entries.clear()
@@ -0,0 +1,192 @@
+"""
+Pricing against the database: quotes for vehicles and bulk repricing of policies.
+
+Risk inputs come from one joined values_list (vehicle type and model year, the
+owner's dob) plus one GROUP BY of each owner's recent accidents; insapp.pricing
+then rates the whole batch in one vectorised pass.
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+from django.db import connections, transaction
+from django.db.models import Count, QuerySet
+
+from .fragments import bump_data_versions
+from .models import Accident, Policy, Vehicle
+from .pricing import CLAIMS_LOOKBACK_DAYS, FACTORS, POLICY_OPTIONS, price
+from .sharding import on_shard
+
+MAX_QUOTES = 1000
+REPRICE_BATCH_SIZE = 50000
+
+# Result codes; "quoted" is the only success.
+QUOTED = "quoted"
+INVALID = "invalid"
+NOT_FOUND = "not_found"
+
+
+def claim_counts(today: date, owner_ids: Optional[Iterable[int]] = None, user=None) -> Dict[int, int]:
+    """Accidents per owner in the pricing lookback window, for the given owners or a user's book."""
+    queryset = Accident.objects.filter(date_of_accident__gt=today - timedelta(days=CLAIMS_LOOKBACK_DAYS),
+                                       date_of_accident__lte=today)
+    if owner_ids is not None:
+        queryset = queryset.filter(owner_id__in=list(owner_ids))
+    if user is not None:
+        queryset = queryset.filter(owner__user=user)
+    return dict(queryset.order_by().values_list("owner_id").annotate(Count("id")))
+
+
+def counts_for(owner_ids: np.ndarray, counts: Dict[int, int]) -> np.ndarray:
+    """Look up each owner's claim count without a Python loop over the owners."""
+    if not counts:
+        return np.zeros(len(owner_ids), dtype=np.int64)
+    keys = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+    values = np.fromiter(counts.values(), dtype=np.int64, count=len(counts))
+    order = np.argsort(keys)
+    keys, values = keys[order], values[order]
+    index = np.clip(np.searchsorted(keys, owner_ids), 0, len(keys) - 1)
+    return np.where(keys[index] == owner_ids, values[index], 0)
+
+
+def _result(quote: Dict, code: str, message: str = "") -> Dict:
+    return {"vehicle_id": quote.get("vehicle_id"), "policy_type": quote.get("policy_type"),
+            "status": code, "message": message}
+
+
+def _parse_quote(quote: Dict, today: date) -> Optional[str]:
+    """Normalise one quote request in place; returns an error message if it is malformed."""
+    try:
+        quote["vehicle_id"] = int(quote.get("vehicle_id"))
+    except (TypeError, ValueError):
+        return "vehicle_id must be an integer."
+    if quote.get("policy_type") not in POLICY_OPTIONS:
+        return f"policy_type must be one of {', '.join(POLICY_OPTIONS)}."
+    start_date = quote.get("start_date") or today.isoformat()
+    try:
+        quote["start_date"] = start_date if isinstance(start_date, date) else date.fromisoformat(start_date)
+    except (TypeError, ValueError):
+        return "start_date must be a date (YYYY-MM-DD)."
+    return None
+
+
+def quote_vehicles(user, quotes: List[Dict], today: Optional[date] = None) -> List[Dict]:
+    """
+    Price a batch of quote requests, each a dict with vehicle_id, policy_type and
+    optionally start_date (default today), for the user's vehicles. Two queries
+    whatever the batch size. Returns one result per request, in input order, with
+    status "quoted", the premium, the base premium and each risk factor.
+    """
+    today = today or date.today()
+    quotes = [dict(quote) for quote in quotes]
+    results: List[Optional[Dict]] = [None] * len(quotes)
+    pending = []
+    for index, quote in enumerate(quotes):
+        error = _parse_quote(quote, today)
+        if error:
+            results[index] = _result(quote, INVALID, error)
+        else:
+            pending.append(index)
+
+    vehicle_ids = {quotes[index]["vehicle_id"] for index in pending}
+    vehicles = {
+        row[0]: row for row in Vehicle.objects.filter(user=user, id__in=vehicle_ids)
+        .values_list("id", "vehicle_type", "model_year", "owner_id", "owner__dob")
+    } if vehicle_ids else {}
+    found = []
+    for index in pending:
+        if quotes[index]["vehicle_id"] in vehicles:
+            found.append(index)
+        else:
+            results[index] = _result(quotes[index], NOT_FOUND, "Vehicle not found.")
+    if not found:
+        return results
+
+    rows = [vehicles[quotes[index]["vehicle_id"]] for index in found]
+    owner_ids = np.array([row[3] for row in rows], dtype=np.int64)
+    rated = price(
+        policy_types=[quotes[index]["policy_type"] for index in found],
+        vehicle_types=[row[1] for row in rows],
+        model_years=[row[2] for row in rows],
+        owner_dobs=[row[4] for row in rows],
+        claim_counts=counts_for(owner_ids, claim_counts(today, owner_ids=set(owner_ids.tolist()))),
+        on=[quotes[index]["start_date"] for index in found],
+    )
+    for position, index in enumerate(found):
+        quote = quotes[index]
+        results[index] = {
+            **_result(quote, QUOTED),
+            "start_date": quote["start_date"].isoformat(),
+            "premium": float(rated["premium"][position]),
+            "base": float(rated["base"][position]),
+            "factors": {name: float(rated[name][position]) for name in FACTORS},
+        }
+    return results
+
+
+def quote_premium(user, vehicle_id: int, policy_type: str, start_date: date) -> Decimal:
+    """Premium for one new policy (see quote_vehicles); raises ValueError when it cannot be quoted."""
+    result = quote_vehicles(user, [{"vehicle_id": vehicle_id, "policy_type": policy_type,
+                                    "start_date": start_date}])[0]
+    if result["status"] != QUOTED:
+        raise ValueError(result["message"])
+    return Decimal(f"{result['premium']:.2f}")
+
+
+def reprice_policies(queryset: QuerySet, today: Optional[date] = None, batch_size: int = REPRICE_BATCH_SIZE,
+                     dry_run: bool = False, user=None,
+                     progress: Optional[Callable[[Dict], None]] = None) -> Dict:
+    """
+    Re-rate every policy in `queryset` as of its start date with today's claim
+    history, and write back the premiums that changed.
+
+    Reads in id-ordered keyset batches; each batch is priced in one NumPy pass
+    and its changed premiums written with one executemany UPDATE in a single
+    transaction. Policies of unknown products keep their premium. The queryset's
+    database is used throughout, so pass one shard's policies at a time.
+    """
+    today = today or date.today()
+    with on_shard(queryset.db):
+        counts = claim_counts(today, user=user)
+    connection = connections[queryset.db]
+    table = connection.ops.quote_name(Policy._meta.db_table)
+    sql = f"UPDATE {table} SET premium_amount = %s WHERE id = %s"
+    summary = {"policies": 0, "repriced": 0, "unpriced": 0, "premium_before": 0.0, "premium_after": 0.0}
+
+    base = queryset.order_by("id").values_list(
+        "id", "policy_type", "vehicle__vehicle_type", "vehicle__model_year", "owner_id", "owner__dob",
+        "start_date", "premium_amount", "user_id",
+    )
+    last_id = 0
+    while True:
+        rows = list(base.filter(id__gt=last_id)[:batch_size])
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        ids, policy_types, vehicle_types, model_years, owner_ids, dobs, starts, premiums, user_ids = zip(*rows)
+        rated = price(policy_types, vehicle_types, model_years, dobs,
+                      counts_for(np.array(owner_ids, dtype=np.int64), counts), starts)
+
+        old = np.array(premiums, dtype=np.float64)
+        new = rated["premium"]
+        priced = ~np.isnan(new)
+        changed = priced & (np.abs(new - old) >= 0.005)
+        summary["policies"] += len(rows)
+        summary["unpriced"] += int((~priced).sum())
+        summary["repriced"] += int(changed.sum())
+        summary["premium_before"] += float(old[priced].sum())
+        summary["premium_after"] += float(new[priced].sum())
+
+        if not dry_run and changed.any():
+            params = [(f"{premium:.2f}", policy_id)
+                      for premium, policy_id in zip(new[changed].tolist(), np.array(ids)[changed].tolist())]
+            with transaction.atomic(using=queryset.db), connection.cursor() as cursor:
+                cursor.executemany(sql, params)
+            bump_data_versions(set(np.array(user_ids)[changed].tolist()))
+        if progress:
+            progress(summary)
+
+    summary["premium_before"] = round(summary["premium_before"], 2)
+    summary["premium_after"] = round(summary["premium_after"], 2)
+    return summary
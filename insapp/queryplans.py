@@ -0,0 +1,112 @@
+"""
+The hot queries issued by insapp.views, and a checker that runs EXPLAIN QUERY
+PLAN on each and reports any that fall back to a full table scan.
+
+Keep HOT_QUERIES in step with the views: when a view gains a query on a large
+table, add it here so `manage.py check_query_plans` keeps guarding it.
+"""
+import re
+from datetime import date
+from typing import Callable, Dict, List, Tuple
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import QuerySet
+
+from .models import Owner, Vehicle, Policy, Accident, Payment, UserStats
+from .analytics import cell_queries, monthly_queries
+from .ledger import state_case, state_filter, user_policies
+from .search import filter_accidents, user_accidents
+from .typeahead import search_owners
+
+# Placeholder ids: plans depend on the query shape, not on the values.
+USER_ID = 1
+OWNER_ID = 1
+VEHICLE_ID = 1
+POLICY_ID = 1
+
+# A SQLite plan line like "SCAN insapp_owner" (no index) is a full table scan.
+# "SCAN t USING INDEX ...", "SEARCH t USING ..." and FTS5 "SCAN t VIRTUAL TABLE INDEX ..."
+# are index access.
+_FULL_SCAN_RE = re.compile(r'\bSCAN (?!CONSTANT ROW)(\w+)(?! USING| VIRTUAL TABLE)(?:\s|$)')
+
+
+def _filter_page() -> QuerySet:
+    today = date.today()
+    return (filter_accidents(user_accidents(USER_ID), today, time_range="365")
+            .select_related("owner", "vehicle")
+            .order_by("-date_of_accident", "-id")[:51])
+
+
+def _ledger_page() -> QuerySet:
+    return (user_policies(USER_ID, OWNER_ID).filter(state_filter("active", date.today()))
+            .select_related("vehicle").order_by("end_date", "id")[:25])
+
+
+def _filter_buckets() -> QuerySet:
+    return user_accidents(USER_ID).filter(date_of_accident__gte=date.today())
+
+
+HOT_QUERIES: Dict[str, Callable[[], QuerySet]] = {
+    # owners
+    "owners.list": lambda: Owner.objects.filter(user_id=USER_ID),
+    "owners.search": lambda: search_owners(User(pk=USER_ID), "kis"),
+    # vehicles / dropdowns
+    "vehicles.list": lambda: Vehicle.objects.filter(user_id=USER_ID),
+    "vehicles.for_owner": lambda: Vehicle.objects.filter(owner_id=OWNER_ID, user_id=USER_ID),
+    # policy ledger
+    "policy.for_owner": lambda: Policy.objects.filter(owner_id=OWNER_ID, user_id=USER_ID).order_by('-start_date'),
+    "policy.for_vehicle": lambda: Policy.objects.filter(vehicle_id=VEHICLE_ID, owner_id=OWNER_ID),
+    "policy.for_user": lambda: Policy.objects.filter(user_id=USER_ID),
+    "policy.ledger_page": _ledger_page,
+    "policy.ledger_counts": lambda: (user_policies(USER_ID, OWNER_ID).order_by()
+                                     .annotate(state=state_case(date.today())).values("state")),
+    # sweep_policies
+    "sweep.to_expired": lambda: Policy.objects.filter(status__in=["active", "upcoming"])
+                                              .filter(state_filter("expired", date.today())),
+    "sweep.to_active": lambda: Policy.objects.filter(status__in=["upcoming", "expired"])
+                                             .filter(state_filter("active", date.today())),
+    "sweep.to_upcoming": lambda: Policy.objects.filter(status__in=["active", "expired"])
+                                               .filter(state_filter("upcoming", date.today())),
+    # /analytics/
+    **{f"analytics.cells_{name}": (lambda query=query: query)
+       for name, query in cell_queries(USER_ID, date(2024, 1, 1)).items()},
+    **{f"analytics.monthly_{name}": (lambda query=query: query)
+       for name, query in monthly_queries(USER_ID, date(2024, 1, 1), date(2025, 1, 1)).items()},
+    # pricing: claims history and quote inputs
+    "pricing.claim_counts": lambda: Accident.objects.filter(date_of_accident__gt=date(2023, 1, 1),
+                                                            date_of_accident__lte=date(2026, 1, 1),
+                                                            owner_id__in=[OWNER_ID, 2])
+                                                    .order_by().values("owner_id"),
+    "pricing.quote_vehicles": lambda: Vehicle.objects.filter(user_id=USER_ID, id__in=[VEHICLE_ID, 2])
+                                                     .values_list("owner__dob"),
+    # bulk import duplicate checks
+    "import.vehicle_numbers": lambda: Vehicle.objects.filter(vehicle_number__in=["KA-01-AB-1234", "KA-03-A-2882"]),
+    "import.vins": lambda: Vehicle.objects.filter(vin__in=["1HGCM82633", "JH4KA96532"]),
+    # accident / payment checks
+    "accident.for_policy": lambda: Accident.objects.filter(policy_id=POLICY_ID),
+    "payment.for_policy": lambda: Payment.objects.filter(policy_id=POLICY_ID),
+    # /filter/
+    "filter.page": _filter_page,
+    "filter.buckets": _filter_buckets,
+    # dashboard
+    "dashboard.stats": lambda: UserStats.objects.filter(pk=USER_ID),
+}
+
+
+def full_scans(plan: str) -> List[str]:
+    """Tables read by a full scan in an EXPLAIN QUERY PLAN output."""
+    return [match.group(1) for match in _FULL_SCAN_RE.finditer(plan)]
+
+
+def check_query_plans() -> List[Tuple[str, str, List[str]]]:
+    """
+    EXPLAIN every hot query. Returns (name, plan, full-scanned tables) per query.
+    Only SQLite plans are analysed; other backends report no scans.
+    """
+    results = []
+    for name, build in HOT_QUERIES.items():
+        plan = build().explain()
+        scans = full_scans(plan) if connection.vendor == "sqlite" else []
+        results.append((name, plan, scans))
+    return results
@@ -0,0 +1,161 @@
+"""
+Database routing: tenant shards, then primary/replica.
+
+TenantShardRouter sends each user's insapp rows to the user's shard (see
+insapp.sharding); tenants on the default shard, and every other model, fall
+through to PrimaryReplicaRouter.
+
+Writes, and every read outside a view marked with @replica_reads, go to the
+primary ("default"). GET/HEAD requests to a @replica_reads view read from one
+of the DATABASE_REPLICAS aliases instead, unless:
+
+* the client wrote within the last REPLICA_STICKY_SECONDS (read-your-writes:
+  ReplicaRoutingMiddleware pins it to the primary with a cookie after any
+  request that wrote), or
+* the read happens inside a transaction on the primary.
+
+With no replicas configured every query goes to the primary.
+"""
+import random
+import time
+from contextvars import ContextVar
+from functools import wraps
+from typing import Optional
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from . import sharding
+
+PIN_COOKIE = "vims_primary"
+SAFE_METHODS = ("GET", "HEAD")
+
+
+class RequestRouting:
+    """Per-request routing state: the replica chosen for reads, and whether anything was written."""
+
+    __slots__ = ("pinned", "replica", "wrote")
+
+    def __init__(self, pinned: bool):
+        self.pinned = pinned
+        self.replica: Optional[str] = None
+        self.wrote = False
+
+
+_routing: ContextVar[Optional[RequestRouting]] = ContextVar("insapp_db_routing", default=None)
+
+
+def replicas():
+    return getattr(settings, "DATABASE_REPLICAS", ())
+
+
+def sticky_seconds() -> int:
+    return getattr(settings, "REPLICA_STICKY_SECONDS", 15)
+
+
+def is_pinned(request) -> bool:
+    """True while the client's last write is recent enough that a replica may not have it yet."""
+    try:
+        return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def begin_request(request):
+    """Start routing state for a request; returns the token for end_request."""
+    return _routing.set(RequestRouting(pinned=is_pinned(request)))
+
+
+def end_request(token, response):
+    """Pin the client to the primary if the request wrote, and drop the request's routing state."""
+    state = _routing.get()
+    _routing.reset(token)
+    if state is not None and state.wrote and replicas():
+        seconds = sticky_seconds()
+        response.set_cookie(PIN_COOKIE, f"{time.time() + seconds:.0f}", max_age=seconds,
+                            httponly=True, samesite="Lax")
+    return response
+
+
+def reading_replica() -> bool:
+    """True when the current request's reads go to a replica."""
+    state = _routing.get()
+    return state is not None and state.replica is not None
+
+
+def _use_replica(request) -> None:
+    state = _routing.get()
+    if state is not None and not state.pinned and request.method in SAFE_METHODS and replicas():
+        state.replica = random.choice(replicas())
+
+
+def replica_reads(view):
+    """Serve a read-only view's GET/HEAD queries from a replica (see module docstring)."""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            _use_replica(request)
+            return await view(request, *args, **kwargs)
+    else:
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            _use_replica(request)
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+class TenantShardRouter:
+    """DATABASE_ROUTERS entry, before PrimaryReplicaRouter; see insapp.sharding."""
+
+    def _shard(self, model, hints) -> Optional[str]:
+        if model._meta.label_lower not in sharding.TENANT_LABELS or not sharding.enabled():
+            return None
+        instance = hints.get("instance")
+        if instance is not None:
+            # Related lookups from a tenant row stay on its shard; from a user, go to the user's shard.
+            if instance._meta.label_lower in sharding.TENANT_LABELS and instance._state.db in sharding.shards():
+                return instance._state.db
+            user_id = instance.pk if isinstance(instance, User) else getattr(instance, "user_id", None)
+            if user_id is not None:
+                return sharding.shard_for(user_id)
+        return sharding.current_db()
+
+    def db_for_read(self, model, **hints):
+        alias = self._shard(model, hints)
+        # The default shard is the one with replicas.
+        return None if alias == DEFAULT_DB_ALIAS else alias
+
+    def db_for_write(self, model, **hints):
+        alias = self._shard(model, hints)
+        return None if alias == DEFAULT_DB_ALIAS else alias
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if app_label == "insapp" and model_name in ("tenantshard", "movedrow"):
+            return db == DEFAULT_DB_ALIAS
+        return None
+
+
+class PrimaryReplicaRouter:
+    """DATABASE_ROUTERS entry; see module docstring."""
+
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        if state is None or state.replica is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary, so objects may relate across them.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary with the data (manage.py sync_replica).
+        return db not in replicas()
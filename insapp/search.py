@@ -0,0 +1,116 @@
+import logging
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from django.db.models import Count, Q, QuerySet
+
+from .models import Accident
+
+logger = logging.getLogger(__name__)
+
+# Day windows offered as tabs on the /filter/ page.
+TIME_RANGES = ("10", "100", "365", "3650")
+POLICY_STATUSES = ("Active", "Lapsed")
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(accident_date: date, accident_id: int) -> str:
+    """Encode the (date_of_accident, id) keyset position of the last row on a page."""
+    return f"{accident_date.isoformat()}.{accident_id}"
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[date, int]]:
+    """Decode a cursor produced by encode_cursor. Returns None for missing or malformed cursors."""
+    if not cursor:
+        return None
+    try:
+        date_part, id_part = cursor.split(".", 1)
+        return date.fromisoformat(date_part), int(id_part)
+    except ValueError:
+        logger.debug("Ignoring malformed accident cursor %r", cursor)
+        return None
+
+
+def user_accidents(user) -> QuerySet:
+    """All accidents belonging to the user's owners."""
+    return Accident.objects.filter(owner__user=user)
+
+
+def filter_accidents(queryset: QuerySet, today: date, time_range: Optional[str] = None,
+                     owner_search: Optional[str] = None, status: Optional[str] = None) -> QuerySet:
+    """
+    Apply the /filter/ page filters to an Accident queryset.
+    Unknown time ranges and statuses are ignored, matching the page's "All" behaviour.
+    """
+    if time_range in TIME_RANGES:
+        queryset = queryset.filter(date_of_accident__gte=today - timedelta(days=int(time_range)))
+    if owner_search:
+        queryset = queryset.filter(
+            Q(owner__owner__icontains=owner_search) | Q(vehicle__vehicle_number__icontains=owner_search)
+        )
+    if status in POLICY_STATUSES:
+        queryset = queryset.filter(policy_status=status)
+    return queryset
+
+
+def bucket_counts(queryset: QuerySet, today: date) -> Dict[str, int]:
+    """
+    Count rows for every time-range tab plus the unbounded total in one
+    conditional-aggregate query. Keys are the TIME_RANGES values and "all".
+    """
+    aggregates = {
+        f"last_{days}": Count("id", filter=Q(date_of_accident__gte=today - timedelta(days=int(days))))
+        for days in TIME_RANGES
+    }
+    aggregates["total"] = Count("id")
+    row = queryset.aggregate(**aggregates)
+    counts = {days: row[f"last_{days}"] or 0 for days in TIME_RANGES}
+    counts["all"] = row["total"] or 0
+    return counts
+
+
+def search_accidents(user, time_range: Optional[str] = None, owner_search: Optional[str] = None,
+                     status: Optional[str] = None, cursor: Optional[str] = None,
+                     page_size: int = PAGE_SIZE, today: Optional[date] = None) -> Dict:
+    """
+    Run the accident search behind /filter/.
+
+    Issues two queries whatever the table size: one conditional aggregate for the
+    tab counts (which also yields the result total) and one keyset-paginated page
+    with owner and vehicle joined in.
+    """
+    today = today or date.today()
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+
+    # Owner/status filters apply to every tab; the time range only picks which bucket is the total.
+    base = filter_accidents(user_accidents(user), today, owner_search=owner_search, status=status)
+    counts = bucket_counts(base, today)
+    total = counts[time_range] if time_range in TIME_RANGES else counts["all"]
+
+    page_qs = filter_accidents(base, today, time_range=time_range)
+    position = decode_cursor(cursor)
+    if position:
+        last_date, last_id = position
+        page_qs = page_qs.filter(
+            Q(date_of_accident__lt=last_date) | Q(date_of_accident=last_date, id__lt=last_id)
+        )
+
+    rows: List[Accident] = list(
+        page_qs.select_related("owner", "vehicle")
+        .only("id", "date_of_accident", "location", "policy_status",
+              "owner__id", "owner__owner", "vehicle__id", "vehicle__vehicle_number")
+        .order_by("-date_of_accident", "-id")[:page_size + 1]
+    )
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(rows[-1].date_of_accident, rows[-1].id)
+
+    return {
+        "accidents": rows,
+        "total_count": total,
+        "bucket_counts": counts,
+        "next_cursor": next_cursor,
+    }
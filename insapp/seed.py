@@ -1,6 +1,16 @@
 from django.contrib.auth.models import User
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import Max
+from .fragments import bump_data_versions
 from .models import Owner, Vehicle, Policy, Accident, Payment
+from .pricing import price
+from .sequences import POLICY_NUMBER_PREFIX, POLICY_SEQUENCE, reserve
+from .sharding import shard_map, shards, tenant_db
+from .stats import rebuild_all_stats
+from . import seedgen
 from faker import Faker
+import multiprocessing
 import random, uuid
 from datetime import timedelta, date
 
@@ -32,7 +42,7 @@ def seed_database_single_user(target_username='test', num_owners=20, vehicles_pe
         print(f"Using existing user: {target_username}")
 
     # --- Clear previous data for this user ---
-    Owner.objects.filter(user=target_user).delete()
+    Owner.objects.using(tenant_db(target_user)).filter(user=target_user).delete()
     print("Cleared old data for the target user.")
 
     total_policies = 0
@@ -63,7 +73,6 @@ def seed_database_single_user(target_username='test', num_owners=20, vehicles_pe
             )
 
             policy_type = random.choice(POLICY_TYPES)
-            premium_amount = round(random.uniform(9000.0, 30000.0), 2)
 
             # Randomly decide if this policy should be Active or Lapsed
             if random.choice([True, False]):
@@ -75,6 +84,9 @@ def seed_database_single_user(target_username='test', num_owners=20, vehicles_pe
                 start_date_obj = fake.date_between(start_date='-2y', end_date='-1y')
                 end_date_obj = start_date_obj + timedelta(days=180)  # shorter term, already expired
 
+            premium_amount = round(float(price([policy_type], [vehicle_type], [vehicle.model_year], [owner_dob],
+                                               [0], start_date_obj)["premium"][0]), 2)
+
             policy = Policy.objects.create(
                 user=target_user,
                 owner=owner,
@@ -120,4 +132,117 @@ def seed_database_single_user(target_username='test', num_owners=20, vehicles_pe
                     payment_method=random.choice(['UPI', 'Card', 'Bank Transfer'])
                 )
 
-    print(f"✅ Database seeding completed: {total_policies} policies created for user {target_username}.")
\ No newline at end of file
+    print(f"✅ Database seeding completed: {total_policies} policies created for user {target_username}.")
+
+
+# ------------------- BULK SEEDING -------------------
+
+OWNER_FIELDS = ("id", "user_id", "owner", "address", "phone_number", "dob")
+VEHICLE_FIELDS = ("id", "user_id", "owner_id", "title", "vehicle_number", "model_name", "model_year",
+                  "vehicle_type", "vin")
+POLICY_FIELDS = ("id", "user_id", "owner_id", "vehicle_id", "policy_number", "policy_type", "start_date",
+                 "end_date", "premium_amount", "status")
+ACCIDENT_FIELDS = ("id", "owner_id", "vehicle_id", "policy_id", "date_of_accident", "location", "description",
+                   "policy_status", "reported_at")
+PAYMENT_FIELDS = ("id", "user_id", "owner_id", "vehicle_id", "policy_id", "accident_id", "payment_id", "amount",
+                  "payment_date", "payment_method")
+
+
+def _next_ids():
+    """
+    First primary key free on every shard, per table (one indexed MAX each). Seeded ids
+    (and the vehicle numbers and payment ids derived from them) are then unique across shards.
+    """
+    return {
+        name: max((model.objects.using(alias).aggregate(m=Max("id"))["m"] or 0) for alias in shards()) + 1
+        for name, model in (("owner", Owner), ("vehicle", Vehicle), ("policy", Policy),
+                            ("accident", Accident), ("payment", Payment))
+    }
+
+
+def _seed_users(num_users, username_prefix):
+    password = make_password("password123")
+    users = []
+    for index in range(1, num_users + 1):
+        user, _ = User.objects.get_or_create(
+            username=f"{username_prefix}{index}",
+            defaults={"email": f"{username_prefix}{index}@vims.com", "password": password,
+                      "first_name": "Load", "last_name": f"User {index}"},
+        )
+        users.append(user)
+    return users
+
+
+def _write_batch(rows, chunk_size, using):
+    owners, vehicles, policies, accidents, payments = rows
+    with transaction.atomic(using=using):
+        for model, fields, data in ((Owner, OWNER_FIELDS, owners), (Vehicle, VEHICLE_FIELDS, vehicles),
+                                    (Policy, POLICY_FIELDS, policies), (Accident, ACCIDENT_FIELDS, accidents),
+                                    (Payment, PAYMENT_FIELDS, payments)):
+            model.objects.using(using).bulk_create((model(**dict(zip(fields, row))) for row in data),
+                                                   batch_size=chunk_size)
+
+
+def bulk_seed(num_users=1, owners_per_user=1000, vehicles_per_owner=2, claim_rate=0.3, seed=0,
+              username_prefix="loaduser", workers=None, owners_per_batch=500, chunk_size=2000,
+              today=None, progress=None):
+    """
+    Seed a large synthetic dataset quickly.
+
+    Rows are generated in `workers` processes (see insapp.seedgen) and written by
+    this process with chunked bulk_create, one transaction per batch. The same
+    seed, sizes and `today` produce the same rows. Primary keys are assigned up
+    front, so do not run two seeders against the same database at once.
+    Returns a dict of row counts per model.
+    """
+    today = today or date.today()
+    workers = workers or max(1, (multiprocessing.cpu_count() or 2) - 1)
+    users = _seed_users(num_users, username_prefix)
+    placed = shard_map(user.id for user in users)
+
+    vehicles_total = num_users * owners_per_user * vehicles_per_owner
+    policy_numbers = reserve(POLICY_SEQUENCE, vehicles_total) if vehicles_total else range(0)
+    ids = _next_ids()
+
+    specs = []
+    for user_index, user in enumerate(users):
+        for offset in range(0, owners_per_user, owners_per_batch):
+            specs.append({
+                "seed": seed,
+                "batch_index": len(specs),
+                "today": today,
+                "user_id": user.id,
+                "using": placed[user.id],
+                "ids": ids,
+                "owner_offset": user_index * owners_per_user + offset,
+                "num_owners": min(owners_per_batch, owners_per_user - offset),
+                "vehicles_per_owner": vehicles_per_owner,
+                "claim_rate": claim_rate,
+                "policy_number_prefix": POLICY_NUMBER_PREFIX,
+                "policy_number_start": policy_numbers.start,
+            })
+
+    totals = dict.fromkeys(("owners", "vehicles", "policies", "accidents", "payments"), 0)
+    pools = seedgen.build_pools(seed)
+
+    def record(spec, rows):
+        _write_batch(rows, chunk_size, spec["using"])
+        for key, data in zip(totals, rows):
+            totals[key] += len(data)
+        if progress:
+            progress(totals)
+
+    if workers > 1 and len(specs) > 1:
+        with multiprocessing.Pool(workers, initializer=seedgen.init_worker, initargs=(pools,)) as pool:
+            # imap keeps batch order, so writes are deterministic too.
+            for spec, rows in zip(specs, pool.imap(seedgen.generate_batch, specs)):
+                record(spec, rows)
+    else:
+        seedgen.init_worker(pools)
+        for spec in specs:
+            record(spec, seedgen.generate_batch(spec))
+
+    # bulk_create bypasses the signal receivers that maintain the dashboard counters and the data version.
+    rebuild_all_stats([user.id for user in users])
+    bump_data_versions(users)
+    return totals
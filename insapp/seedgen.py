@@ -0,0 +1,170 @@
+"""
+Pure-Python row generation for the bulk seeder (insapp.seed.bulk_seed).
+
+Nothing here touches Django, so batches can be generated in worker processes
+under any multiprocessing start method. Every id, policy number and unique
+field is derived from the batch spec, and each batch has its own RNG seeded
+from (seed, batch index), so output is identical for identical inputs.
+"""
+import random
+import string
+from datetime import datetime, time, timedelta, timezone
+from typing import Dict, List, Tuple
+
+from .lifecycle import policy_state
+from .pricing import price
+
+VEHICLE_TYPES = ['SUV', 'Sedan', 'Hatchback', 'Bike', 'Truck']
+POLICY_TYPES = [
+    'Essential Cover (3 months)',
+    'Standard Shield (6 months)',
+    'Premium Protect (12 months)'
+]
+PAYMENT_METHODS = ['UPI', 'Card', 'Bank Transfer']
+
+_LETTER_PAIRS = [a + b for a in string.ascii_uppercase for b in string.ascii_uppercase]
+
+# Filled by init_worker (or directly in-process) with Faker-generated word pools.
+_POOLS: Dict[str, List[str]] = {}
+
+
+def build_pools(seed: int, size: int = 500) -> Dict[str, List[str]]:
+    """Generate name/place pools once with Faker; batches then sample from them cheaply."""
+    from faker import Faker
+
+    fake = Faker()
+    fake.seed_instance(seed)
+    return {
+        "first_names": [fake.first_name() for _ in range(size)],
+        "last_names": [fake.last_name() for _ in range(size)],
+        "cities": [fake.city() for _ in range(size)],
+        "streets": [fake.street_name() for _ in range(size)],
+        "words": [fake.word().title() for _ in range(size)],
+    }
+
+
+def init_worker(pools: Dict[str, List[str]]) -> None:
+    _POOLS.clear()
+    _POOLS.update(pools)
+
+
+def vehicle_number_for(vehicle_id: int) -> str:
+    """
+    Unique plate in the KA-01-AB-1234 format accepted by is_valid_vehicle_number.
+    The state code counts down from ZZ so seeded plates stay clear of real ones.
+    """
+    n, serial = divmod(vehicle_id, 10000)
+    n, series = divmod(n, 676)
+    n, rto = divmod(n, 100)
+    state = _LETTER_PAIRS[675 - n % 676]
+    return f"{state}-{rto:02d}-{_LETTER_PAIRS[series]}-{serial:04d}"
+
+
+def vin_for(vehicle_id: int) -> str:
+    """Unique 10-character VIN (the length is_valid_vin accepts)."""
+    return f"{vehicle_id:010X}"[-10:]
+
+
+def generate_batch(spec: Dict) -> Tuple[List[tuple], List[tuple], List[tuple], List[tuple], List[tuple]]:
+    """
+    Generate one batch of rows as plain tuples:
+      owners    (id, user_id, owner, address, phone_number, dob)
+      vehicles  (id, user_id, owner_id, title, vehicle_number, model_name, model_year, vehicle_type, vin)
+      policies  (id, user_id, owner_id, vehicle_id, policy_number, policy_type, start_date, end_date, premium,
+                 status)
+      accidents (id, owner_id, vehicle_id, policy_id, date_of_accident, location, description, policy_status,
+                 reported_at)
+      payments  (id, user_id, owner_id, vehicle_id, policy_id, accident_id, payment_id, amount,
+                 payment_date, payment_method)
+
+    Each vehicle gets one policy; a policy has at most one accident and one
+    payment, so their ids are offsets of the policy's position in the run.
+    """
+    rng = random.Random(f"{spec['seed']}:{spec['batch_index']}")
+    pools = _POOLS
+    today = spec["today"]
+    user_id = spec["user_id"]
+    ids = spec["ids"]
+    vehicles_per_owner = spec["vehicles_per_owner"]
+
+    owners, vehicles, policies, accidents, payments = [], [], [], [], []
+
+    for i in range(spec["num_owners"]):
+        owner_index = spec["owner_offset"] + i
+        owner_id = ids["owner"] + owner_index
+        age_days = rng.randint(25 * 365, 65 * 365)
+        owners.append((
+            owner_id,
+            user_id,
+            f"{rng.choice(pools['first_names'])} {rng.choice(pools['last_names'])}",
+            f"{rng.randint(1, 999)} {rng.choice(pools['streets'])}, {rng.choice(pools['cities'])}",
+            f"+91 9{rng.randrange(10 ** 9):09d}",
+            today - timedelta(days=age_days),
+        ))
+
+        for j in range(vehicles_per_owner):
+            position = owner_index * vehicles_per_owner + j
+            vehicle_id = ids["vehicle"] + position
+            policy_id = ids["policy"] + position
+            vehicle_type = rng.choice(VEHICLE_TYPES)
+            vehicles.append((
+                vehicle_id, user_id, owner_id,
+                f"{vehicle_type} - {rng.choice(pools['words'])}",
+                vehicle_number_for(vehicle_id),
+                rng.choice(pools['words']),
+                rng.randint(2015, 2024),
+                vehicle_type,
+                vin_for(vehicle_id),
+            ))
+
+            # Same active/lapsed split as seed_database_single_user.
+            if rng.random() < 0.5:
+                start = today - timedelta(days=rng.randint(30, 180))
+                end = start + timedelta(days=365)
+            else:
+                start = today - timedelta(days=rng.randint(365, 730))
+                end = start + timedelta(days=180)
+            # Premium filled in below, once the whole batch has been priced.
+            policies.append((
+                policy_id, user_id, owner_id, vehicle_id,
+                f"{spec['policy_number_prefix']}{spec['policy_number_start'] + position}",
+                rng.choice(POLICY_TYPES), start, end, None, policy_state(start, end, today),
+            ))
+
+            if rng.random() >= spec["claim_rate"]:
+                continue
+            accident_id = ids["accident"] + position
+            latest = min(today, end + timedelta(days=200))
+            accident_date = start + timedelta(days=rng.randint(0, max(0, (latest - start).days)))
+            status = "Active" if start <= accident_date <= end else "Lapsed"
+            accidents.append((
+                accident_id, owner_id, vehicle_id, policy_id, accident_date,
+                rng.choice(pools['cities']),
+                f"Minor collision reported on {rng.choice(pools['streets'])}.",
+                status,
+                datetime.combine(accident_date, time(12), tzinfo=timezone.utc),
+            ))
+            if status == "Active":
+                payment_pk = ids["payment"] + position
+                payments.append((
+                    payment_pk, user_id, owner_id, vehicle_id, policy_id, accident_id,
+                    f"PAY-S{payment_pk:09d}", None,
+                    accident_date + timedelta(days=rng.randint(5, 30)),
+                    rng.choice(PAYMENT_METHODS),
+                ))
+
+    # New business: no prior claims. Payments settle the full premium.
+    dobs = {owner[0]: owner[5] for owner in owners}
+    rated = price(
+        policy_types=[policy[5] for policy in policies],
+        vehicle_types=[vehicle[7] for vehicle in vehicles],
+        model_years=[vehicle[6] for vehicle in vehicles],
+        owner_dobs=[dobs[policy[2]] for policy in policies],
+        claim_counts=[0] * len(policies),
+        on=[policy[6] for policy in policies],
+    )
+    premiums = dict(zip((policy[0] for policy in policies), rated["premium"].tolist()))
+    policies = [policy[:8] + (premiums[policy[0]],) + policy[9:] for policy in policies]
+    payments = [payment[:7] + (premiums[payment[4]],) + payment[8:] for payment in payments]
+
+    return owners, vehicles, policies, accidents, payments
@@ -0,0 +1,118 @@
+import re
+from typing import List
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import Payment, Policy, Sequence
+from .sharding import shards
+
+POLICY_SEQUENCE = "policy_number"
+POLICY_NUMBER_PREFIX = "POL"
+POLICY_NUMBER_START = 1001
+PAYMENT_SEQUENCE = "payment_id"
+PAYMENT_ID_PREFIX = "PAY-"
+
+_POLICY_NUMBER_RE = re.compile(r'^POL(\d+)$')
+_PAYMENT_ID_RE = re.compile(r'^PAY-(\d{8})$')
+
+
+def _highest(model, field: str, pattern: re.Pattern, floor: int) -> int:
+    """
+    Highest number in `field` values matching `pattern` (or `floor`), on every
+    shard: the counter row (on the default database) numbers rows on all of them.
+    Compares numerically, so POL1000 correctly sorts above POL999.
+    """
+    highest = floor
+    for alias in shards():
+        values = (model.objects.using(alias).filter(**{f"{field}__regex": pattern.pattern})
+                  .values_list(field, flat=True))
+        for value in values.iterator():
+            match = pattern.match(value)
+            if match:
+                highest = max(highest, int(match.group(1)))
+    return highest
+
+
+def _initial_policy_value() -> int:
+    """First free policy number, used once when the counter row is created."""
+    return _highest(Policy, "policy_number", _POLICY_NUMBER_RE, POLICY_NUMBER_START - 1) + 1
+
+
+def _initial_payment_value() -> int:
+    """First free payment id, so ids issued before the counter row existed are not reissued."""
+    return _highest(Payment, "payment_id", _PAYMENT_ID_RE, 0) + 1
+
+
+INITIAL_VALUES = {
+    POLICY_SEQUENCE: _initial_policy_value,
+    PAYMENT_SEQUENCE: _initial_payment_value,
+}
+
+
+def _create_sequence(name: str) -> None:
+    """Create the counter row at its initial value unless another worker already has."""
+    start = INITIAL_VALUES[name]() if name in INITIAL_VALUES else 1
+    try:
+        with transaction.atomic():
+            Sequence.objects.create(name=name, next_value=start)
+    except IntegrityError:
+        pass
+
+
+def reserve(name: str, count: int = 1) -> range:
+    """
+    Atomically reserve `count` consecutive values from the named sequence.
+
+    The UPDATE ... SET next_value = next_value + count takes the row's write lock
+    (the database lock on SQLite), so concurrent callers always receive disjoint
+    blocks. Values from a block that is never used are simply skipped.
+    """
+    if count < 1:
+        raise ValueError("count must be at least 1")
+
+    with transaction.atomic():
+        if not Sequence.objects.filter(name=name).update(next_value=F('next_value') + count):
+            _create_sequence(name)
+            Sequence.objects.filter(name=name).update(next_value=F('next_value') + count)
+        end = Sequence.objects.values_list('next_value', flat=True).get(name=name)
+    return range(end - count, end)
+
+
+def peek(name: str) -> int:
+    """Value the next reservation would start at, without reserving it."""
+    value = Sequence.objects.filter(name=name).values_list('next_value', flat=True).first()
+    if value is None:
+        _create_sequence(name)
+        value = Sequence.objects.values_list('next_value', flat=True).get(name=name)
+    return value
+
+
+def format_policy_number(value: int) -> str:
+    return f"{POLICY_NUMBER_PREFIX}{value}"
+
+
+def allocate_policy_numbers(count: int) -> List[str]:
+    """Reserve a block of policy numbers for bulk creation."""
+    return [format_policy_number(value) for value in reserve(POLICY_SEQUENCE, count)]
+
+
+def allocate_policy_number() -> str:
+    """Reserve a single policy number."""
+    return allocate_policy_numbers(1)[0]
+
+
+def allocate_payment_ids(count: int) -> List[str]:
+    """
+    Reserve a block of payment ids. The zero-padded 8-digit form cannot collide with
+    the 6-character ids the payment form generated or the seeder's PAY-S ids.
+    """
+    return [f"{PAYMENT_ID_PREFIX}{value:08d}" for value in reserve(PAYMENT_SEQUENCE, count)]
+
+
+def preview_policy_number() -> str:
+    """
+    Policy number to show on the form. Display only: the number is assigned at
+    submit time and may differ if another policy is created in between.
+    """
+    return format_policy_number(peek(POLICY_SEQUENCE))
@@ -0,0 +1,200 @@
+"""
+Claim settlement: validate and record payments for many policies at once.
+
+A batch runs in one transaction. The policies are read with SELECT ... FOR
+UPDATE (a no-op on SQLite, where the write transaction serialises instead)
+together with their first accident and an EXISTS check for an existing
+payment, so every rule is checked with one query whatever the batch size.
+Valid claims are written with one bulk_create; each claim gets its own result.
+"""
+import logging
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from typing import Dict, Iterable, List, Optional
+
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, F, OuterRef, Subquery
+
+from .fragments import bump_data_version
+from .models import Accident, Payment, Policy
+from .sequences import allocate_payment_ids
+from .sharding import tenant_db, values_in_use
+from .stats import adjust_user_stats
+
+logger = logging.getLogger(__name__)
+
+PAYMENT_METHODS = ("Bank Transfer", "UPI", "Card", "Cash")
+MAX_BATCH = 5000
+
+# Result codes; "settled" is the only success.
+SETTLED = "settled"
+INVALID = "invalid"
+NOT_FOUND = "not_found"
+ALREADY_PAID = "already_paid"
+NO_ACCIDENT = "no_accident"
+NOT_ACTIVE = "not_active"
+DUPLICATE_PAYMENT_ID = "duplicate_payment_id"
+
+
+def _result(claim: Dict, code: str, message: str, payment_id: Optional[str] = None) -> Dict:
+    return {"policy_id": claim.get("policy_id"), "status": code, "message": message, "payment_id": payment_id}
+
+
+def _parse_claim(claim: Dict, today: date) -> Optional[str]:
+    """Normalise one claim in place; returns an error message if it is malformed."""
+    try:
+        claim["policy_id"] = int(claim.get("policy_id"))
+    except (TypeError, ValueError):
+        return "policy_id must be an integer."
+    try:
+        claim["amount"] = Decimal(str(claim.get("amount")))
+    except InvalidOperation:
+        return "amount must be a number."
+    if not claim["amount"].is_finite() or claim["amount"] <= 0 or claim["amount"] >= Decimal("1e8"):
+        return "amount must be positive and below 100,000,000."
+    payment_date = claim.get("payment_date") or today.isoformat()
+    try:
+        claim["payment_date"] = payment_date if isinstance(payment_date, date) else date.fromisoformat(payment_date)
+    except (TypeError, ValueError):
+        return "payment_date must be a date (YYYY-MM-DD)."
+    if claim["payment_date"] > today:
+        return "payment_date cannot be in the future."
+    claim["payment_method"] = claim.get("payment_method") or PAYMENT_METHODS[0]
+    if not isinstance(claim["payment_method"], str) or claim["payment_method"] not in PAYMENT_METHODS:
+        return f"payment_method must be one of {', '.join(PAYMENT_METHODS)}."
+    payment_id = claim.get("payment_id")
+    if isinstance(payment_id, int) and not isinstance(payment_id, bool):
+        payment_id = str(payment_id)  # JSON clients may send numeric ids
+    if payment_id is not None and not isinstance(payment_id, str):
+        return "payment_id must be a string."
+    claim["payment_id"] = (payment_id or "").strip() or None
+    if claim["payment_id"] and len(claim["payment_id"]) > 20:
+        return "payment_id is longer than 20 characters."
+    return None
+
+
+def _claim_rows(user, policy_ids: Iterable[int]) -> Dict[int, Dict]:
+    """Lock the policies and fetch everything the rules need in one query."""
+    first_accident = Accident.objects.filter(policy=OuterRef("pk")).order_by("id")
+    rows = (
+        Policy.objects.select_for_update()
+        .filter(user=user, id__in=list(policy_ids))
+        .annotate(
+            accident_id=Subquery(first_accident.values("id")[:1]),
+            accident_date=Subquery(first_accident.values("date_of_accident")[:1]),
+            has_payment=Exists(Payment.objects.filter(policy=OuterRef("pk"))),
+        )
+        .values("id", "policy_number", "owner_id", "vehicle_id", "start_date", "end_date",
+                "accident_id", "accident_date", "has_payment")
+    )
+    return {row["id"]: row for row in rows}
+
+
+def settle_claims(user, claims: List[Dict], today: Optional[date] = None) -> List[Dict]:
+    """
+    Settle a batch of claims for `user`. Each claim is a dict with policy_id,
+    amount and optionally payment_date (default today), payment_method and
+    payment_id (allocated from a sequence when omitted).
+
+    A claim is settled when the policy belongs to the user, has no payment yet,
+    has a reported accident, and was active on the accident date. Returns one
+    result per claim, in input order, with status "settled" or an error code.
+    """
+    today = today or date.today()
+    claims = [dict(claim) for claim in claims]
+    results: List[Optional[Dict]] = [None] * len(claims)
+
+    pending = []
+    seen_policies, seen_payment_ids = set(), set()
+    for index, claim in enumerate(claims):
+        error = _parse_claim(claim, today)
+        if error:
+            results[index] = _result(claim, INVALID, error)
+        elif claim["policy_id"] in seen_policies:
+            results[index] = _result(claim, ALREADY_PAID, "Policy appears more than once in this batch.")
+        elif claim["payment_id"] and claim["payment_id"] in seen_payment_ids:
+            results[index] = _result(claim, DUPLICATE_PAYMENT_ID, "Payment ID appears more than once in this batch.")
+        else:
+            seen_policies.add(claim["policy_id"])
+            if claim["payment_id"]:
+                seen_payment_ids.add(claim["payment_id"])
+            pending.append(index)
+
+    try:
+        with transaction.atomic(using=tenant_db(user)):
+            settled = _settle(user, claims, pending, results, seen_payment_ids)
+    except IntegrityError as exc:
+        # Only reachable when a concurrent writer on a backend without row locks got there first.
+        logger.warning("Settlement batch rolled back: %s", exc)
+        settled = 0
+        for index in pending:
+            if results[index] is None or results[index]["status"] == SETTLED:
+                results[index] = _result(claims[index], ALREADY_PAID, "Settled concurrently; please retry.")
+
+    if settled:
+        # bulk_create bypasses the signal receivers that maintain the counters and the data version.
+        adjust_user_stats(user.id, "payment_count", settled)
+        bump_data_version(user)
+    return results
+
+
+def _settle(user, claims: List[Dict], pending: List[int], results: List[Optional[Dict]],
+            payment_ids: set) -> int:
+    rows = _claim_rows(user, (claims[index]["policy_id"] for index in pending)) if pending else {}
+    # Every shard: payment ids are unique across tenants (see insapp.sharding).
+    taken_ids = values_in_use(Payment, "payment_id", payment_ids) if payment_ids else set()
+
+    accepted = []
+    for index in pending:
+        claim = claims[index]
+        row = rows.get(claim["policy_id"])
+        if row is None:
+            results[index] = _result(claim, NOT_FOUND, "Policy not found.")
+        elif row["has_payment"]:
+            results[index] = _result(claim, ALREADY_PAID, f"Payment already exists for Policy {row['policy_number']}.")
+        elif row["accident_id"] is None:
+            results[index] = _result(claim, NO_ACCIDENT, f"No accident reported for Policy {row['policy_number']}. "
+                                                         f"Payment requires a valid accident.")
+        elif not row["start_date"] <= row["accident_date"] <= row["end_date"]:
+            results[index] = _result(claim, NOT_ACTIVE, f"Policy {row['policy_number']} was not active "
+                                                        f"at the time of accident.")
+        elif claim["payment_id"] in taken_ids:
+            results[index] = _result(claim, DUPLICATE_PAYMENT_ID, f"Payment ID {claim['payment_id']} already exists.")
+        else:
+            accepted.append(index)
+
+    unnamed = sum(1 for index in accepted if not claims[index]["payment_id"])
+    generated = iter(allocate_payment_ids(unnamed) if unnamed else [])
+    payments = []
+    for index in accepted:
+        claim, row = claims[index], rows[claims[index]["policy_id"]]
+        payment_id = claim["payment_id"] or next(generated)
+        payments.append(Payment(
+            user=user, owner_id=row["owner_id"], vehicle_id=row["vehicle_id"], policy_id=row["id"],
+            accident_id=row["accident_id"], payment_id=payment_id, amount=claim["amount"],
+            payment_date=claim["payment_date"], payment_method=claim["payment_method"],
+        ))
+        results[index] = _result(claim, SETTLED, f"Payment recorded successfully. Payment ID: {payment_id}",
+                                 payment_id=payment_id)
+    Payment.objects.bulk_create(payments, batch_size=1000)
+    return len(payments)
+
+
+def pending_claims(user, limit: int = 100) -> List[Dict]:
+    """Claims awaiting settlement: policies with an accident during cover and no payment yet."""
+    first_accident = Accident.objects.filter(policy=OuterRef("pk")).order_by("id")
+    rows = (
+        Policy.objects.filter(user=user)
+        .annotate(
+            accident_date=Subquery(first_accident.values("date_of_accident")[:1]),
+            has_payment=Exists(Payment.objects.filter(policy=OuterRef("pk"))),
+        )
+        .filter(has_payment=False, accident_date__gte=F("start_date"), accident_date__lte=F("end_date"))
+        .order_by("id")
+        .values("id", "policy_number", "accident_date")[:limit]
+    )
+    return [
+        {"policy_id": row["id"], "policy_number": row["policy_number"],
+         "accident_date": row["accident_date"].isoformat()}
+        for row in rows
+    ]
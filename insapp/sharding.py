@@ -0,0 +1,366 @@
+"""
+Tenant sharding: each user's insapp rows (owners, vehicles, policies, accidents,
+payments and dashboard counters) live together on one of DATABASE_SHARDS.
+
+Placement: the first time a tenant is resolved, jump consistent hashing of its
+user id over the configured shards picks one, and the choice is recorded in
+TenantShard on the default database. Recorded placements are sticky, so adding
+a shard never strands existing tenants; move them with
+`manage.py rebalance_tenants`. Users that existed before sharding are recorded
+on "default" by migration 0009.
+
+Routing (insapp.routers.TenantShardRouter): inside a request the tenant is
+request.user (bound by TenantShardMiddleware); elsewhere bind one with
+tenant(user) or on_shard(alias), or pass .using(tenant_db(user)). Unbound
+queries go to the default database.
+
+With a single shard nothing is recorded or looked up.
+
+Uniqueness: each shard is its own database, so the unique indexes on
+Vehicle.vehicle_number, Policy.policy_number and Payment.payment_id only
+compare rows on the same shard. Policy numbers come from one counter on the
+default database and are unique everywhere. Vehicle numbers and payment ids are
+checked on every shard (values_in_use) by the importer and claim settlement;
+the single-record forms rely on the index and so are unique per shard only.
+move_tenant refuses a move that would collide on the target.
+
+Ids: primary keys are per shard too, so move_tenant gives every moved row a
+new id and records old -> new in MovedRow; moved_id() resolves an old id, which
+the views use to redirect links bookmarked before the move.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from .fragments import bump_data_version
+from .models import Accident, MovedRow, Owner, Payment, Policy, TenantShard, UserStats, Vehicle
+
+# Model -> name in move summaries; copied in this order, so foreign keys always point at rows already copied.
+TENANT_MODELS = {Owner: "owners", Vehicle: "vehicles", Policy: "policies", Accident: "accidents",
+                 Payment: "payments", UserStats: "stats"}
+TENANT_LABELS = frozenset(model._meta.label_lower for model in TENANT_MODELS)
+CACHE_KEY = "tenant_shard:v1:{user_id}"
+MOVE_CHUNK_SIZE = 5000
+# Unique columns of tenant rows; the target shard's indexes must accept them before a move.
+UNIQUE_FIELDS = {Vehicle: "vehicle_number", Policy: "policy_number", Payment: "payment_id"}
+# Values per IN (...) list, well inside SQLite's bound-parameter limit.
+IN_CHUNK_SIZE = 900
+
+
+def shards() -> List[str]:
+    return list(getattr(settings, "DATABASE_SHARDS", None) or [DEFAULT_DB_ALIAS])
+
+
+def enabled() -> bool:
+    return len(shards()) > 1
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    """Lamping & Veach's jump consistent hash: growing to n buckets moves only 1/n of the keys."""
+    bucket, candidate = -1, 0
+    while candidate < buckets:
+        bucket = candidate
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        candidate = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def placement(user_id: int) -> str:
+    """Shard a new tenant is placed on."""
+    aliases = shards()
+    return aliases[jump_hash(user_id, len(aliases))]
+
+
+def _user_id(user) -> int:
+    return user if isinstance(user, int) else user.pk
+
+
+def _ensure_users(alias: str, user_ids: Iterable[int]) -> None:
+    """
+    Copy the auth_user rows a shard's tenant tables point at (their user foreign
+    keys are real constraints). Only the id matters; the default database stays
+    the source of truth for accounts.
+    """
+    if alias == DEFAULT_DB_ALIAS:
+        return
+    user_ids = set(user_ids)
+    present = set(User.objects.using(alias).filter(id__in=user_ids).values_list("id", flat=True))
+    missing = list(User.objects.using(DEFAULT_DB_ALIAS).filter(id__in=user_ids - present))
+    if missing:
+        User.objects.using(alias).bulk_create(missing, ignore_conflicts=True)
+
+
+def shard_map(user_ids: Iterable[int]) -> Dict[int, str]:
+    """Shard of each user, placing (and recording) the ones seen for the first time."""
+    user_ids = set(user_ids)
+    if not enabled():
+        return dict.fromkeys(user_ids, DEFAULT_DB_ALIAS)
+    placed = dict(TenantShard.objects.filter(user_id__in=user_ids).values_list("user_id", "shard"))
+    new = {user_id: placement(user_id) for user_id in user_ids - placed.keys()}
+    if new:
+        for alias in set(new.values()):
+            _ensure_users(alias, [user_id for user_id, shard in new.items() if shard == alias])
+        TenantShard.objects.bulk_create([TenantShard(user_id=user_id, shard=alias) for user_id, alias in new.items()],
+                                        ignore_conflicts=True)
+        placed.update(TenantShard.objects.filter(user_id__in=new).values_list("user_id", "shard"))
+    return placed
+
+
+def _entry(user_id: int):
+    """(shard, moving) for a tenant, from the cache or the default database."""
+    key = CACHE_KEY.format(user_id=user_id)
+    entry = cache.get(key)
+    if entry is None:
+        row = TenantShard.objects.filter(pk=user_id).values_list("shard", "moving").first()
+        entry = row or (shard_map([user_id])[user_id], False)
+        cache.set(key, entry, getattr(settings, "SHARD_MAP_CACHE_TTL", 300))
+    return entry
+
+
+def shard_for(user) -> str:
+    """Database alias holding the tenant's rows."""
+    return _entry(_user_id(user))[0] if enabled() else DEFAULT_DB_ALIAS
+
+
+tenant_db = shard_for
+
+
+def is_moving(user) -> bool:
+    return enabled() and _entry(_user_id(user))[1]
+
+
+def forget(user) -> None:
+    """Drop the cached placement (every process must see a move; use a shared cache backend)."""
+    cache.delete(CACHE_KEY.format(user_id=_user_id(user)))
+
+
+def values_in_use(model, field: str, values: Iterable, aliases: Optional[Iterable[str]] = None) -> Set:
+    """
+    Which of `values` some row of `model` already has in `field`, on any shard
+    (or only the given aliases). unique=True is enforced by each shard's
+    database alone, so code that needs a value to be unique across tenants
+    checks here first.
+    """
+    values = list(set(values))
+    taken = set()
+    for alias in aliases if aliases is not None else shards():
+        rows = model._base_manager.using(alias)
+        for start in range(0, len(values), IN_CHUNK_SIZE):
+            taken.update(rows.filter(**{f"{field}__in": values[start:start + IN_CHUNK_SIZE]})
+                         .values_list(field, flat=True))
+    return taken
+
+
+# ------------------- BINDING -------------------
+
+class _Binding:
+    """The tenant (or fixed shard) unbound queries are routed to, resolved on first use."""
+
+    __slots__ = ("resolve", "alias")
+
+    def __init__(self, resolve: Callable[[], Optional[str]]):
+        self.resolve = resolve
+        self.alias: Optional[str] = None
+
+    def db(self) -> Optional[str]:
+        if self.alias is None:
+            self.alias = self.resolve()
+        return self.alias
+
+
+_binding: ContextVar[Optional[_Binding]] = ContextVar("insapp_tenant", default=None)
+
+
+def current_db() -> Optional[str]:
+    """Shard of the bound tenant, or None when nothing is bound (or sharding is off)."""
+    binding = _binding.get()
+    return binding.db() if binding is not None and enabled() else None
+
+
+@contextmanager
+def tenant(user):
+    """Route unbound tenant queries in the block to the user's shard."""
+    token = _binding.set(_Binding(lambda: shard_for(user)))
+    try:
+        yield
+    finally:
+        _binding.reset(token)
+
+
+@contextmanager
+def on_shard(alias: str):
+    """Route unbound tenant queries in the block to one shard (for cross-tenant maintenance)."""
+    token = _binding.set(_Binding(lambda: alias))
+    try:
+        yield
+    finally:
+        _binding.reset(token)
+
+
+def bind_request(request):
+    """Bind request.user lazily (static pages never look it up); returns the token for unbind."""
+    def resolve():
+        user = getattr(request, "user", None)
+        return shard_for(user) if user is not None and user.is_authenticated else None
+    return _binding.set(_Binding(resolve))
+
+
+def unbind(token) -> None:
+    _binding.reset(token)
+
+
+# ------------------- REBALANCING -------------------
+
+def _tenant_rows(model, alias: str, user_id: int):
+    queryset = model._base_manager.using(alias)
+    if model is Accident:
+        return queryset.filter(owner__user_id=user_id)
+    if model is UserStats:
+        return queryset.filter(pk=user_id)
+    return queryset.filter(user_id=user_id)
+
+
+def _copy(model, source: str, target: str, user_id: int, id_maps: Dict, chunk_size: int) -> int:
+    """
+    Copy one model's tenant rows in keyset chunks. Ids are per shard, so rows get
+    new ids on the target and foreign keys are rewritten through id_maps.
+    """
+    pk_name = model._meta.pk.attname
+    names = [field.attname for field in model._meta.concrete_fields]
+    remapped = {field.attname: id_maps[field.related_model] for field in model._meta.concrete_fields
+                if field.is_relation and field.related_model in id_maps}
+    keeps_pk = model is UserStats  # keyed by the user, which keeps its id
+    id_map = None if keeps_pk else id_maps.setdefault(model, {})
+    rows = _tenant_rows(model, source, user_id).order_by("pk").values_list(*names)
+    copied, last_pk = 0, None
+    while True:
+        batch = list((rows.filter(pk__gt=last_pk) if last_pk is not None else rows)[:chunk_size])
+        if not batch:
+            return copied
+        objects = []
+        for row in batch:
+            values = dict(zip(names, row))
+            for name, mapping in remapped.items():
+                if values[name] is not None:
+                    values[name] = mapping[values[name]]
+            if not keeps_pk:
+                values[pk_name] = None
+            objects.append(model(**values))
+        model._base_manager.using(target).bulk_create(objects)
+        last_pk = batch[-1][names.index(pk_name)]
+        if id_map is not None:
+            id_map.update((row[names.index(pk_name)], obj.pk) for row, obj in zip(batch, objects))
+        copied += len(objects)
+
+
+def _collisions(source: str, target: str, user_id: int) -> List[str]:
+    """The tenant's unique values (UNIQUE_FIELDS) that rows on `target` already hold."""
+    clashes = []
+    for model, field in UNIQUE_FIELDS.items():
+        values = _tenant_rows(model, source, user_id).values_list(field, flat=True)
+        clashes.extend(f"{model._meta.verbose_name} {field} {value}"
+                       for value in sorted(values_in_use(model, field, values.iterator(), [target])))
+    return clashes
+
+
+def _record_moves(user_id: int, id_maps: Dict) -> None:
+    """
+    Record the ids the tenant's rows got on the target (MovedRow), and point the
+    records of earlier moves at them too, so an old id resolves in one lookup.
+    """
+    new_ids = {model._meta.label_lower: mapping for model, mapping in id_maps.items()}
+    earlier = list(MovedRow.objects.using(DEFAULT_DB_ALIAS).filter(user_id=user_id))
+    for row in earlier:
+        row.new_id = new_ids.get(row.model, {}).get(row.new_id, row.new_id)
+    MovedRow.objects.using(DEFAULT_DB_ALIAS).bulk_update(earlier, ["new_id"], batch_size=MOVE_CHUNK_SIZE)
+    MovedRow.objects.using(DEFAULT_DB_ALIAS).bulk_create(
+        (MovedRow(user_id=user_id, model=label, old_id=old_id, new_id=new_id)
+         for label, mapping in new_ids.items() for old_id, new_id in mapping.items()),
+        batch_size=MOVE_CHUNK_SIZE,
+        # A source shard can hand out an id the tenant once had on another shard; the latest move wins.
+        update_conflicts=True, unique_fields=["user", "model", "old_id"], update_fields=["new_id"],
+    )
+
+
+def moved_id(model, old_id: int, user) -> Optional[int]:
+    """The id of the tenant's row that had `old_id` before rebalance_tenants moved it, or None."""
+    return (MovedRow.objects.using(DEFAULT_DB_ALIAS)
+            .filter(user_id=_user_id(user), model=model._meta.label_lower, old_id=old_id)
+            .values_list("new_id", flat=True).first())
+
+
+def purge_tenant(alias: str, user_id: int) -> None:
+    """
+    Delete the tenant's rows from a shard with plain DELETEs (children first, no
+    per-row signals), and its copied auth_user row unless the shard is the default database.
+    """
+    connection = connections[alias]
+    quote = connection.ops.quote_name
+    owners = f"SELECT id FROM {quote(Owner._meta.db_table)} WHERE user_id = %s"
+    statements = [
+        (UserStats, "user_id = %s"),
+        (Payment, "user_id = %s"),
+        (Accident, f"owner_id IN ({owners})"),
+        (Policy, "user_id = %s"),
+        (Vehicle, "user_id = %s"),
+        (Owner, "user_id = %s"),
+    ]
+    with transaction.atomic(using=alias), connection.cursor() as cursor:
+        for model, where in statements:
+            cursor.execute(f"DELETE FROM {quote(model._meta.db_table)} WHERE {where}", [user_id])
+        if alias != DEFAULT_DB_ALIAS:
+            cursor.execute(f"DELETE FROM {quote(User._meta.db_table)} WHERE id = %s", [user_id])
+
+
+def move_tenant(user, target: str, chunk_size: int = MOVE_CHUNK_SIZE,
+                progress: Optional[Callable[[str, int], None]] = None) -> Dict[str, int]:
+    """
+    Move a tenant's rows to `target`: writes are refused while the rows are
+    copied in one transaction on the target, the placement is switched once the
+    copy's row counts match the source, then the source rows are deleted.
+    Primary keys change (policy numbers and payment ids do not); the new ids are
+    recorded with the placement (see moved_id). Returns the rows copied per
+    model; raises ValueError for an unknown shard, and RuntimeError, before
+    anything is copied, if a vehicle number, policy number or payment id is
+    already taken on the target.
+    """
+    user_id = _user_id(user)
+    if target not in shards():
+        raise ValueError(f"Unknown shard {target!r}; configured shards: {', '.join(shards())}.")
+    source = shard_for(user_id)
+    if source == target:
+        return {}
+
+    TenantShard.objects.filter(pk=user_id).update(moving=True)
+    forget(user_id)
+    try:
+        clashes = _collisions(source, target, user_id)
+        if clashes:
+            shown = ", ".join(clashes[:5]) + (f" and {len(clashes) - 5} more" if len(clashes) > 5 else "")
+            raise RuntimeError(f"{target} already has {shown}; nothing was moved.")
+        _ensure_users(target, [user_id])
+        copied, id_maps = {}, {}
+        with transaction.atomic(using=target):
+            for model, name in TENANT_MODELS.items():
+                copied[name] = _copy(model, source, target, user_id, id_maps, chunk_size)
+                if _tenant_rows(model, source, user_id).count() != copied[name]:
+                    raise RuntimeError(f"{name} changed on {source} during the move; nothing was moved.")
+                if progress:
+                    progress(name, copied[name])
+        with transaction.atomic(using=DEFAULT_DB_ALIAS):
+            _record_moves(user_id, id_maps)
+            TenantShard.objects.filter(pk=user_id).update(shard=target, moving=False)
+    except BaseException:
+        TenantShard.objects.filter(pk=user_id).update(moving=False)
+        forget(user_id)
+        raise
+    forget(user_id)
+    purge_tenant(source, user_id)
+    # Cached fragments link to the old primary keys.
+    bump_data_version(user_id)
+    return copied
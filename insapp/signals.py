@@ -0,0 +1,59 @@
+from functools import partial
+
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.signals import post_save, post_delete, pre_delete
+
+from . import sharding
+from .fragments import bump_data_version
+from .models import TenantShard
+from .stats import STAT_FIELDS, adjust_user_stats, current_batch, stats_user_id
+
+
+def count_created(sender, instance, created, raw=False, **kwargs):
+    """Increment the owning user's counter when a tracked row is inserted."""
+    if not created or raw:
+        return
+    adjust_user_stats(stats_user_id(instance), STAT_FIELDS[sender], 1)
+
+
+def count_deleted(sender, instance, **kwargs):
+    """Decrement the owning user's counter when a tracked row (or its cascade) is deleted."""
+    batch = current_batch()
+    if batch is not None:
+        batch.deltas[STAT_FIELDS[sender]] -= 1
+        return
+    adjust_user_stats(stats_user_id(instance), STAT_FIELDS[sender], -1)
+
+
+# Connect per model rather than globally so unrelated models keep Django's fast-delete path.
+for model in STAT_FIELDS:
+    post_save.connect(count_created, sender=model, dispatch_uid=f"insapp_stats_created_{model.__name__}")
+    post_delete.connect(count_deleted, sender=model, dispatch_uid=f"insapp_stats_deleted_{model.__name__}")
+
+
+def data_changed(sender, instance, using, raw=False, **kwargs):
+    """Bump the owning user's data version once the write commits, so cached fragments re-render."""
+    if raw or current_batch() is not None:  # batch_stats bumps once at the end
+        return
+    user_id = stats_user_id(instance)
+    if user_id is not None:
+        transaction.on_commit(partial(bump_data_version, user_id), using=using)
+
+
+for model in STAT_FIELDS:
+    post_save.connect(data_changed, sender=model, dispatch_uid=f"insapp_version_saved_{model.__name__}")
+    post_delete.connect(data_changed, sender=model, dispatch_uid=f"insapp_version_deleted_{model.__name__}")
+
+
+def delete_sharded_tenant(sender, instance, using, **kwargs):
+    """Deleting an account on the default database cascades there only; clear its rows on its own shard too."""
+    if using != DEFAULT_DB_ALIAS or not sharding.enabled():
+        return
+    shard = TenantShard.objects.filter(pk=instance.pk).values_list("shard", flat=True).first()
+    if shard and shard != DEFAULT_DB_ALIAS:
+        sharding.purge_tenant(shard, instance.pk)
+    sharding.forget(instance)
+
+
+pre_delete.connect(delete_sharded_tenant, sender=User, dispatch_uid="insapp_sharded_tenant_deleted")
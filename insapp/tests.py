@@ -1,3 +1,1352 @@
-from django.test import TestCase
+"""
+Performance regression suite, plus behaviour tests for rules that query
+budgets cannot see (the news cache, claim settlement, bulk import, sharding).
 
-# Create your tests here.
+Seeds a synthetic dataset with insapp.seed.bulk_seed, requests every route in
+vehicles/urls.py through the test client and checks:
+
+* a fixed SQL query budget per view, which must not grow with the data size
+  (an N+1 in a template or view shows up as a budget failure),
+* wall-clock latency against the baselines in perf_baselines.json, and
+* worker boot: importing the URLconf stays within a time budget and leaves the
+  chart and news libraries unloaded.
+
+Environment knobs:
+  VIMS_PERF_SCALE=1k|100k|1m   dataset size in policies (default 1k)
+  VIMS_PERF_THRESHOLD=1.0      allowed slowdown over baseline (1.0 = twice as slow)
+  VIMS_PERF_SLACK_MS=20        absolute slack added to every latency baseline
+  VIMS_PERF_RECORD=1           rewrite the baselines for the current scale instead of checking
+  VIMS_IMPORT_BUDGET_MS=1000   allowed time for django.setup() plus importing the URLconf
+"""
+import asyncio
+import csv
+import io
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import mock
+from asgiref.sync import async_to_sync
+
+from django.contrib.auth.models import User
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection, connections
+from django.http import HttpResponse
+from django.urls import URLPattern, get_resolver, reverse
+
+from . import charts, exporter, news, sequences, settlement, sharding, typeahead
+from .analytics import get_analytics
+from .checks import check_search_triggers
+from .fragments import bump_data_version
+from .importer import import_file
+from .ledger import policy_ledger, policy_statuses
+from .middleware import QueryInstrumentationMiddleware
+from .models import Owner, Vehicle, Policy, Accident, Payment, Sequence, TenantShard
+from .news import clear_news_cache, get_accident_news
+from .premiums import quote_premium, reprice_policies
+from .queryplans import check_query_plans
+from .routers import PIN_COOKIE
+from .search import bucket_counts, decode_cursor, encode_cursor, search_accidents, user_accidents
+from .seed import bulk_seed
+from .stats import STAT_FIELDS, compute_user_counts, get_user_stats
+
+PERF_SCALE = os.getenv("VIMS_PERF_SCALE", "1k")
+PERF_SCALES = {
+    "1k": {"owners_per_user": 500, "vehicles_per_owner": 2},
+    "100k": {"owners_per_user": 50_000, "vehicles_per_owner": 2},
+    "1m": {"owners_per_user": 500_000, "vehicles_per_owner": 2},
+}
+LATENCY_THRESHOLD = float(os.getenv("VIMS_PERF_THRESHOLD", "1.0"))
+LATENCY_SLACK_MS = float(os.getenv("VIMS_PERF_SLACK_MS", "20"))
+RECORD_BASELINES = os.getenv("VIMS_PERF_RECORD") == "1"
+BASELINES_PATH = Path(__file__).with_name("perf_baselines.json")
+LATENCY_RUNS = 5
+IMPORT_BUDGET_MS = float(os.getenv("VIMS_IMPORT_BUDGET_MS", "1000"))
+# Loaded on first use by the chart and news views, never at boot.
+LAZY_MODULES = ("matplotlib", "requests", "httpx")
+
+# Route name -> how to request it and the most SQL queries it may run.
+#   kwargs:   fixture attributes used as URL kwargs
+#   params:   fixture -> query string dict
+#   mutating: the GET changes data, so it is requested once and not timed
+ROUTES = {
+    "home": {"budget": 0},
+    "login": {"budget": 0},
+    "account_login": {"budget": 0},
+    "register": {"budget": 0},
+    "logout": {"budget": 4, "mutating": True},
+    "about": {"budget": 0},
+    "contact": {"budget": 0},
+    "explore": {"budget": 0},
+    "owners": {"budget": 2},  # table served from the fragment cache
+    "update_owner": {"kwargs": {"owner_id": "owner_id"}, "budget": 3},
+    "delete_owner": {"kwargs": {"owner_id": "spare_owner_id"}, "budget": 16, "mutating": True},
+    "vehicles": {"budget": 2},  # table served from the fragment cache
+    "update_vehicle": {"kwargs": {"vehicle_id": "vehicle_id"}, "budget": 4},
+    "delete_vehicle": {"kwargs": {"vehicle_id": "spare_vehicle_id"}, "budget": 8, "mutating": True},
+    "policy": {"params": lambda f: {"owner": f.owner_id}, "budget": 7},
+    "accidents": {"params": lambda f: {"owner": f.owner_id, "vehicle": f.vehicle_id}, "budget": 5},
+    "payment": {"budget": 2},  # table served from the fragment cache
+    "news": {"budget": 2},
+    "check_policy_status": {"params": lambda f: {"policy_id": f.claimed_policy_id}, "budget": 3},
+    "policy_status_batch": {"params": lambda f: {"owner": f.owner_id}, "budget": 3},
+    "bulk_import": {"budget": 2},
+    "settlements": {"budget": 3},
+    "premium_quotes": {"params": lambda f: {"vehicle": f.vehicle_id}, "budget": 4},
+    "typeahead": {"params": lambda f: {"q": f.owner_prefix}, "budget": 3},
+    "policy_ledger": {"params": lambda f: {"owner": f.owner_id}, "budget": 4},
+    "bar_chart": {"budget": 3},
+    "pie_chart": {"budget": 3},
+    "filter_view": {"params": lambda f: {"time_range": "365"}, "budget": 4},
+    "analytics": {"budget": 7},
+    "analytics_api": {"params": lambda f: {"window": "all"}, "budget": 7},
+    "export_accidents": {"params": lambda f: {"time_range": "365"}, "budget": 3},
+    "export_policies": {"budget": 3},
+    "export_payments": {"params": lambda f: {"format": "ndjson"}, "budget": 3},
+}
+
+# Extra variants of heavy views, checked against the same budget as the route.
+VARIANTS = {
+    "owners": [lambda f: {"search": f.owner_prefix}],
+    "policy": [lambda f: {}, lambda f: {"owner": f.owner_id, "status": "expired", "sort": "status",
+                                                 "cursor": "2.2024-06-30.1000"}],
+    "policy_status_batch": [lambda f: {"ids": ",".join(str(i) for i in range(1, 501))},
+                            lambda f: {"vehicle": f.vehicle_id}],
+    "policy_ledger": [lambda f: {}, lambda f: {"status": "active", "sort": "expiry", "page_size": 200},
+                      lambda f: {"cursor": "2024-06-30.1000"}],
+    "premium_quotes": [lambda f: {}],
+    "filter_view": [lambda f: {}, lambda f: {"owner_search": f.owner_prefix, "status": "Active"}],
+    "export_accidents": [lambda f: {"format": "ndjson", "owner_search": f.owner_prefix, "status": "Active"}],
+    "export_policies": [lambda f: {"status": "active", "time_range": "3650"}],
+}
+
+
+def _load_baselines():
+    if BASELINES_PATH.exists():
+        return json.loads(BASELINES_PATH.read_text())
+    return {}
+
+
+def _project_routes():
+    """Named routes declared directly in vehicles/urls.py (the admin include is Django's own)."""
+    return [pattern.name for pattern in get_resolver().url_patterns
+            if isinstance(pattern, URLPattern) and pattern.name]
+
+
+@override_settings(NEWS_API_URL="http://127.0.0.1:9/v2/everything", NEWS_API_TIMEOUT=1)
+class ViewPerformanceTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # The news upstream is deliberately unreachable; keep its error log out of the test output.
+        cls._news_logger_level = logging.getLogger("insapp.news").level
+        logging.getLogger("insapp.news").setLevel(logging.CRITICAL)
+
+    @classmethod
+    def tearDownClass(cls):
+        logging.getLogger("insapp.news").setLevel(cls._news_logger_level)
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        bulk_seed(num_users=2, seed=1, username_prefix="perfuser", workers=1, **PERF_SCALES[PERF_SCALE])
+        cls.user = User.objects.get(username="perfuser1")
+        owner = Owner.objects.filter(user=cls.user).order_by("id").first()
+        cls.owner_id = owner.id
+        cls.owner_prefix = owner.owner.split()[0][:3]
+        cls.vehicle_id = Vehicle.objects.filter(owner=owner).order_by("id").first().id
+        cls.claimed_policy_id = Accident.objects.filter(owner__user=cls.user).values_list("policy_id", flat=True).first()
+
+        # Disposable rows for the delete routes, shaped like a seeded owner.
+        spare = Owner.objects.create(user=cls.user, owner="Spare Owner", address="1 Test Road", phone_number="+91 9000000000")
+        cls.spare_owner_id = spare.id
+        spare_vehicle = Vehicle.objects.create(user=cls.user, owner=spare, vehicle_number="ZZ-99-ZZ-9999", vin="SPARE00001")
+        Policy.objects.create(user=cls.user, owner=spare, vehicle=spare_vehicle, policy_number="POL-SPARE",
+                              policy_type="Essential Cover (3 months)", start_date="2025-01-01",
+                              end_date="2025-04-10", premium_amount=3000)
+        cls.spare_vehicle_id = Vehicle.objects.create(
+            user=cls.user, owner=Owner.objects.get(pk=cls.owner_id), vehicle_number="ZZ-99-ZZ-9998", vin="SPARE00002"
+        ).id
+
+    def setUp(self):
+        clear_news_cache()
+        self.client.force_login(self.user)
+
+    def _url(self, name, params=None):
+        spec = ROUTES[name]
+        kwargs = {key: getattr(self, attr) for key, attr in spec.get("kwargs", {}).items()}
+        url = reverse(name, kwargs=kwargs or None)
+        return url, (params or spec.get("params", lambda f: {}))(self)
+
+    def _count_queries(self, url, params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params)
+            if response.streaming:
+                # Streamed bodies run their queries while being consumed.
+                b"".join(response.streaming_content)
+        self.assertLess(response.status_code, 400, f"{url} returned {response.status_code}")
+        return len(ctx.captured_queries)
+
+    def test_every_route_has_a_budget(self):
+        missing = sorted(set(_project_routes()) - set(ROUTES))
+        self.assertEqual(missing, [], "Add a query budget to ROUTES for every new route.")
+
+    def test_query_budgets(self):
+        for name, spec in ROUTES.items():
+            if spec.get("mutating"):
+                continue
+            for params in [None] + VARIANTS.get(name, []):
+                url, query = self._url(name, params)
+                with self.subTest(route=name, params=query):
+                    # Warm once so one-off work (sequence rows, introspection, chart renders) is excluded.
+                    self.client.get(url, query)
+                    self.assertLessEqual(self._count_queries(url, query), spec["budget"])
+
+    def test_mutating_route_budgets(self):
+        for name, spec in ROUTES.items():
+            if not spec.get("mutating"):
+                continue
+            with self.subTest(route=name):
+                self.client.force_login(self.user)
+                url, query = self._url(name)
+                self.assertLessEqual(self._count_queries(url, query), spec["budget"])
+
+    def test_fragment_cache_follows_writes(self):
+        url = reverse("owners")
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Owner.objects.create(user=self.user, owner="Fragment Probe", address="2 Test Road",
+                                 phone_number="+91 9000000001")
+        self.assertContains(self.client.get(url), "Fragment Probe")
+
+    def _claimed_owner(self, vehicles):
+        """An owner with `vehicles` vehicles, each with a policy, an accident and a payment."""
+        owner = Owner.objects.create(user=self.user, owner=f"Cascade {vehicles}", address="3 Test Road")
+        for index in range(vehicles):
+            vehicle = Vehicle.objects.create(user=self.user, owner=owner, vehicle_number=f"ZZ-98-Z{vehicles}-{index:04}",
+                                             vin=f"CASCADE{vehicles}{index:02}")
+            policy = Policy.objects.create(user=self.user, owner=owner, vehicle=vehicle,
+                                           policy_number=f"POL-CASCADE-{vehicles}-{index}",
+                                           policy_type="Essential Cover (3 months)", start_date="2025-01-01",
+                                           end_date="2025-04-10", premium_amount=3000)
+            accident = Accident.objects.create(owner=owner, vehicle=vehicle, policy=policy,
+                                               date_of_accident="2025-02-01", location="Junction",
+                                               description="Dent", policy_status="Active")
+            Payment.objects.create(user=self.user, owner=owner, vehicle=vehicle, policy=policy, accident=accident,
+                                   payment_id=f"PAY-C{vehicles}-{index}", amount=500, payment_method="UPI")
+        return owner
+
+    def test_delete_cost_does_not_grow_with_the_cascade(self):
+        counts = [self._count_queries(reverse("delete_owner", args=[self._claimed_owner(size).pk]), {})
+                  for size in (1, 6)]
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual({field: getattr(get_user_stats(self.user), field) for field in STAT_FIELDS.values()},
+                         compute_user_counts(self.user.id))
+
+    def test_fragment_cache_is_shared_between_processes(self):
+        # A process-local cache would let each worker serve fragments the others' writes invalidated.
+        self.assertNotIsInstance(caches["default"], LocMemCache)
+
+    def test_latency_against_baselines(self):
+        baselines = _load_baselines()
+        if not RECORD_BASELINES:
+            self.assertIn(PERF_SCALE, baselines,
+                          f"No latency baselines for scale {PERF_SCALE}; record them with VIMS_PERF_RECORD=1.")
+        measured = {}
+        regressions = []
+        for name, spec in ROUTES.items():
+            if spec.get("mutating"):
+                continue
+            url, query = self._url(name)
+            self.client.get(url, query)
+            timings = []
+            for _ in range(LATENCY_RUNS):
+                started = time.perf_counter()
+                self.client.get(url, query)
+                timings.append((time.perf_counter() - started) * 1000)
+            measured[name] = round(statistics.median(timings), 2)
+
+            baseline = baselines.get(PERF_SCALE, {}).get(name)
+            if baseline is not None and measured[name] > baseline * (1 + LATENCY_THRESHOLD) + LATENCY_SLACK_MS:
+                regressions.append(f"{name}: {measured[name]:.1f} ms (baseline {baseline:.1f} ms)")
+
+        if RECORD_BASELINES:
+            baselines[PERF_SCALE] = measured
+            BASELINES_PATH.write_text(json.dumps(baselines, indent=2, sort_keys=True) + "\n")
+            return
+        missing = sorted(set(measured) - set(baselines[PERF_SCALE]))
+        self.assertEqual(missing, [], "Record a latency baseline (VIMS_PERF_RECORD=1) for every new route.")
+        self.assertEqual(regressions, [], "Latency regressed beyond the allowed threshold.")
+
+
+class _NewsStub(BaseHTTPRequestHandler):
+    """newsapi.org stand-in: answers with the server's current status and title after its delay."""
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+        time.sleep(server.delay)
+        body = json.dumps({"articles": [{"title": server.title}]}).encode()
+        self.send_response(server.status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class NewsCacheTests(SimpleTestCase):
+    """The stale-while-revalidate news cache against a local stub upstream."""
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _NewsStub)
+        self.server.lock = threading.Lock()
+        self.server.requests, self.server.delay, self.server.status, self.server.title = 0, 0, 200, "first"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        overrides = override_settings(
+            NEWS_API_KEY="test-key", NEWS_API_URL=f"http://127.0.0.1:{self.server.server_port}/v2/everything",
+            NEWS_API_TIMEOUT=5, NEWS_CACHE_TTL=600, NEWS_CACHE_STALE_TTL=600, NEWS_CACHE_ERROR_TTL=1,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        cache.clear()
+        clear_news_cache()
+        self.addCleanup(clear_news_cache)
+        self.addCleanup(self._wait_for_refreshes)
+
+    def _titles(self):
+        return [article["title"] for article in get_accident_news()]
+
+    def _wait_for_refreshes(self):
+        deadline = time.monotonic() + 5
+        while news._inflight:
+            self.assertLess(time.monotonic(), deadline, "A background refresh never finished.")
+            time.sleep(0.02)
+
+    def test_stale_entry_is_served_while_refreshing(self):
+        with override_settings(NEWS_CACHE_TTL=0):
+            self.assertEqual(self._titles(), ["first"])
+            self.server.title, self.server.delay = "second", 0.5
+            started = time.perf_counter()
+            self.assertEqual(self._titles(), ["first"])
+            self.assertLess(time.perf_counter() - started, 0.25, "A stale entry waited for the refresh.")
+            self._wait_for_refreshes()
+            self.assertEqual(self.server.requests, 2)
+            self.assertEqual(self._titles(), ["second"])
+
+    def test_async_path_follows_the_same_states(self):
+        atitles = lambda: [article["title"] for article in async_to_sync(news.aget_accident_news)()]
+        with override_settings(NEWS_CACHE_TTL=0):
+            self.assertEqual(atitles(), ["first"])
+            self.server.title = "second"
+            self.assertEqual(atitles(), ["first"])
+            self._wait_for_refreshes()
+            self.assertEqual(self.server.requests, 2)
+            self.assertEqual(self._titles(), ["second"])
+
+    def test_concurrent_misses_fetch_once(self):
+        self.server.delay = 0.3
+        with ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(lambda _: self._titles(), range(8)))
+        self.assertEqual(self.server.requests, 1)
+        self.assertEqual(results, [["first"]] * 8, "A caller that lost the claim did not wait for the fetch.")
+
+    def test_concurrent_async_misses_fetch_once(self):
+        self.server.delay = 0.3
+
+        async def gather():
+            return await asyncio.gather(*(news.aget_accident_news() for _ in range(8)))
+
+        results = [[article["title"] for article in articles] for articles in async_to_sync(gather)()]
+        self.assertEqual(self.server.requests, 1)
+        self.assertEqual(results, [["first"]] * 8)
+
+    def test_upstream_errors_are_cached_for_the_error_ttl(self):
+        self.server.status = 500
+        with self.assertLogs("insapp.news", "ERROR"):
+            self.assertEqual(self._titles(), [])
+        self.assertEqual(self._titles(), [])
+        self.assertEqual(self.server.requests, 1, "A failed fetch was retried within NEWS_CACHE_ERROR_TTL.")
+        self.server.status = 200
+        time.sleep(1.1)
+        self.assertEqual(self._titles(), ["first"])
+        self.assertEqual(self.server.requests, 2)
+
+
+class SettlementTests(TestCase):
+    """The settlement rules of insapp.settlement.settle_claims, one claim at a time."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("settler", password="x")
+        cls.owner = Owner.objects.create(user=cls.user, owner="Claim Owner", address="1 Road", phone_number="+91 9")
+        cls.vehicle = Vehicle.objects.create(user=cls.user, owner=cls.owner, vehicle_number="KA-01-AB-1000",
+                                             vin="CLAIMVIN01")
+        cls.covered = cls._policy("POL-CLAIM-1", accident_date=date(2025, 3, 1))
+        cls.covered_too = cls._policy("POL-CLAIM-4", accident_date=date(2025, 4, 1))
+        cls.uncovered = cls._policy("POL-CLAIM-2", accident_date=date(2024, 12, 1))
+        cls.no_accident = cls._policy("POL-CLAIM-3", accident_date=None)
+
+    @classmethod
+    def _policy(cls, number, accident_date):
+        policy = Policy.objects.create(user=cls.user, owner=cls.owner, vehicle=cls.vehicle, policy_number=number,
+                                       policy_type="Premium Protect (12 months)", start_date=date(2025, 1, 1),
+                                       end_date=date(2026, 1, 10), premium_amount=12000)
+        if accident_date:
+            Accident.objects.create(owner=cls.owner, vehicle=cls.vehicle, policy=policy, date_of_accident=accident_date,
+                                    location="Somewhere", description="Collision", policy_status="Active")
+        return policy
+
+    def _settle(self, **claim):
+        return settlement.settle_claims(self.user, [{"amount": 5000, **claim}], today=date(2025, 6, 1))[0]
+
+    def test_settles_a_covered_claim_once(self):
+        first = self._settle(policy_id=self.covered.id, payment_id="PAY-T-1")
+        self.assertEqual((first["status"], first["payment_id"]), (settlement.SETTLED, "PAY-T-1"))
+        again = self._settle(policy_id=self.covered.id, payment_id="PAY-T-2")
+        self.assertEqual(again["status"], settlement.ALREADY_PAID)
+        self.assertEqual(Payment.objects.filter(policy=self.covered).count(), 1)
+
+    def test_duplicate_payment_ids(self):
+        self._settle(policy_id=self.covered.id, payment_id="PAY-T-1")
+        taken = self._settle(policy_id=self.covered_too.id, payment_id="PAY-T-1")
+        self.assertEqual(taken["status"], settlement.DUPLICATE_PAYMENT_ID)
+        results = settlement.settle_claims(self.user, [
+            {"policy_id": self.covered_too.id, "amount": 1, "payment_id": "PAY-T-9"},
+            {"policy_id": self.no_accident.id, "amount": 1, "payment_id": "PAY-T-9"},
+        ], today=date(2025, 6, 1))
+        self.assertEqual(results[1]["status"], settlement.DUPLICATE_PAYMENT_ID)
+
+    def test_requires_an_accident_during_cover(self):
+        self.assertEqual(self._settle(policy_id=self.no_accident.id)["status"], settlement.NO_ACCIDENT)
+        self.assertEqual(self._settle(policy_id=self.uncovered.id)["status"], settlement.NOT_ACTIVE)
+        other = User.objects.create_user("other-settler", password="x")
+        result = settlement.settle_claims(other, [{"policy_id": self.covered.id, "amount": 1}])[0]
+        self.assertEqual(result["status"], settlement.NOT_FOUND)
+
+    def test_rejects_malformed_claims(self):
+        for claim in ({"payment_date": "2025-13-40"}, {"payment_date": "2025-07-01"}, {"payment_date": 20250301},
+                      {"amount": "lots"}, {"amount": -5}, {"payment_method": ["UPI"]}, {"payment_id": {"id": 1}},
+                      {"payment_id": "X" * 21}):
+            with self.subTest(claim=claim):
+                self.assertEqual(self._settle(policy_id=self.covered.id, **claim)["status"], settlement.INVALID)
+        self.assertFalse(Payment.objects.exists())
+
+    def test_accepts_numeric_payment_ids(self):
+        result = self._settle(policy_id=self.covered.id, payment_id=12345)
+        self.assertEqual((result["status"], result["payment_id"]), (settlement.SETTLED, "12345"))
+
+    def test_concurrent_settlement_rolls_back_the_batch(self):
+        # Another writer pays the policy after its row was read: the unique policy
+        # constraint rejects the insert and the whole batch is reported as already paid.
+        read_rows = settlement._claim_rows
+
+        def rows_then_concurrent_payment(user, policy_ids):
+            rows = read_rows(user, policy_ids)
+            Payment.objects.create(user=self.user, owner=self.owner, vehicle=self.vehicle, policy=self.covered,
+                                   payment_id="PAY-RACE", amount=1, payment_method="UPI")
+            return rows
+
+        with mock.patch.object(settlement, "_claim_rows", rows_then_concurrent_payment), \
+                self.assertLogs("insapp.settlement", "WARNING"):
+            result = self._settle(policy_id=self.covered.id)
+        self.assertEqual(result["status"], settlement.ALREADY_PAID)
+        self.assertIn("concurrently", result["message"])
+        self.assertFalse(Payment.objects.exists())
+
+
+class PolicyStatusTests(TestCase):
+    """Policy status endpoints report the state on today's date, not the last sweep's."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("status-checker", password="x")
+        owner = Owner.objects.create(user=cls.user, owner="Status Owner", address="4 Test Road")
+        vehicle = Vehicle.objects.create(user=cls.user, owner=owner, vehicle_number="ZZ-97-ZZ-0001", vin="STATUS0001")
+        cls.policy = Policy.objects.create(user=cls.user, owner=owner, vehicle=vehicle, policy_number="POL-STATUS",
+                                           policy_type="Essential Cover (3 months)", start_date=date(2020, 1, 1),
+                                           end_date=date(2020, 4, 10), premium_amount=3000)
+        # As if sweep_policies had not run since the policy lapsed.
+        Policy.objects.filter(pk=cls.policy.pk).update(status="active")
+
+    def test_state_follows_the_dates(self):
+        state = lambda today: policy_statuses(self.user, [self.policy.pk], today=today)[0]["state"]
+        self.assertEqual([state(date(2019, 12, 31)), state(date(2020, 4, 10)), state(date(2020, 4, 11))],
+                         ["upcoming", "active", "expired"])
+
+    def test_check_policy_status_ignores_a_stale_stored_status(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("check_policy_status"), {"policy_id": self.policy.pk})
+        self.assertEqual(response.json()["is_active"], False)
+
+    def test_ledger_tabs_ignore_a_stale_stored_status(self):
+        ledger = policy_ledger(self.user, state="expired")
+        self.assertEqual(ledger["state_counts"], {"active": 0, "upcoming": 0, "expired": 1, "all": 1})
+        self.assertEqual([(policy.pk, policy.state) for policy in ledger["policies"]], [(self.policy.pk, "expired")])
+        self.assertEqual(policy_ledger(self.user, state="active")["policies"], [])
+
+    def test_export_filters_on_the_current_state(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("export_policies"), {"format": "ndjson", "status": "expired"})
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual([(row["policy_number"], row["status"]) for row in rows], [("POL-STATUS", "expired")])
+
+
+class PolicyLedgerTests(TestCase):
+    """Ledger tabs, sorts and keyset paging on a handful of policies with known dates."""
+
+    TODAY = date(2024, 6, 1)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("ledger-reader", password="x")
+        owner = Owner.objects.create(user=cls.user, owner="Ledger Owner", address="5 Test Road")
+        vehicle = Vehicle.objects.create(user=cls.user, owner=owner, vehicle_number="ZZ-96-ZZ-0001", vin="LEDGER0001")
+        # Name -> (start, end); B and C share an end date, C and E a start date.
+        for name, start, end in (("A", "2024-01-01", "2024-04-10"), ("B", "2024-03-01", "2024-06-09"),
+                                 ("C", "2024-05-01", "2024-06-09"), ("D", "2024-07-01", "2024-10-09"),
+                                 ("E", "2024-05-01", "2024-08-09")):
+            Policy.objects.create(user=cls.user, owner=owner, vehicle=vehicle, policy_number=f"POL-LEDGER-{name}",
+                                  policy_type="Essential Cover (3 months)", start_date=date.fromisoformat(start),
+                                  end_date=date.fromisoformat(end), premium_amount=3000)
+
+    def _ledger(self, **kwargs):
+        return policy_ledger(self.user, today=self.TODAY, **kwargs)
+
+    def _walk(self, page_size=2, **kwargs):
+        """Every page of the ledger in turn, as lists of policy letters."""
+        pages, cursor = [], None
+        while True:
+            ledger = self._ledger(cursor=cursor, page_size=page_size, **kwargs)
+            pages.append([policy.policy_number[-1] for policy in ledger["policies"]])
+            cursor = ledger["next_cursor"]
+            if not cursor:
+                return pages
+
+    def test_tab_counts(self):
+        ledger = self._ledger(state="active")
+        self.assertEqual(ledger["state_counts"], {"active": 3, "upcoming": 1, "expired": 1, "all": 5})
+        self.assertEqual(ledger["total_count"], 3)
+
+    def test_sort_orders(self):
+        expected = {"start": "DECBA", "expiry": "ABCED", "-expiry": "DECBA", "status": "BCEDA"}
+        for sort, order in expected.items():
+            with self.subTest(sort=sort):
+                self.assertEqual("".join(p.policy_number[-1] for p in self._ledger(sort=sort)["policies"]), order)
+
+    def test_pages_cover_every_row_once(self):
+        # Page boundaries fall between rows that share the leading sort key.
+        self.assertEqual(self._walk(sort="start"), [["D", "E"], ["C", "B"], ["A"]])
+        self.assertEqual(self._walk(sort="-expiry", page_size=3), [["D", "E", "C"], ["B", "A"]])
+        self.assertEqual(self._walk(sort="status"), [["B", "C"], ["E", "D"], ["A"]])
+        self.assertEqual(self._walk(sort="expiry", state="active"), [["B", "C"], ["E"]])
+
+    def test_bad_cursor_means_the_first_page(self):
+        first = [policy.pk for policy in self._ledger(sort="status", page_size=2)["policies"]]
+        for cursor in ("garbage", "0.2024-13-01.1", "2024-06-09.2"):  # the last is a "start" cursor
+            with self.subTest(cursor=cursor):
+                ledger = self._ledger(sort="status", page_size=2, cursor=cursor)
+                self.assertEqual([policy.pk for policy in ledger["policies"]], first)
+
+    def test_api_pages_with_next_cursor(self):
+        self.client.force_login(self.user)
+        numbers, params = [], {"sort": "expiry", "page_size": 2}
+        while True:
+            body = self.client.get(reverse("policy_ledger"), params).json()
+            numbers += [row["policy_number"][-1] for row in body["results"]]
+            if not body["next_cursor"]:
+                break
+            params["cursor"] = body["next_cursor"]
+        self.assertEqual(len(numbers), 5)
+        self.assertEqual(len(set(numbers)), 5)
+
+
+class AnalyticsTests(TestCase):
+    """get_analytics totals and rollups on a small book with known premiums, claims and payouts."""
+
+    TODAY = date(2025, 6, 1)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("analyst", password="x")
+        cls.owner = Owner.objects.create(user=cls.user, owner="Book Owner", address="6 Test Road")
+        car = Vehicle.objects.create(user=cls.user, owner=cls.owner, vehicle_number="ZZ-95-ZZ-0001", vin="BOOK000001",
+                                     vehicle_type="Car", model_year=2021)
+        bike = Vehicle.objects.create(user=cls.user, owner=cls.owner, vehicle_number="ZZ-95-ZZ-0002", vin="BOOK000002",
+                                      vehicle_type="Bike", model_year=2017)
+        cls.car = car
+        essential, premium = "Essential Cover (3 months)", "Premium Protect (12 months)"
+        claimed = cls._policy("POL-BOOK-1", car, essential, date(2025, 1, 1), 3000)
+        cls._policy("POL-BOOK-2", car, premium, date(2025, 2, 1), 12000)
+        bike_policy = cls._policy("POL-BOOK-3", bike, essential, date(2025, 3, 1), 1000)
+        for policy, accident_date in ((claimed, date(2025, 2, 1)), (bike_policy, date(2025, 4, 15))):
+            Accident.objects.create(owner=cls.owner, vehicle=policy.vehicle, policy=policy,
+                                    date_of_accident=accident_date, location="Junction",
+                                    description="Collision", policy_status="Active")
+        Payment.objects.create(user=cls.user, owner=cls.owner, vehicle=car, policy=claimed, payment_id="PAY-BOOK-1",
+                               amount=2000, payment_date=date(2025, 2, 10), payment_method="UPI")
+
+    @classmethod
+    def _policy(cls, number, vehicle, policy_type, start_date, premium):
+        return Policy.objects.create(user=cls.user, owner=cls.owner, vehicle=vehicle, policy_number=number,
+                                     policy_type=policy_type, start_date=start_date,
+                                     end_date=start_date + timedelta(days=100), premium_amount=premium)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_totals_and_ratios(self):
+        analytics = get_analytics(self.user, "365", today=self.TODAY)
+        self.assertEqual(analytics["totals"], {"policies": 3, "claims": 2, "premium": 16000.0, "paid": 2000.0,
+                                               "claim_frequency": 0.6667, "loss_ratio": 0.125})
+        self.assertEqual(
+            [(row["key"], row["policies"], row["claims"], row["paid"], row["loss_ratio"])
+             for row in analytics["by_vehicle_type"]],
+            [("Bike", 1, 1, 0.0, 0.0), ("Car", 2, 1, 2000.0, 0.1333)],
+        )
+        self.assertEqual([row["key"] for row in analytics["by_model_year"]], ["2015-2019", "2020-2024"])
+        self.assertEqual([(row["key"], row["claim_frequency"]) for row in analytics["by_policy_type"]],
+                         [("Essential Cover (3 months)", 1.0), ("Premium Protect (12 months)", 0.0)])
+        months = {row["month"]: (row["accidents"], row["paid"]) for row in analytics["monthly"]}
+        self.assertEqual((months["2025-02"], months["2025-04"], months["2025-05"]), ((1, 2000.0), (1, 0.0), (0, 0.0)))
+
+    def test_window_excludes_older_cohorts(self):
+        totals = get_analytics(self.user, "100", today=self.TODAY)["totals"]
+        self.assertEqual((totals["policies"], totals["premium"]), (1, 1000.0))
+
+    def test_data_version_bump_invalidates_the_cached_result(self):
+        self.assertEqual(get_analytics(self.user, "all", today=self.TODAY)["totals"]["policies"], 3)
+        self._policy("POL-BOOK-4", self.car, "Essential Cover (3 months)", date(2025, 5, 1), 3000)
+        with self.assertNumQueries(0):
+            cached = get_analytics(self.user, "all", today=self.TODAY)
+        self.assertEqual(cached["totals"]["policies"], 3)
+        bump_data_version(self.user)
+        self.assertEqual(get_analytics(self.user, "all", today=self.TODAY)["totals"]["policies"], 4)
+
+
+class PremiumTests(TestCase):
+    """quote_premium against hand-worked premiums, and reprice_policies writing back only the changes."""
+
+    START = date(2025, 6, 1)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("pricer", password="x")
+        cls.owner = Owner.objects.create(user=cls.user, owner="Settled Driver", address="7 Test Road",
+                                         dob=date(1990, 1, 1))  # 35 on START: factor 1.00
+        young = Owner.objects.create(user=cls.user, owner="New Driver", address="8 Test Road",
+                                     dob=date(2003, 1, 1))  # 22 on START: factor 1.50
+        cls.vehicles = {}
+        for owner, vehicle_type, model_year in ((cls.owner, "Sedan", 2023), (cls.owner, "SUV", 2015),
+                                                (cls.owner, "Bike", 2024), (young, "Hatchback", 2020)):
+            cls.vehicles[vehicle_type] = Vehicle.objects.create(
+                user=cls.user, owner=owner, vehicle_number=f"ZZ-94-ZZ-{len(cls.vehicles):04d}",
+                vin=f"PRICE{len(cls.vehicles):05d}", vehicle_type=vehicle_type, model_year=model_year)
+
+    def _quote(self, vehicle_type, policy_type):
+        return quote_premium(self.user, self.vehicles[vehicle_type].id, policy_type, self.START)
+
+    def _policy(self, number, vehicle_type, premium):
+        vehicle = self.vehicles[vehicle_type]
+        return Policy.objects.create(user=self.user, owner=vehicle.owner, vehicle=vehicle, policy_number=number,
+                                     policy_type="Essential Cover (3 months)", start_date=self.START,
+                                     end_date=self.START + timedelta(days=100), premium_amount=premium)
+
+    def test_quotes(self):
+        # base x vehicle type x vehicle age x owner age x claims
+        expected = {
+            ("Sedan", "Essential Cover (3 months)"): Decimal("3795.00"),  # 3000 x 1.15 x 1.10 (2 years old)
+            ("SUV", "Premium Protect (12 months)"): Decimal("12285.00"),  # 9000 x 1.30 x 1.05 (10 years old)
+            ("Bike", "Standard Shield (6 months)"): Decimal("4840.00"),  # 5500 x 0.80 x 1.10 (1 year old)
+            ("Hatchback", "Essential Cover (3 months)"): Decimal("4500.00"),  # 3000 x 1.00 x 1.00 x 1.50
+        }
+        for (vehicle_type, policy_type), premium in expected.items():
+            with self.subTest(vehicle_type=vehicle_type, policy_type=policy_type):
+                self.assertEqual(self._quote(vehicle_type, policy_type), premium)
+
+    def test_recent_claims_load_the_quote(self):
+        policy = self._policy("POL-PRICE-CLAIM", "Sedan", 3795)
+        Accident.objects.create(owner=self.owner, vehicle=policy.vehicle, policy=policy,
+                                date_of_accident=date.today() - timedelta(days=30), location="Ring Road",
+                                description="Collision", policy_status="Active")
+        self.assertEqual(self._quote("Sedan", "Essential Cover (3 months)"), Decimal("4743.75"))  # x 1.25
+        with self.assertRaises(ValueError):
+            quote_premium(self.user, 0, "Essential Cover (3 months)", self.START)
+
+    def test_reprice_updates_only_changed_premiums(self):
+        current = self._policy("POL-PRICE-1", "Sedan", Decimal("3795.00"))
+        outdated = self._policy("POL-PRICE-2", "Hatchback", Decimal("1000.00"))
+        policies = Policy.objects.filter(user=self.user)
+
+        summary = reprice_policies(policies, today=self.START, dry_run=True)
+        self.assertEqual((summary["policies"], summary["repriced"]), (2, 1))
+        self.assertEqual(Policy.objects.get(pk=outdated.pk).premium_amount, Decimal("1000.00"))
+
+        with CaptureQueriesContext(connection) as ctx:
+            summary = reprice_policies(policies, today=self.START)
+        self.assertEqual((summary["repriced"], summary["premium_before"], summary["premium_after"]),
+                         (1, 4795.0, 8295.0))
+        updates = [query["sql"] for query in ctx.captured_queries if "UPDATE" in query["sql"]]
+        self.assertEqual(len(updates), 1, "Changed premiums are written with one executemany UPDATE.")
+        self.assertEqual(Policy.objects.get(pk=outdated.pk).premium_amount, Decimal("4500.00"))
+        self.assertEqual(Policy.objects.get(pk=current.pk).premium_amount, Decimal("3795.00"))
+
+
+@override_settings(CHART_WORKERS=1)
+class ChartViewTests(TestCase):
+    """The dashboard chart views' back-pressure and conditional responses."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("charter", password="x")
+        owner = Owner.objects.create(user=cls.user, owner="Chart Owner", address="9 Test Road")
+        vehicle = Vehicle.objects.create(user=cls.user, owner=owner, vehicle_number="ZZ-93-ZZ-0001", vin="CHART00001")
+        policy = Policy.objects.create(user=cls.user, owner=owner, vehicle=vehicle, policy_number="POL-CHART",
+                                       policy_type="Essential Cover (3 months)", start_date=date(2025, 1, 1),
+                                       end_date=date(2025, 4, 10), premium_amount=3000)
+        accident = Accident.objects.create(owner=owner, vehicle=vehicle, policy=policy,
+                                           date_of_accident=date(2025, 2, 1), location="Bridge",
+                                           description="Collision", policy_status="Active")
+        Payment.objects.create(user=cls.user, owner=owner, vehicle=vehicle, policy=policy, accident=accident,
+                               payment_id="PAY-CHART-1", amount=1000, payment_method="UPI")
+
+    def setUp(self):
+        charts.chart_cache.clear()
+        self.client.force_login(self.user)
+
+    def _hold_every_slot(self):
+        """Take all of the chart pool's admission slots until the test ends, as a burst of renders would."""
+        _, slots = charts._get_pool()
+        held = 0
+        while slots.acquire(blocking=False):
+            held += 1
+        self.addCleanup(lambda: [slots.release() for _ in range(held)])
+
+    def test_saturated_pool_answers_503_with_retry_after(self):
+        self._hold_every_slot()
+        response = self.client.get(reverse("bar_chart"))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], str(charts.BUSY_RETRY_AFTER))
+        self.assertNotIn("ETag", response)
+
+    @override_settings(CHART_WORKERS=0)
+    def test_if_none_match_answers_304_without_rendering(self):
+        etag = self.client.get(reverse("bar_chart"))["ETag"]
+        with mock.patch("insapp.views.get_chart_png", side_effect=AssertionError("rendered")) as render:
+            response = self.client.get(reverse("bar_chart"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        render.assert_not_called()
+
+    @override_settings(CHART_WORKERS=0)
+    def test_etag_changes_with_the_data(self):
+        before = self.client.get(reverse("bar_chart"))["ETag"]
+        policy = Policy.objects.get(policy_number="POL-CHART")
+        with self.captureOnCommitCallbacks(execute=True):  # the write's data-version bump
+            Policy.objects.create(user=self.user, owner=policy.owner, vehicle=policy.vehicle,
+                                  policy_number="POL-CHART-2", policy_type=policy.policy_type,
+                                  start_date=policy.start_date, end_date=policy.end_date, premium_amount=3000)
+        response = self.client.get(reverse("bar_chart"), HTTP_IF_NONE_MATCH=before)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], before)
+        self.assertEqual(response["Content-Type"], "image/png")
+
+
+class QueryInstrumentationTests(TestCase):
+    """The Server-Timing header and slow-request log record for a view with a known query pattern."""
+
+    def _view(self, request):
+        # Six runs of one statement (an N+1 at REPEAT_THRESHOLD 5) and one other.
+        for _ in range(6):
+            User.objects.filter(username="nobody").first()
+        Owner.objects.exists()
+        return HttpResponse("ok")
+
+    def _get(self, **config):
+        with override_settings(SQL_INSTRUMENTATION={"SAMPLE_RATE": 1.0, "REPEAT_THRESHOLD": 5,
+                                                    "TOP_STATEMENTS": 2, **config}):
+            middleware = QueryInstrumentationMiddleware(self._view)
+        return middleware(RequestFactory().get("/instrumented/"))
+
+    def test_server_timing_counts_the_queries(self):
+        response = self._get(SLOW_REQUEST_MS=60_000)
+        self.assertRegex(response["Server-Timing"], r'^db;dur=[0-9.]+;desc="7 queries", app;dur=[0-9.]+$')
+
+    def test_slow_request_log_record(self):
+        with self.assertLogs("insapp.sql", "WARNING") as logs:
+            self._get(SLOW_REQUEST_MS=0)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual((record["event"], record["method"], record["path"], record["status"], record["queries"]),
+                         ("slow_request", "GET", "/instrumented/", 200, 7))
+        self.assertEqual(len(record["slowest"]), 2)
+        self.assertEqual([(entry["count"], "auth_user" in entry["sql"]) for entry in record["repeated"]], [(6, True)])
+
+    def test_fast_requests_are_not_logged(self):
+        with self.assertNoLogs("insapp.sql", "WARNING"):
+            self._get(SLOW_REQUEST_MS=60_000)
+
+
+class ExportContentTests(TestCase):
+    """What the export endpoints stream: header, rows, CSV escaping and tenant isolation."""
+
+    OWNER_NAME = 'Ivy "Quick", Jr.\nRoad Ops'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("exporter", password="x")
+        other = User.objects.create_user("other-exporter", password="x")
+        for user, name, count in ((cls.user, cls.OWNER_NAME, 3), (other, "Someone Else", 2)):
+            owner = Owner.objects.create(user=user, owner=name, address="10 Test Road", phone_number="+91 9")
+            vehicle = Vehicle.objects.create(user=user, owner=owner, vehicle_number=f"ZZ-92-{user.username[:2]}-0001",
+                                             vin=f"EXPORT{user.pk:04d}")
+            for n in range(count):
+                Policy.objects.create(user=user, owner=owner, vehicle=vehicle,
+                                      policy_number=f"POL-EXPORT-{user.username}-{n}",
+                                      policy_type="Essential Cover (3 months)", start_date=date(2025, 1, 1 + n),
+                                      end_date=date(2025, 4, 10 + n), premium_amount=3000)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def _body(self, params):
+        response = self.client.get(reverse("export_policies"), params)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode()
+
+    def test_csv_header_rows_and_escaping(self):
+        rows = list(csv.reader(io.StringIO(self._body({}))))
+        self.assertEqual(tuple(rows[0]), tuple(header for header, _ in exporter.EXPORTS["policies"]["columns"]))
+        self.assertEqual([row[1] for row in rows[1:]], [f"POL-EXPORT-exporter-{n}" for n in range(3)])
+        owner_column = rows[0].index("owner")
+        self.assertEqual({row[owner_column] for row in rows[1:]}, {self.OWNER_NAME})
+
+    def test_ndjson_excludes_other_tenants(self):
+        rows = [json.loads(line) for line in self._body({"format": "ndjson"}).splitlines()]
+        self.assertEqual(len(rows), 3)
+        self.assertTrue(all(row["policy_number"].startswith("POL-EXPORT-exporter-") for row in rows))
+        self.assertEqual({row["owner"] for row in rows}, {self.OWNER_NAME})
+
+    def test_lines_are_streamed_in_blocks(self):
+        with mock.patch.object(exporter, "LINES_PER_WRITE", 2):
+            queryset = exporter.export_queryset(self.user, "policies")
+            blocks = list(exporter.export_lines(queryset, "policies", "csv", chunk_size=1))
+        self.assertEqual([block.count("POL-EXPORT") for block in blocks], [1, 2])
+
+
+class AccidentSearchTests(TestCase):
+    """insapp.search: the /filter/ cursor format, tab counts and keyset paging."""
+
+    TODAY = date(2025, 6, 1)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("searcher", password="x")
+        other = User.objects.create_user("other-searcher", password="x")
+        for user, days_ago in ((cls.user, (5, 5, 5, 50, 200, 1000, 5000)), (other, (5,))):
+            owner = Owner.objects.create(user=user, owner=f"{user.username} owner", address="11 Test Road")
+            vehicle = Vehicle.objects.create(user=user, owner=owner, vehicle_number=f"ZZ-91-{user.pk:02d}-0001",
+                                             vin=f"SEARCH{user.pk:04d}")
+            policy = Policy.objects.create(user=user, owner=owner, vehicle=vehicle, policy_number=f"POL-SEARCH-{user.pk}",
+                                           policy_type="Essential Cover (3 months)", start_date=date(2010, 1, 1),
+                                           end_date=date(2030, 1, 1), premium_amount=3000)
+            for days in days_ago:
+                Accident.objects.create(owner=owner, vehicle=vehicle, policy=policy,
+                                        date_of_accident=cls.TODAY - timedelta(days=days), location="Crossing",
+                                        description="Collision", policy_status="Active")
+
+    def test_cursor_round_trip(self):
+        self.assertEqual(encode_cursor(date(2025, 5, 27), 12), "2025-05-27.12")
+        self.assertEqual(decode_cursor("2025-05-27.12"), (date(2025, 5, 27), 12))
+
+    def test_malformed_cursors_are_ignored(self):
+        for cursor in (None, "", "2025-05-27", "2025-13-01.1", "2025-05-27.x", "12.2025-05-27", "2025-05-27.1.2"):
+            with self.subTest(cursor=cursor):
+                self.assertIsNone(decode_cursor(cursor))
+
+    def test_bucket_counts(self):
+        counts = bucket_counts(user_accidents(self.user), self.TODAY)
+        self.assertEqual(counts, {"10": 3, "100": 4, "365": 5, "3650": 6, "all": 7})
+
+    def test_pages_split_rows_that_share_a_date(self):
+        expected = list(user_accidents(self.user).order_by("-date_of_accident", "-id").values_list("id", flat=True))
+        pages, cursor = [], None
+        while True:
+            result = search_accidents(self.user, cursor=cursor, page_size=2, today=self.TODAY)
+            pages.append([accident.id for accident in result["accidents"]])
+            self.assertEqual(result["total_count"], 7)
+            cursor = result["next_cursor"]
+            if not cursor:
+                break
+        self.assertEqual([len(page) for page in pages], [2, 2, 2, 1])
+        self.assertEqual([accident_id for page in pages for accident_id in page], expected)
+
+    def test_time_range_narrows_the_page_and_total(self):
+        result = search_accidents(self.user, time_range="100", today=self.TODAY)
+        self.assertEqual((result["total_count"], len(result["accidents"]), result["next_cursor"]), (4, 4, None))
+        self.assertEqual(result["bucket_counts"]["all"], 7)
+
+
+class ScratchDatabaseMixin:
+    """
+    Adds a migrated scratch SQLite file as database `scratch_alias` for the test
+    class, with scratch_settings() applied during each test. Unlike the configured replicas and
+    shards, it is a separate database in tests too (no TEST MIRROR).
+    """
+
+    scratch_alias = None
+
+    @classmethod
+    def scratch_settings(cls):
+        return {}
+
+    @classmethod
+    def setUpClass(cls):
+        # Registered after the runner's checks, which only know the configured aliases.
+        super().setUpClass()
+        cls._scratch_dir = tempfile.TemporaryDirectory()
+        connections.settings[cls.scratch_alias] = {
+            **connections.settings["default"], "TEST": {"MIRROR": None},
+            "NAME": os.path.join(cls._scratch_dir.name, f"{cls.scratch_alias}.sqlite3"),
+        }
+        cls.databases = cls.databases | {cls.scratch_alias}
+        call_command("migrate", database=cls.scratch_alias, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        del cls.databases
+        connections[cls.scratch_alias].close()
+        del connections[cls.scratch_alias]
+        del connections.settings[cls.scratch_alias]
+        cls._scratch_dir.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        # Per test, so it is off again for the flush after a TransactionTestCase: the routers
+        # let no tables be flushed (or migrated) on a replica.
+        scratch_settings = override_settings(**self.scratch_settings())
+        scratch_settings.enable()
+        self.addCleanup(scratch_settings.disable)
+
+
+class SequenceTests(TestCase):
+    """insapp.sequences: block reservation and seeding a new counter from existing numbers."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("sequencer", password="x")
+        cls.owner = Owner.objects.create(user=cls.user, owner="Sequence Owner", address="5 Test Road")
+
+    def _policy(self, number, payment_id=None):
+        vehicle = Vehicle.objects.create(user=self.user, owner=self.owner, vehicle_number=f"ZZ-96-ZZ-{number[-4:]}",
+                                         vin=f"SEQ{number[-7:]:0>7}")
+        policy = Policy.objects.create(user=self.user, owner=self.owner, vehicle=vehicle, policy_number=number,
+                                       policy_type="Essential Cover (3 months)", start_date=date(2025, 1, 1),
+                                       end_date=date(2025, 4, 10), premium_amount=3000)
+        if payment_id:
+            Payment.objects.create(user=self.user, owner=self.owner, vehicle=vehicle, policy=policy,
+                                   payment_id=payment_id, amount=100, payment_method="UPI")
+
+    def test_blocks_are_contiguous_and_disjoint(self):
+        first = sequences.reserve("test_sequence", 5)
+        second = sequences.reserve("test_sequence", 3)
+        self.assertEqual((list(first), list(second)), ([1, 2, 3, 4, 5], [6, 7, 8]))
+        self.assertEqual(sequences.peek("test_sequence"), 9)
+        with self.assertRaises(ValueError):
+            sequences.reserve("test_sequence", 0)
+
+    def test_new_counters_start_after_existing_numbers(self):
+        Sequence.objects.filter(name__in=[sequences.POLICY_SEQUENCE, sequences.PAYMENT_SEQUENCE]).delete()
+        self._policy("POL999", payment_id="PAY-00000041")
+        self._policy("POL1000", payment_id="PAY-ABC123")  # the old 6-character form is never reissued
+        self._policy("POL-SPARE-1", payment_id="PAY-00000007")
+
+        self.assertEqual(sequences.preview_policy_number(), "POL1001")
+        self.assertEqual(sequences.allocate_policy_numbers(2), ["POL1001", "POL1002"])
+        self.assertEqual(sequences.allocate_payment_ids(2), ["PAY-00000042", "PAY-00000043"])
+
+    def test_new_policy_counter_starts_at_the_floor(self):
+        Sequence.objects.filter(name=sequences.POLICY_SEQUENCE).delete()
+        Policy.objects.all().delete()
+        self.assertEqual(sequences.allocate_policy_number(), f"POL{sequences.POLICY_NUMBER_START}")
+
+
+class SequenceConcurrencyTests(ScratchDatabaseMixin, TransactionTestCase):
+    """
+    Concurrent reservations from separate connections never hand out the same
+    value. The threads use the scratch SQLite file as their default database: the
+    in-memory test database's shared cache fails lock waits instead of queueing them.
+    """
+
+    scratch_alias = "test_sequences"
+
+    def setUp(self):
+        super().setUp()
+        # Only connections opened from now on (the worker threads') see the file.
+        threads_settings = mock.patch.dict(connections.settings["default"],
+                                           NAME=connections.settings[self.scratch_alias]["NAME"])
+        threads_settings.start()
+        self.addCleanup(threads_settings.stop)
+
+    def test_concurrent_allocations_are_unique(self):
+        def allocate(worker):
+            try:
+                numbers, payment_ids = [], []
+                for _ in range(10):
+                    numbers.append(sequences.allocate_policy_number())
+                    payment_ids.extend(sequences.allocate_payment_ids(1 + worker % 3))
+                return numbers, payment_ids
+            finally:
+                connection.close()  # each thread has its own connection
+
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            results = list(pool.map(allocate, range(6)))
+
+        numbers = [number for batch, _ in results for number in batch]
+        payment_ids = [payment_id for _, batch in results for payment_id in batch]
+        self.assertEqual(len(set(numbers)), len(numbers))
+        self.assertEqual(len(set(payment_ids)), len(payment_ids))
+        self.assertEqual(len(payment_ids), 10 * sum(1 + worker % 3 for worker in range(6)))
+        # No value was skipped either: every block came from one counter.
+        self.assertEqual(sorted(int(number[3:]) for number in numbers),
+                         list(range(sequences.POLICY_NUMBER_START, sequences.POLICY_NUMBER_START + len(numbers))))
+
+
+class SecondShardMixin(ScratchDatabaseMixin):
+    """Adds a migrated scratch SQLite database as a second tenant shard for the test class."""
+
+    shard = scratch_alias = "test_shard"
+
+    @classmethod
+    def scratch_settings(cls):
+        return {"DATABASE_SHARDS": ["default", cls.shard]}
+
+    def setUp(self):
+        super().setUp()
+        # Placements are cached outside the test transactions.
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def place(self, user, alias):
+        """Record `user` as a tenant of `alias`, as shard_map would for a new user hashed there."""
+        sharding._ensure_users(alias, [user.id])
+        TenantShard.objects.update_or_create(user=user, defaults={"shard": alias})
+        sharding.forget(user)
+
+
+class ReplicaRoutingTests(ScratchDatabaseMixin, TransactionTestCase):
+    """
+    PrimaryReplicaRouter with a replica that really is another database. Not a
+    TestCase: reads inside a transaction on the primary never go to a replica.
+    """
+
+    scratch_alias = "test_replica"
+
+    @classmethod
+    def scratch_settings(cls):
+        return {"DATABASE_REPLICAS": [cls.scratch_alias], "REPLICA_STICKY_SECONDS": 15}
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user("replica-reader", password="x")
+        self.user.save(using=self.scratch_alias)
+        # Rows only the replica has, and only the primary has: what a lagging replica looks like.
+        Owner.objects.using(self.scratch_alias).create(user=self.user, owner="Rhea Replica", address="Road")
+        Owner.objects.using("default").create(user=self.user, owner="Rhea Primary", address="Road")
+        self.client.force_login(self.user)
+
+    def _typeahead(self, query):
+        response = self.client.get(reverse("typeahead"), {"q": query, "kind": "owner"})
+        return sorted(result["label"].split(" (")[0] for result in response.json()["results"])
+
+    def test_reads_go_to_the_replica(self):
+        self.assertEqual(self._typeahead("Rhea"), ["Rhea Replica"])
+        self.assertNotIn(PIN_COOKIE, self.client.cookies)
+
+    def test_a_write_pins_the_client_to_the_primary(self):
+        response = self.client.post(reverse("owners"), {"owner": "Rhea Written", "address": "Road",
+                                                        "phoneNumber": "+91 1"})
+        self.assertEqual(int(response.cookies[PIN_COOKIE]["max-age"]), 15)
+        self.assertEqual(self._typeahead("Rhea"), ["Rhea Primary", "Rhea Written"])
+
+        del self.client.cookies[PIN_COOKIE]  # the sticky window has passed
+        self.assertEqual(self._typeahead("Rhea"), ["Rhea Replica"])
+
+    def test_post_handlers_write_to_the_primary(self):
+        self.client.post(reverse("owners"), {"owner": "Rhea Posted", "address": "Road", "phoneNumber": "+91 2"})
+        self.assertTrue(Owner.objects.using("default").filter(owner="Rhea Posted").exists())
+        self.assertFalse(Owner.objects.using(self.scratch_alias).filter(owner="Rhea Posted").exists())
+
+
+class ImporterTests(SecondShardMixin, TestCase):
+    """insapp.importer: validation, duplicate checks, owner resolution and both formats."""
+
+    HEADER = "owner_id,owner,phone_number,address,dob,vehicle_number,vin,title,model_name,model_year,vehicle_type," \
+             "policy_type,start_date\n"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("importer", password="x")
+        cls.other = User.objects.create_user("other-importer", password="x")
+        cls.owner = Owner.objects.create(user=cls.user, owner="Known Owner", address="1 Road", phone_number="+91 1")
+        cls.foreign_owner = Owner.objects.create(user=cls.other, owner="Foreign", address="2 Road", phone_number="+91 2")
+
+    def setUp(self):
+        super().setUp()
+        self.place(self.user, "default")
+        self.place(self.other, "default")
+
+    def _csv(self, *rows, user=None):
+        return import_file(user or self.user, io.BytesIO((self.HEADER + "".join(rows)).encode()), "csv",
+                           today=date(2025, 6, 1))
+
+    def test_creates_owners_vehicles_and_policies(self):
+        summary = self._csv(
+            ",Asha Rao,+91 98,3 Lane,1990-02-01,KA-01-AB-0001,IMPVIN0001,,Swift,2020,Hatchback,"
+            "Premium Protect (12 months),2025-01-01\n",
+            ",Asha Rao,+91 98,3 Lane,1990-02-01,KA-01-AB-0002,IMPVIN0002,,City,2019,Sedan,,\n",
+            f"{self.owner.id},,,,,KA-01-AB-0003,IMPVIN0003,,Nexon,2022,SUV,,\n",
+        )
+        self.assertEqual({key: summary[key] for key in ("rows", "owners", "vehicles", "policies", "rejected")},
+                         {"rows": 3, "owners": 1, "vehicles": 3, "policies": 1, "rejected": 0})
+        self.assertEqual(Owner.objects.filter(user=self.user, owner="Asha Rao").count(), 1)
+        self.assertEqual(Vehicle.objects.get(vehicle_number="KA-01-AB-0003").owner, self.owner)
+        policy = Policy.objects.get(vehicle__vehicle_number="KA-01-AB-0001")
+        self.assertEqual((policy.end_date, policy.status), (date(2026, 1, 6), "active"))  # 12 x 30 days + 10 days' grace
+        self.assertGreater(policy.premium_amount, 0)
+
+    def test_reuses_an_existing_owner_by_name_and_phone(self):
+        summary = self._csv(",Known Owner,+91 1,Elsewhere,,KA-01-AB-0004,IMPVIN0004,,Alto,2018,Hatchback,,\n")
+        self.assertEqual((summary["owners"], summary["vehicles"]), (0, 1))
+        self.assertEqual(Vehicle.objects.get(vehicle_number="KA-01-AB-0004").owner, self.owner)
+
+    def test_rejects_invalid_rows_with_their_line_numbers(self):
+        summary = self._csv(
+            ",A,+91 3,Road,,KA-1-AB-1,IMPVIN0005,,Alto,2018,Hatchback,,\n",
+            ",A,+91 3,Road,,KA-01-AB-0006,SHORT,,Alto,1800,Hatchback,,\n",
+            ",,,,,KA-01-AB-0007,IMPVIN0007,,Alto,2018,Hatchback,Gold Plan,2025-01-01\n",
+            f"{self.foreign_owner.id},,,,,KA-01-AB-0008,IMPVIN0008,,Alto,2018,Hatchback,,\n",
+            ",A,+91 3,Road,,KA-01-AB-0009,IMPVIN0009,,Alto,2018,Hatchback,,\n",
+        )
+        self.assertEqual((summary["vehicles"], summary["rejected"]), (1, 4))
+        errors = {entry["line"]: " ".join(entry["errors"]) for entry in summary["errors"]}
+        self.assertIn("Invalid vehicle number", errors[2])
+        self.assertIn("VIN must be exactly 10 characters", errors[3])
+        self.assertIn("model_year", errors[3])
+        self.assertIn("owner is required", errors[4])
+        self.assertIn("Invalid policy type", errors[4])
+        self.assertIn(f"Owner {self.foreign_owner.id} not found", errors[5])
+
+    def test_rejects_duplicate_vehicle_numbers_and_vins(self):
+        Vehicle.objects.create(user=self.user, owner=self.owner, vehicle_number="KA-01-AB-0010", vin="IMPVIN0010")
+        summary = self._csv(
+            f"{self.owner.id},,,,,KA-01-AB-0010,IMPVIN0011,,Alto,2018,Hatchback,,\n",
+            f"{self.owner.id},,,,,KA-01-AB-0012,IMPVIN0010,,Alto,2018,Hatchback,,\n",
+            f"{self.owner.id},,,,,KA-01-AB-0013,IMPVIN0013,,Alto,2018,Hatchback,,\n",
+            f"{self.owner.id},,,,,KA-01-AB-0013,IMPVIN0014,,Alto,2018,Hatchback,,\n",
+        )
+        errors = {entry["line"]: " ".join(entry["errors"]) for entry in summary["errors"]}
+        self.assertEqual(sorted(errors), [2, 3, 5])
+        self.assertIn("Vehicle number KA-01-AB-0010 already exists", errors[2])
+        self.assertIn("VIN IMPVIN0010 already exists", errors[3])
+        self.assertIn("Vehicle number KA-01-AB-0013 already exists", errors[5])
+
+    def test_vehicle_numbers_are_unique_across_shards(self):
+        Vehicle.objects.create(user=self.user, owner=self.owner, vehicle_number="KA-01-AB-0020", vin="IMPVIN0020")
+        self.place(self.other, self.shard)
+        summary = self._csv(",B,+91 4,Road,,KA-01-AB-0020,IMPVIN0021,,Alto,2018,Hatchback,,\n", user=self.other)
+        self.assertEqual((summary["vehicles"], summary["rejected"]), (0, 1))
+        self.assertFalse(Vehicle.objects.using(self.shard).exists())
+
+    def test_imports_ndjson(self):
+        lines = [
+            json.dumps({"owner": "Nd Owner", "phone_number": "+91 5", "address": "Road", "vehicle_number": "KA-01-AB-0030",
+                        "vin": "IMPVIN0030", "model_name": "i20", "model_year": 2021, "vehicle_type": "Hatchback"}),
+            "",
+            "{not json",
+            json.dumps(["a", "list"]),
+        ]
+        summary = import_file(self.user, io.StringIO("\n".join(lines) + "\n"), "ndjson", today=date(2025, 6, 1))
+        self.assertEqual((summary["vehicles"], summary["rejected"]), (1, 2))
+        errors = {entry["line"]: " ".join(entry["errors"]) for entry in summary["errors"]}
+        self.assertIn("Malformed JSON", errors[3])
+        self.assertIn("must be a JSON object", errors[4])
+        self.assertEqual(Vehicle.objects.get(vehicle_number="KA-01-AB-0030").model_year, 2021)
+
+    def test_view_refuses_files_over_the_upload_limit(self):
+        row = f"{self.owner.id},,,,,KA-01-AB-0040,IMPVIN0040,,Swift,2020,Hatchback,,\n"
+        body = (self.HEADER + row).encode()
+        self.client.force_login(self.user)
+        with override_settings(IMPORT_MAX_UPLOAD_BYTES=len(body) - 1):
+            response = self.client.post(reverse("bulk_import"), {"file": SimpleUploadedFile("big.csv", body)})
+        self.assertEqual(response.status_code, 413)
+        self.assertIn("import_data", response.json()["message"])
+        self.assertFalse(Vehicle.objects.filter(vehicle_number="KA-01-AB-0040").exists())
+        with override_settings(IMPORT_MAX_UPLOAD_BYTES=len(body)):
+            response = self.client.post(reverse("bulk_import"), {"file": SimpleUploadedFile("big.csv", body)})
+        self.assertEqual(response.json()["vehicles"], 1)
+
+
+class ShardingTests(SecondShardMixin, TestCase):
+    """insapp.sharding: tenant placement and move_tenant between two shards."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user("mover", password="x")
+        self.neighbour = User.objects.create_user("neighbour", password="x")
+        self.place(self.user, "default")
+        self.place(self.neighbour, self.shard)
+        # The neighbour's rows take the low ids on the shard, so moved rows must get new ones.
+        self._tenant(self.neighbour, "N")
+        self._tenant(self.user, "M")
+
+    def _tenant(self, user, tag):
+        with sharding.tenant(user):
+            self._create_rows(user, tag)
+
+    def _create_rows(self, user, tag):
+        owner = Owner.objects.create(user=user, owner=f"Owner {tag}", address="Road", phone_number="+91 1")
+        vehicle = Vehicle.objects.create(user=user, owner=owner, vehicle_number=f"KA-01-{tag}-0001",
+                                         vin=f"{tag}SHARDVIN1"[:10])
+        policy = Policy.objects.create(user=user, owner=owner, vehicle=vehicle, policy_number=f"POL-{tag}",
+                                       policy_type="Basic Shield (6 months)", start_date=date(2025, 1, 1),
+                                       end_date=date(2025, 7, 10), premium_amount=1000)
+        accident = Accident.objects.create(owner=owner, vehicle=vehicle, policy=policy, date_of_accident=date(2025, 2, 1),
+                                           location="Junction", description="Dent", policy_status="Active")
+        Payment.objects.create(user=user, owner=owner, vehicle=vehicle, policy=policy, accident=accident,
+                               payment_id=f"PAY-{tag}", amount=500, payment_method="UPI")
+
+    def test_new_tenants_are_placed_and_recorded(self):
+        user = User.objects.create_user("newcomer", password="x")
+        alias = sharding.shard_for(user)
+        self.assertEqual(alias, sharding.placement(user.id))
+        self.assertEqual(TenantShard.objects.get(user=user).shard, alias)
+        self.assertTrue(User.objects.using(alias).filter(pk=user.pk).exists())
+        self.assertEqual(Owner.objects.create(user=user, owner="Placed", address="Road")._state.db, alias)
+
+    def test_move_copies_remaps_and_purges(self):
+        source_vehicle = Vehicle.objects.using("default").get(user=self.user)
+        copied = sharding.move_tenant(self.user, self.shard)
+
+        self.assertEqual(copied, {"owners": 1, "vehicles": 1, "policies": 1, "accidents": 1, "payments": 1,
+                                  "stats": 1})
+        self.assertEqual(sharding.shard_for(self.user), self.shard)
+        self.assertFalse(TenantShard.objects.get(user=self.user).moving)
+        for model in sharding.TENANT_MODELS:
+            self.assertFalse(sharding._tenant_rows(model, "default", self.user.id).exists(), model.__name__)
+
+        payment = Payment.objects.using(self.shard).select_related("owner", "vehicle", "policy", "accident") \
+            .get(payment_id="PAY-M")
+        self.assertNotEqual(payment.vehicle.pk, source_vehicle.pk)
+        self.assertEqual((payment.owner.owner, payment.vehicle.vehicle_number, payment.policy.policy_number),
+                         ("Owner M", "KA-01-M-0001", "POL-M"))
+        self.assertEqual(payment.accident.vehicle_id, payment.vehicle.pk)
+        self.assertEqual(payment.policy.owner_id, payment.owner.pk)
+        self.assertEqual(Vehicle.objects.using(self.shard).filter(user=self.neighbour).count(), 1)
+
+    def test_links_to_old_ids_redirect_after_a_move(self):
+        owner = Owner.objects.using("default").get(user=self.user)
+        vehicle = Vehicle.objects.using("default").get(user=self.user)
+        sharding.move_tenant(self.user, self.shard)
+        sharding.move_tenant(self.user, "default")
+        new_owner = Owner.objects.using("default").get(user=self.user)
+        new_vehicle = Vehicle.objects.using("default").get(user=self.user)
+        self.assertNotEqual(new_owner.pk, owner.pk)
+        self.assertEqual(sharding.moved_id(Owner, owner.pk, self.user), new_owner.pk)
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("update_owner", args=[owner.pk]))
+        self.assertRedirects(response, reverse("update_owner", args=[new_owner.pk]))
+        response = self.client.get(reverse("accidents"), {"owner": owner.pk, "vehicle": vehicle.pk, "x": "1"})
+        self.assertRedirects(response, f"{reverse('accidents')}?owner={new_owner.pk}&vehicle={new_vehicle.pk}&x=1")
+        self.assertEqual(self.client.get(reverse("update_vehicle", args=[10 ** 9])).status_code, 404)
+
+    def test_move_refuses_values_taken_on_the_target(self):
+        Vehicle.objects.using(self.shard).filter(user=self.neighbour).update(vehicle_number="KA-01-M-0001")
+        Payment.objects.using(self.shard).filter(user=self.neighbour).update(payment_id="PAY-M")
+
+        with self.assertRaisesMessage(RuntimeError, "vehicle_number KA-01-M-0001"):
+            sharding.move_tenant(self.user, self.shard)
+        self.assertEqual(sharding.shard_for(self.user), "default")
+        self.assertFalse(TenantShard.objects.get(user=self.user).moving)
+        self.assertFalse(Owner.objects.using(self.shard).filter(user=self.user).exists())
+        self.assertTrue(Owner.objects.using("default").filter(user=self.user).exists())
+
+    def test_purge_leaves_other_tenants(self):
+        sharding.purge_tenant(self.shard, self.neighbour.id)
+        self.assertFalse(Owner.objects.using(self.shard).exists())
+        self.assertFalse(User.objects.using(self.shard).filter(pk=self.neighbour.pk).exists())
+        self.assertEqual(Owner.objects.using("default").filter(user=self.user).count(), 1)
+
+
+class QueryPlanTests(TestCase):
+
+    def test_hot_queries_use_indexes(self):
+        scans = {name: tables for name, _, tables in check_query_plans() if tables}
+        self.assertEqual(scans, {}, "Hot queries fell back to a full table scan.")
+
+
+class SearchIndexTests(TestCase):
+    """The typeahead FTS index: availability probe and its triggers."""
+
+    def setUp(self):
+        self.name = str(connection.settings_dict["NAME"])
+        self.addCleanup(typeahead._fts_available.pop, self.name, None)
+
+    def test_missing_table_is_probed_again(self):
+        typeahead._fts_available[self.name] = time.monotonic() + 60
+        self.assertFalse(typeahead.fts_available())
+        typeahead._fts_available[self.name] = time.monotonic() - 1
+        self.assertTrue(typeahead.fts_available())
+        self.assertIs(typeahead._fts_available[self.name], True)
+
+    def test_check_reports_dropped_triggers(self):
+        self.assertEqual(check_search_triggers(databases=["default"]), [])
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TRIGGER insapp_search_vehicle_au")
+        errors = check_search_triggers(databases=["default"])
+        self.assertEqual([error.id for error in errors], ["insapp.E001"])
+        self.assertIn("insapp_search_vehicle_au", errors[0].msg)
+
+
+class StartupTests(SimpleTestCase):
+
+    def test_import_budget(self):
+        # A fresh interpreter, as a worker boots: this process has long since imported everything.
+        script = (
+            "import json, sys, time\n"
+            "started = time.perf_counter()\n"
+            "import django\n"
+            "django.setup()\n"
+            "import vehicles.urls\n"
+            "print(json.dumps({'ms': (time.perf_counter() - started) * 1000,\n"
+            f"                  'loaded': [m for m in {LAZY_MODULES!r} if m in sys.modules]}}))\n"
+        )
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": os.environ.get("DJANGO_SETTINGS_MODULE", "vehicles.settings")}
+        output = subprocess.run([sys.executable, "-c", script], cwd=settings.BASE_DIR, env=env,
+                                capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        self.assertEqual(result["loaded"], [], "Heavy libraries were imported at boot; import them on first use.")
+        self.assertLessEqual(result["ms"], IMPORT_BUDGET_MS, "Worker boot exceeded the import budget.")
@@ -0,0 +1,137 @@
+import re
+import time
+from typing import Dict, List, Optional, Union
+
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.db.models.expressions import RawSQL
+
+from .models import Owner, Vehicle
+
+KINDS = ("owner", "vehicle")
+MIN_QUERY_LENGTH = 2
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+# Matches read per requested result before ranking.
+CANDIDATE_FACTOR = 5
+
+# Seconds before a database without the FTS table is probed again (it may be migrated meanwhile).
+FTS_PROBE_RETRY = 60
+# Triggers from migration 0006 that keep insapp_search in step with owners and vehicles.
+SEARCH_TRIGGERS = ("insapp_search_owner_ai", "insapp_search_owner_ad", "insapp_search_owner_au",
+                   "insapp_search_vehicle_ai", "insapp_search_vehicle_ad", "insapp_search_vehicle_au")
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+# Database name -> True once the FTS table was found, or the monotonic time a missing table is probed again.
+_fts_available: Dict[str, Union[bool, float]] = {}
+
+
+def _connection():
+    """The connection the current tenant's owners are read from (its shard, or a replica)."""
+    return connections[Owner.objects.db]
+
+
+def fts_available() -> bool:
+    """True when the insapp_search FTS5 table (migration 0006) exists on this connection."""
+    connection = _connection()
+    name = str(connection.settings_dict["NAME"])
+    probe = _fts_available.get(name)
+    if probe is True or (probe is not None and time.monotonic() < probe):
+        return probe is True
+    found = connection.vendor == "sqlite" and "insapp_search" in connection.introspection.table_names()
+    _fts_available[name] = True if found else time.monotonic() + FTS_PROBE_RETRY
+    return found
+
+
+def missing_search_triggers(connection) -> List[str]:
+    """
+    SEARCH_TRIGGERS absent from a database that has the FTS table. Django drops a
+    SQLite table's triggers when a migration rebuilds it, after which the index
+    silently stops following owner and vehicle writes.
+    """
+    if connection.vendor != "sqlite" or "insapp_search" not in connection.introspection.table_names():
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name IN "
+                       "('insapp_owner', 'insapp_vehicle')")
+        present = {row[0] for row in cursor.fetchall()}
+    return [name for name in SEARCH_TRIGGERS if name not in present]
+
+
+def build_match(query: str, user_id: int, kind: Optional[str] = None) -> Optional[str]:
+    """
+    FTS5 MATCH expression: every token of the query as a prefix, restricted to the
+    user's rows (tenant column) and optionally to one kind. None if nothing to search.
+    """
+    tokens = _TOKEN_RE.findall(query)
+    if not tokens:
+        return None
+    terms = " AND ".join(f'"{token}"*' for token in tokens)
+    parts = [f'tenant:"u{int(user_id)}"', f"body:({terms})"]
+    if kind in KINDS:
+        parts.append(f'kind:"{kind}"')
+    return " AND ".join(parts)
+
+
+def _fts_search(match: str, query: str, limit: int) -> List[Dict]:
+    """
+    Read a small candidate window and rank it here. ORDER BY rank would score every
+    match first, which for one-letter prefixes over a large tenant is most rows.
+    """
+    with _connection().cursor() as cursor:
+        cursor.execute(
+            "SELECT kind, obj_id, owner_id, label FROM insapp_search WHERE insapp_search MATCH %s LIMIT %s",
+            [match, limit * CANDIDATE_FACTOR],
+        )
+        rows = cursor.fetchall()
+    needle = query.lower()
+    # Labels that start with the typed text first, then alphabetical.
+    rows.sort(key=lambda row: (not row[3].lower().startswith(needle), row[3].lower()))
+    return [
+        {"kind": kind, "id": obj_id, "owner_id": owner_id, "label": label}
+        for kind, obj_id, owner_id, label in rows[:limit]
+    ]
+
+
+def _fallback_search(user, query: str, kind: Optional[str], limit: int) -> List[Dict]:
+    """Prefix LIKE search for backends without the FTS table."""
+    results: List[Dict] = []
+    if kind in (None, "owner"):
+        owners = (Owner.objects.filter(user=user)
+                  .filter(Q(owner__istartswith=query) | Q(phone_number__startswith=query))
+                  .order_by("owner").values("id", "owner", "phone_number")[:limit])
+        results += [{"kind": "owner", "id": o["id"], "owner_id": o["id"],
+                     "label": f"{o['owner']} ({o['phone_number']})"} for o in owners]
+    if kind in (None, "vehicle"):
+        vehicles = (Vehicle.objects.filter(user=user)
+                    .filter(Q(vehicle_number__istartswith=query) | Q(vin__istartswith=query))
+                    .order_by("vehicle_number").values("id", "owner_id", "vehicle_number", "title")[:limit])
+        results += [{"kind": "vehicle", "id": v["id"], "owner_id": v["owner_id"],
+                     "label": f"{v['vehicle_number']} - {v['title']}"} for v in vehicles]
+    return results[:limit]
+
+
+def typeahead(user, query: str, kind: Optional[str] = None, limit: int = DEFAULT_LIMIT) -> List[Dict]:
+    """
+    Best matches for a partial owner name, phone number, vehicle number or VIN.
+    Each result is {"kind", "id", "owner_id", "label"}.
+    """
+    query = (query or "").strip()
+    limit = max(1, min(limit, MAX_LIMIT))
+    if len(query) < MIN_QUERY_LENGTH:
+        return []
+    if fts_available():
+        match = build_match(query, user.pk, kind)
+        return _fts_search(match, query, limit) if match else []
+    return _fallback_search(user, query, kind, limit)
+
+
+def search_owners(user, query: str) -> QuerySet:
+    """The user's owners matching a search box query (name or phone prefixes)."""
+    owners = Owner.objects.filter(user=user)
+    match = build_match(query, user.pk, "owner") if fts_available() else None
+    if match:
+        return owners.filter(id__in=RawSQL("SELECT obj_id FROM insapp_search WHERE insapp_search MATCH %s", [match]))
+    if fts_available():
+        return owners.none()
+    return owners.filter(owner__icontains=query)
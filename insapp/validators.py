@@ -0,0 +1,11 @@
+import re
+
+VEHICLE_NUMBER_RE = re.compile(r'^[A-Z]{2}-\d{2}-[A-Z]{1,2}-\d{4}$')
+
+
+def is_valid_vin(vin):
+    return len(vin) == 10
+
+
+def is_valid_vehicle_number(number):
+    return bool(VEHICLE_NUMBER_RE.match(number))
@@ -3,47 +3,48 @@ from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.auth.models import User
+from django.conf import settings
 from django.urls import reverse
-from .models import Owner, Vehicle, Policy, Accident , Payment
+from .models import Owner, Vehicle, Policy, Accident
 from django.utils.dateparse import parse_date
-from django.utils import timezone
-import random
+import json
 from datetime import date
-from datetime import datetime, timedelta
-from django.db.models import Max
+from datetime import datetime
 from django.db import IntegrityError
-import re
-from django.urls import reverse
-from django.http import JsonResponse
-from .news import fetch_accident_news 
-import matplotlib.pyplot as plt
-from django.db.models import Count
-from typing import Optional
-import matplotlib
-matplotlib.use('Agg')
-from io import BytesIO 
-from django.http import HttpResponse
-from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse
-from django.shortcuts import render
-from io import BytesIO
-import matplotlib.pyplot as plt
-from django.db.models import Max # Needed for get_next_policy_number
-
-from .models import Owner, Vehicle, Policy, Payment, Accident
-
-
-def _user_has_required_data(user) -> bool:
+from django.http import Http404, JsonResponse
+from asgiref.sync import sync_to_async
+from .news import aget_accident_news
+from .search import search_accidents
+from urllib.parse import urlencode
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import parse_etags, quote_etag
+from .charts import BUSY_RETRY_AFTER, ChartsBusy, data_fingerprint, get_chart_png
+from .stats import batch_stats, get_user_stats
+from .sequences import allocate_policy_number, preview_policy_number
+from .typeahead import DEFAULT_LIMIT as TYPEAHEAD_LIMIT, search_owners, typeahead
+from .ledger import (
+    MAX_STATUS_BATCH, PAGE_SIZE as LEDGER_PAGE_SIZE, POLICY_OPTIONS, POLICY_STATES, policy_end_date,
+    apolicy_statuses, policy_ledger, policy_statuses, serialize_policy, statuses_fingerprint,
+)
+from .validators import is_valid_vehicle_number, is_valid_vin
+from .exporter import FORMATS as EXPORT_FORMATS, export_lines, export_queryset
+from .settlement import ALREADY_PAID, MAX_BATCH as MAX_SETTLEMENT_BATCH, SETTLED, pending_claims, settle_claims
+from .importer import (
+    FIELDS as IMPORT_FIELDS, FORMATS as IMPORT_FORMATS, MAX_UPLOAD_BYTES as IMPORT_MAX_UPLOAD_BYTES, detect_format,
+    import_file,
+)
+from .premiums import MAX_QUOTES, QUOTED, quote_premium, quote_vehicles
+from .analytics import DEFAULT_WINDOW as ANALYTICS_DEFAULT_WINDOW, WINDOWS as ANALYTICS_WINDOWS, get_analytics
+from .routers import replica_reads
+from .sharding import moved_id
+from .fragments import fragment_context
+
+
+def _user_has_required_data(stats) -> bool:
     """
     Return True only if user has at least one owner, vehicle, policy, payment and accident.
     """
-    return (
-        Owner.objects.filter(user=user).exists()
-        and Vehicle.objects.filter(user=user).exists()
-        and Policy.objects.filter(user=user).exists()
-        and Payment.objects.filter(user=user).exists()
-        and Accident.objects.filter(policy__user=user).exists()
-    )
+    return stats.has_required_data()
 
 
 @login_required
@@ -52,15 +53,16 @@ def dashboard_view(request):
     Render explore.html and include dashboard counts only when the user has:
     owners, vehicles, policies, payments and accidents.
     """
-    show_dashboard = _user_has_required_data(request.user)
+    stats = get_user_stats(request.user)
+    show_dashboard = _user_has_required_data(stats)
     context = {"show_dashboard": show_dashboard}
 
     if show_dashboard:
         context.update({
-            "policy_count": Policy.objects.filter(user=request.user).count(),
-            "payment_count": Payment.objects.filter(user=request.user).count(),
-            "owner_count": Owner.objects.filter(user=request.user).count(),
-            "vehicle_count": Vehicle.objects.filter(user=request.user).count(),
+            "policy_count": stats.policy_count,
+            "payment_count": stats.payment_count,
+            "owner_count": stats.owner_count,
+            "vehicle_count": stats.vehicle_count,
         })
 
     return render(request, "explore.html", context)
@@ -69,49 +71,46 @@ def dashboard_view(request):
 def _generate_chart_image(request, chart_type="bar"):
     """
     Internal helper to generate chart image (bar or pie) for the authenticated user.
-    Returns HttpResponse with PNG image or 403 if user lacks required data.
+    Returns HttpResponse with PNG image, 403 if user lacks required data, or 503
+    while the chart workers are saturated.
     """
-    if not _user_has_required_data(request.user):
+    stats = get_user_stats(request.user)
+    if not _user_has_required_data(stats):
         return HttpResponse(status=403)
 
     data = {
-        "Policies": Policy.objects.filter(user=request.user).count(),
-        "Payments": Payment.objects.filter(user=request.user).count(),
-        "Owners": Owner.objects.filter(user=request.user).count(),
-        "Vehicles": Vehicle.objects.filter(user=request.user).count()
+        "Policies": stats.policy_count,
+        "Payments": stats.payment_count,
+        "Owners": stats.owner_count,
+        "Vehicles": stats.vehicle_count,
     }
 
-    labels = list(data.keys())
-    values = list(data.values())
-    colors = ['#3498db', '#e74c3c', '#2ecc71', '#9b59b6']
-
-    plt.figure(figsize=(6, 4), dpi=80)
-
-    if chart_type == "pie":
-        plt.pie(values, labels=labels, autopct='%1.1f%%', startangle=90, colors=colors)
-        plt.title("Proportion of Entities")
+    etag = quote_etag(data_fingerprint(chart_type, data))
+    if etag in parse_etags(request.headers.get("If-None-Match", "")):
+        response = HttpResponseNotModified()
     else:
-        bars = plt.bar(labels, values, color=colors)
-        plt.title("Entity Counts")
-        plt.ylabel("Count")
-        for bar in bars:
-            yval = bar.get_height()
-            plt.text(bar.get_x() + bar.get_width() / 2, yval + 0.5, str(yval), ha='center', va='bottom')
-
-    buffer = BytesIO()
-    plt.savefig(buffer, format='png', bbox_inches='tight')
-    plt.close()
-    buffer.seek(0)
-    return HttpResponse(buffer.getvalue(), content_type='image/png')
+        try:
+            _, png = get_chart_png(request.user.id, chart_type, data)
+        except ChartsBusy:
+            response = HttpResponse("Charts are busy; try again shortly.", status=503, content_type="text/plain")
+            response["Retry-After"] = str(BUSY_RETRY_AFTER)
+            return response
+        response = HttpResponse(png, content_type='image/png')
+    response["ETag"] = etag
+    # Let browsers keep the image but revalidate on every load; unchanged data costs a 304.
+    response["Cache-Control"] = "private, no-cache"
+    return response
 
 
 @login_required
+@replica_reads
 def pie_chart(request):
     """Return pie chart image if user has required data, else 403."""
     return _generate_chart_image(request, chart_type="pie")
 
 
 @login_required
+@replica_reads
 def bar_chart(request):
     """Return bar chart image if user has required data, else 403."""
     return _generate_chart_image(request, chart_type="bar")
@@ -170,6 +169,29 @@ def register(request):
 
 
 
+def _moved_url(request, **models):
+    """
+    For a GET naming ids the user's rows had before rebalance_tenants moved them
+    to another shard (ids are per shard), the same URL with the new ids; else None.
+    models maps the URL kwargs or query parameters holding ids to their models.
+    """
+    if request.method != "GET":
+        return None
+    kwargs, query, moved = dict(request.resolver_match.kwargs), request.GET.copy(), False
+    for name, model in models.items():
+        source = kwargs if name in kwargs else query
+        try:
+            new_id = moved_id(model, int(source.get(name, "")), request.user)
+        except ValueError:
+            continue
+        if new_id:
+            source[name], moved = (new_id if source is kwargs else str(new_id)), True
+    if not moved:
+        return None
+    url = reverse(request.resolver_match.url_name, kwargs=kwargs or None)
+    return f"{url}?{query.urlencode()}" if query else url
+
+
 def home(request):
     return render(request, "home.html")
 
@@ -177,52 +199,37 @@ def explore(request):
     return render(request, "explore.html")  
 
 
-# NOTE: Ensure your models (Policy, Owner, Vehicle) are imported at the top of your views.py file.
-
-# --- Constants (Define these at the top of your views.py) ---
-POLICY_OPTIONS = {
-    "Essential Cover (3 months)": {"term_months": 3, "premium": 3000},
-    "Standard Shield (6 months)": {"term_months": 6, "premium": 5500},
-    "Premium Protect (12 months)": {"term_months": 12, "premium": 9000},
-}
-# -----------------------------------------------------------
-
-def get_next_policy_number():
-    """Generates the next sequential policy number (POLxxxx)."""
-    max_num = Policy.objects.all().aggregate(Max('policy_number'))['policy_number__max']
-    if max_num:
-        try:
-            # Extract the number from the largest existing policy number (e.g., POL1001 -> 1001)
-            num = int(re.search(r'POL(\d+)', max_num).group(1))
-            return f"POL{num + 1}"
-        except (AttributeError, ValueError):
-            return "POL1001"
-    return "POL1001"
-
 @login_required
 def policy(request):
-    owners = Owner.objects.filter(user=request.user)
     selected_owner_id = request.GET.get("owner") or request.POST.get("owner")
+    selected_owner = None
     vehicles = []
-    policies = [] 
+    ledger = None
 
     if selected_owner_id:
+        selected_owner = Owner.objects.filter(id=selected_owner_id, user=request.user).first()
+        moved = selected_owner is None and _moved_url(request, owner=Owner)
+        if moved:
+            return redirect(moved)
         # Fetch vehicles associated with the selected owner for the "Select Vehicle" dropdown
         vehicles = Vehicle.objects.filter(owner_id=selected_owner_id, user=request.user)
-        
-        # Fetch policies associated with the selected owner for the table display
-        all_policies = Policy.objects.filter(owner_id=selected_owner_id, user=request.user).order_by('-start_date')
-        
-        today = date.today()
-        policies_list_for_template = []
-        for p in all_policies:
-            # ANNOTATE: Calculate and attach the active status for the UI
-            p.is_active = p.start_date <= today <= p.end_date
-            policies_list_for_template.append(p)
-        
-        policies = policies_list_for_template # Pass the annotated list
 
-    next_policy_number = get_next_policy_number()
+        # One page of the owner's policies; the active/upcoming/expired state is computed in SQL.
+        if selected_owner:
+            ledger = policy_ledger(
+                request.user,
+                owner_id=selected_owner.id,
+                state=request.GET.get("status"),
+                sort=request.GET.get("sort"),
+                cursor=request.GET.get("cursor"),
+            )
+            # Query strings for the state tabs (keep the sort) and the pager (keep state and sort).
+            ledger["tab_params"] = urlencode({"owner": selected_owner.id, "sort": ledger["sort"]})
+            ledger["page_params"] = urlencode({"owner": selected_owner.id, "sort": ledger["sort"],
+                                               **({"status": ledger["state"]} if ledger["state"] else {})})
+            ledger["is_paged"] = bool(request.GET.get("cursor"))
+            if ledger["next_cursor"]:
+                ledger["next_page_params"] = f"{ledger['page_params']}&{urlencode({'cursor': ledger['next_cursor']})}"
 
     if request.method == "POST":
         policy_type = request.POST.get("policy_type")
@@ -243,27 +250,26 @@ def policy(request):
             messages.error(request, "Invalid policy type selected.")
             return redirect(reverse("policy") + f"?owner={selected_owner_id}")
 
-        term_months = POLICY_OPTIONS[policy_type]["term_months"]
-        premium_amount = POLICY_OPTIONS[policy_type]["premium"]
-        
-        # Calculate end date (approximation, assuming 30 days per month)
-        end_date = start_date + timedelta(days=term_months * 30 + 10) 
+        end_date = policy_end_date(start_date, policy_type)
 
         owner = get_object_or_404(Owner, id=selected_owner_id, user=request.user)
         vehicle = get_object_or_404(Vehicle, id=vehicle_id, owner=owner, user=request.user)
+        premium_amount = quote_premium(request.user, vehicle.id, policy_type, start_date)
 
+        # Reserved only now, so concurrent submits can never be handed the same number.
+        policy_number = allocate_policy_number()
         try:
             Policy.objects.create(
                 user=request.user,
                 owner=owner,
                 vehicle=vehicle,
-                policy_number=next_policy_number,
+                policy_number=policy_number,
                 policy_type=policy_type,
                 start_date=start_date,
                 end_date=end_date,
                 premium_amount=premium_amount
             )
-            messages.success(request, f"Policy {next_policy_number} added successfully for {owner.owner}.")
+            messages.success(request, f"Policy {policy_number} added successfully for {owner.owner}.")
         except IntegrityError:
             messages.error(request, "Policy number already exists. Please try again.")
         
@@ -271,11 +277,13 @@ def policy(request):
         return redirect(reverse("policy") + f"?owner={selected_owner_id}")
 
     return render(request, "policy.html", {
-        "owners": owners,
+        "selected_owner": selected_owner,
         "vehicles": vehicles,
-        "policies": policies, # Annotated list passed to HTML
+        "policies": ledger["policies"] if ledger else [],
+        "ledger": ledger,
+        "ledger_states": POLICY_STATES,
         "selected_owner_id": selected_owner_id,
-        "next_policy_number": next_policy_number,
+        "next_policy_number": preview_policy_number(),
         "policy_types": POLICY_OPTIONS.keys()
     })
 
@@ -292,7 +300,8 @@ def delete_policy(request, policy_id):
     policy_number = policy.policy_number
     # Retain selected owner ID if available for redirection context
     owner_id = policy.owner.id
-    policy.delete()
+    with batch_stats(request.user.id):
+        policy.delete()
     messages.success(request, f"Policy {policy_number} deleted successfully.")
     return redirect(reverse("policy") + f"?owner={owner_id}")
     
@@ -319,12 +328,17 @@ def owners(request):
         return redirect(reverse("owners"))
 
     search_query = request.GET.get("search")
-    owners = Owner.objects.filter(user=request.user, owner__icontains=search_query) if search_query else Owner.objects.filter(user=request.user)
-    return render(request, "owners.html", {"owners": owners})
+    owners = search_owners(request.user, search_query) if search_query else Owner.objects.filter(user=request.user)
+    return render(request, "owners.html", {"owners": owners, **fragment_context(request.user)})
 
 @login_required
 def update_owner(request, owner_id):
-    owner = get_object_or_404(Owner, id=owner_id, user=request.user)
+    owner = Owner.objects.filter(id=owner_id, user=request.user).first()
+    if owner is None:
+        moved = _moved_url(request, owner_id=Owner)
+        if not moved:
+            raise Http404("No Owner matches the given query.")
+        return redirect(moved)
     if request.method == "POST":
         owner.owner = request.POST.get("owner")
         owner.address = request.POST.get("address")
@@ -337,27 +351,27 @@ def update_owner(request, owner_id):
 @login_required
 def delete_owner(request, owner_id):
     owner = get_object_or_404(Owner, id=owner_id, user=request.user)
-    owner.delete()
+    with batch_stats(request.user.id):
+        owner.delete()
     messages.success(request, "Owner deleted successfully.")
     return redirect(reverse("owners"))
 
 # ------------------- VEHICLE -------------------
-def is_valid_vin(vin):
-    return len(vin) == 10
-
-def is_valid_vehicle_number(number):
-    return bool(re.match(r'^[A-Z]{2}-\d{2}-[A-Z]{1,2}-\d{4}$', number))
 
 @login_required
 def vehicles(request):
     vehicle_types = ["SUV", "Sedan", "Hatchback", "Bike", "Auto", "Truck"]
-    owners = Owner.objects.filter(user=request.user)
-    vehicles = Vehicle.objects.filter(user=request.user)
+    vehicles = Vehicle.objects.filter(user=request.user).select_related("owner")
 
     editing_vehicle = None
     edit_id = request.GET.get("edit")
     if edit_id:
-        editing_vehicle = get_object_or_404(Vehicle, id=edit_id, user=request.user)
+        editing_vehicle = Vehicle.objects.select_related("owner").filter(id=edit_id, user=request.user).first()
+        if editing_vehicle is None:
+            moved = _moved_url(request, edit=Vehicle)
+            if not moved:
+                raise Http404("No Vehicle matches the given query.")
+            return redirect(moved)
 
     if request.method == "POST":
         vehicle_id = request.POST.get("vehicle_id")
@@ -410,15 +424,20 @@ def vehicles(request):
         return redirect("vehicles")
 
     return render(request, "vehicle.html", {
-        "owners": owners,
         "vehicles": vehicles,
         "editing_vehicle": editing_vehicle,
         "vehicle_types": vehicle_types,
+        **fragment_context(request.user),
     })
 
 @login_required
 def update_vehicle(request, vehicle_id):
-    vehicle = get_object_or_404(Vehicle, id=vehicle_id, user=request.user)
+    vehicle = Vehicle.objects.filter(id=vehicle_id, user=request.user).first()
+    if vehicle is None:
+        moved = _moved_url(request, vehicle_id=Vehicle)
+        if not moved:
+            raise Http404("No Vehicle matches the given query.")
+        return redirect(moved)
 
     if request.method == "POST":
         vehicle.title = request.POST.get("title")
@@ -453,25 +472,24 @@ def update_vehicle(request, vehicle_id):
         messages.success(request, "Vehicle updated successfully.")
         return redirect("explore")
 
-    owners = Owner.objects.filter(user=request.user)
     vehicle_types = ["SUV", "Sedan", "Hatchback", "Bike", "Auto", "Truck"]
     return render(request, "updatevehicle.html", {
         "vehicle": vehicle,
-        "owners": owners,
         "vehicle_types": vehicle_types,
     })
 
 @login_required
 def delete_vehicle(request, vehicle_id):
     vehicle = get_object_or_404(Vehicle, id=vehicle_id, user=request.user)
-    vehicle.delete()
+    with batch_stats(request.user.id):
+        vehicle.delete()
     messages.success(request, "Vehicle deleted successfully.")
     return redirect("explore")
 
 #------------------- ACCIDENT  -------------------
 @login_required
 def accidents(request):
-    owners = Owner.objects.filter(user=request.user)
+    selected_owner = None
     vehicles = []
     policies = []
 
@@ -479,6 +497,10 @@ def accidents(request):
     selected_vehicle_id = request.GET.get("vehicle") or request.POST.get("vehicle")
 
     if selected_owner_id:
+        selected_owner = Owner.objects.filter(id=selected_owner_id, user=request.user).first()
+        moved = selected_owner is None and _moved_url(request, owner=Owner, vehicle=Vehicle)
+        if moved:
+            return redirect(moved)
         vehicles = Vehicle.objects.filter(owner_id=selected_owner_id, user=request.user)
 
     if selected_vehicle_id:
@@ -524,7 +546,7 @@ def accidents(request):
         return redirect("accidents")
 
     return render(request, "accidents.html", {
-        "owners": owners,
+        "selected_owner": selected_owner,
         "vehicles": vehicles,
         "policies": policies,
         "selected_owner_id": selected_owner_id,
@@ -535,95 +557,279 @@ def accidents(request):
 def payment(request):
     if request.method == "POST":
         policy_id = request.POST.get("policy_id")
-        amount = request.POST.get("amount")
-        payment_date = request.POST.get("payment_date")
-        payment_method = request.POST.get("payment_method")
-        payment_id = request.POST.get("payment_id")
 
         if not policy_id:
             messages.error(request, "Please select a policy.")
             return redirect("payment")
 
-        policy = get_object_or_404(Policy, id=policy_id)
-
-        # Check if payment already exists
-        if Payment.objects.filter(policy=policy).exists():
-            messages.warning(request, f"Payment already exists for Policy {policy.policy_number}.")
-            return redirect("payment")
-
-        # Check if accident exists for this policy
-        accident = Accident.objects.filter(policy=policy).first()
-        if not accident:
-            messages.error(request, f"No accident reported for Policy {policy.policy_number}. Payment requires a valid accident.")
-            return redirect("payment")
-
-        # Check if policy is active at time of accident
-        if not (policy.start_date <= accident.date_of_accident <= policy.end_date):
-            messages.error(request, f"Policy {policy.policy_number} was not active at the time of accident.")
-            return redirect("payment")
-
-        # Create payment
-        Payment.objects.create(
-            user=request.user,
-            owner=policy.owner,
-            vehicle=policy.vehicle,
-            policy=policy,
-            payment_id=payment_id,
-            amount=amount,
-            payment_date=payment_date,
-            payment_method=payment_method
-        )
-
-        messages.success(request, f"Payment recorded successfully. Payment ID: {payment_id}")
+        # Validated, locked and recorded in one transaction by the settlement engine.
+        result = settle_claims(request.user, [{
+            "policy_id": policy_id,
+            "amount": request.POST.get("amount"),
+            "payment_date": request.POST.get("payment_date"),
+            "payment_method": request.POST.get("payment_method"),
+            "payment_id": request.POST.get("payment_id"),
+        }])[0]
+
+        if result["status"] == SETTLED:
+            messages.success(request, result["message"])
+        elif result["status"] == ALREADY_PAID:
+            messages.warning(request, result["message"])
+        else:
+            messages.error(request, result["message"])
         return redirect("payment")
 
     # GET request: show policies
-    policies = Policy.objects.filter(user=request.user)
-    return render(request, "payment.html", {"policies": policies})
+    policies = Policy.objects.filter(user=request.user).select_related("vehicle")
+    return render(request, "payment.html", {"policies": policies, **fragment_context(request.user)})
 
 
 
 @login_required
-def check_policy_status(request):
+async def check_policy_status(request):
     policy_id = request.GET.get("policy_id")
 
     if not policy_id:
         return JsonResponse({"status": "error", "message": "Policy ID is required."}, status=400)
 
     try:
-        policy = Policy.objects.get(id=policy_id, user=request.user)
-    except Policy.DoesNotExist:
+        statuses = await apolicy_statuses(await request.auser(), policy_ids=[int(policy_id)])
+    except ValueError:
+        statuses = []
+    if not statuses:
         return JsonResponse({"status": "error", "message": "Policy not found."}, status=404)
 
-    # Check if accident exists
-    accident_exists = Accident.objects.filter(policy=policy).exists()
+    policy = statuses[0]
+    return JsonResponse({
+        "status": "success",
+        "policy_number": policy["policy_number"],
+        "is_active": policy["is_active"],
+        "has_accident": policy["has_accident"]
+    })
+
+
+def _id_list(values) -> list:
+    """Policy ids from repeated and/or comma-separated ?ids= values."""
+    return [int(part) for value in values for part in value.split(",") if part.strip()]
+
+
+@login_required
+@replica_reads
+def policy_status_batch(request):
+    """
+    Lifecycle, claim and payment state for many policies in one request.
+    Query params: ids (comma-separated and/or repeated, up to 500), owner, vehicle;
+    at least one is required. Supports If-None-Match revalidation for polling clients.
+    """
+    try:
+        policy_ids = _id_list(request.GET.getlist("ids")) if "ids" in request.GET else None
+        owner_id = int(request.GET["owner"]) if request.GET.get("owner") else None
+        vehicle_id = int(request.GET["vehicle"]) if request.GET.get("vehicle") else None
+    except ValueError:
+        return JsonResponse({"status": "error", "message": "ids, owner and vehicle must be integers."}, status=400)
+
+    if policy_ids is None and owner_id is None and vehicle_id is None:
+        return JsonResponse({"status": "error", "message": "Pass ids, owner or vehicle."}, status=400)
+    if policy_ids is not None and len(policy_ids) > MAX_STATUS_BATCH:
+        return JsonResponse(
+            {"status": "error", "message": f"At most {MAX_STATUS_BATCH} policy ids per request."}, status=400
+        )
+
+    statuses = policy_statuses(request.user, policy_ids=policy_ids, owner_id=owner_id, vehicle_id=vehicle_id)
+    etag = quote_etag(statuses_fingerprint(statuses))
+    if etag in parse_etags(request.headers.get("If-None-Match", "")):
+        response = HttpResponseNotModified()
+    else:
+        found = {policy["id"] for policy in statuses}
+        response = JsonResponse({
+            "status": "success",
+            "policies": statuses,
+            "missing": sorted(set(policy_ids) - found) if policy_ids is not None else [],
+        })
+    response["ETag"] = etag
+    # Pollers revalidate every time; an unchanged batch costs one query and an empty 304.
+    response["Cache-Control"] = "private, no-cache"
+    return response
 
-    # Check if policy is active today
-    from datetime import date
-    today = date.today()
-    is_active = policy.start_date <= today <= policy.end_date
 
+@login_required
+@replica_reads
+def typeahead_search(request):
+    """
+    JSON typeahead over the user's owners (name, phone) and vehicles (number, VIN).
+    Query params: q (at least 2 characters), kind=owner|vehicle (optional), limit (max 50).
+    """
+    try:
+        limit = int(request.GET.get("limit", TYPEAHEAD_LIMIT))
+    except ValueError:
+        return JsonResponse({"status": "error", "message": "limit must be an integer."}, status=400)
+
+    results = typeahead(request.user, request.GET.get("q", ""), kind=request.GET.get("kind"), limit=limit)
+    return JsonResponse({"status": "success", "results": results})
+
+
+@login_required
+@replica_reads
+def policy_ledger_api(request):
+    """
+    JSON pages of the user's policy ledger with each policy's active/upcoming/expired state.
+    Query params: owner (optional), status=active|upcoming|expired, sort=start|expiry|-expiry|status,
+    cursor (the previous page's next_cursor), page_size (max 200).
+    """
+    try:
+        owner_id = int(request.GET["owner"]) if request.GET.get("owner") else None
+        page_size = int(request.GET.get("page_size", LEDGER_PAGE_SIZE))
+    except ValueError:
+        return JsonResponse({"status": "error", "message": "owner and page_size must be integers."}, status=400)
+
+    ledger = policy_ledger(
+        request.user,
+        owner_id=owner_id,
+        state=request.GET.get("status"),
+        sort=request.GET.get("sort"),
+        cursor=request.GET.get("cursor"),
+        page_size=page_size,
+    )
     return JsonResponse({
         "status": "success",
-        "policy_number": policy.policy_number,
-        "is_active": is_active,
-        "has_accident": accident_exists
+        "results": [serialize_policy(policy) for policy in ledger["policies"]],
+        "counts": ledger["state_counts"],
+        "total_count": ledger["total_count"],
+        "next_cursor": ledger["next_cursor"],
+        "sort": ledger["sort"],
     })
-    
-    
-    
 
 
+@login_required
+def bulk_import(request):
+    """
+    POST a CSV or NDJSON file as "file" (format from its extension or the "format" field)
+    to import owners, vehicles and policies in bulk. Rows that fail validation are
+    reported with their line numbers; the rest are imported. GET describes the columns.
+    The import runs within the request, so files over IMPORT_MAX_UPLOAD_BYTES are
+    refused with 413; import those with `manage.py import_data`.
+    """
+    if request.method != "POST":
+        return JsonResponse({"status": "success", "formats": IMPORT_FORMATS, "fields": IMPORT_FIELDS,
+                             "max_bytes": getattr(settings, "IMPORT_MAX_UPLOAD_BYTES", IMPORT_MAX_UPLOAD_BYTES)})
+
+    upload = request.FILES.get("file")
+    if upload is None:
+        return JsonResponse({"status": "error", "message": "Upload a file as 'file'."}, status=400)
+    max_bytes = getattr(settings, "IMPORT_MAX_UPLOAD_BYTES", IMPORT_MAX_UPLOAD_BYTES)
+    if upload.size > max_bytes:
+        return JsonResponse({"status": "error", "max_bytes": max_bytes,
+                             "message": f"Files over {max_bytes} bytes are imported with `manage.py import_data`."},
+                            status=413)
+    fmt = request.POST.get("format") or detect_format(upload.name)
+    if fmt not in IMPORT_FORMATS:
+        return JsonResponse({"status": "error", "message": "Format must be csv or ndjson."}, status=400)
+
+    summary = import_file(request.user, upload.file, fmt)
+    return JsonResponse({"status": "success", **summary})
+
+
+@login_required
+def export_data(request, dataset):
+    """
+    Stream the user's accidents, policies or payments as CSV (default) or NDJSON.
+    Takes the /filter/ page's time_range, owner_search and status parameters.
+    """
+    fmt = request.GET.get("format", "csv")
+    if fmt not in EXPORT_FORMATS:
+        return JsonResponse({"status": "error", "message": "format must be csv or ndjson."}, status=400)
+
+    queryset = export_queryset(
+        request.user,
+        dataset,
+        time_range=request.GET.get("time_range"),
+        owner_search=(request.GET.get("owner_search") or "").strip(),
+        status=request.GET.get("status"),
+    )
+    response = StreamingHttpResponse(export_lines(queryset, dataset, fmt), content_type=EXPORT_FORMATS[fmt])
+    response["Content-Disposition"] = f'attachment; filename="{dataset}-{date.today().isoformat()}.{fmt}"'
+    return response
+
+
+@login_required
+def settlements(request):
+    """
+    Batch claim settlement. POST a JSON body {"claims": [{"policy_id", "amount",
+    "payment_date", "payment_method", "payment_id"}, ...]} (up to 5000 claims);
+    every claim gets its own result. GET lists claims awaiting settlement (?limit=, max 500).
+    """
+    if request.method != "POST":
+        try:
+            limit = max(1, min(int(request.GET.get("limit", 100)), 500))
+        except ValueError:
+            return JsonResponse({"status": "error", "message": "limit must be an integer."}, status=400)
+        return JsonResponse({"status": "success", "pending": pending_claims(request.user, limit=limit)})
+
+    try:
+        claims = json.loads(request.body)["claims"]
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({"status": "error", "message": 'Send a JSON body {"claims": [...]}.'}, status=400)
+    if not isinstance(claims, list) or not all(isinstance(claim, dict) for claim in claims):
+        return JsonResponse({"status": "error", "message": "claims must be a list of objects."}, status=400)
+    if len(claims) > MAX_SETTLEMENT_BATCH:
+        return JsonResponse(
+            {"status": "error", "message": f"At most {MAX_SETTLEMENT_BATCH} claims per request."}, status=400
+        )
+
+    results = settle_claims(request.user, claims)
+    settled = sum(1 for result in results if result["status"] == SETTLED)
+    return JsonResponse({
+        "status": "success",
+        "settled": settled,
+        "rejected": len(results) - settled,
+        "results": results,
+    })
+
+
+@login_required
+def premium_quotes(request):
+    """
+    Risk-based premium quotes. POST a JSON body {"quotes": [{"vehicle_id", "policy_type",
+    "start_date"}, ...]} (up to 1000); every request gets its own result with the premium,
+    base premium and risk factors. GET ?vehicle=<id>&start_date= quotes every product
+    for one vehicle; without a vehicle it lists the products and base premiums.
+    """
+    if request.method != "POST":
+        vehicle_id = request.GET.get("vehicle")
+        if not vehicle_id:
+            return JsonResponse({"status": "success", "products": [
+                {"policy_type": name, "term_months": option["term_months"], "base_premium": option["premium"]}
+                for name, option in POLICY_OPTIONS.items()
+            ]})
+        quotes = [{"vehicle_id": vehicle_id, "policy_type": name, "start_date": request.GET.get("start_date")}
+                  for name in POLICY_OPTIONS]
+        return JsonResponse({"status": "success", "results": quote_vehicles(request.user, quotes)})
+
+    try:
+        quotes = json.loads(request.body)["quotes"]
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({"status": "error", "message": 'Send a JSON body {"quotes": [...]}.'}, status=400)
+    if not isinstance(quotes, list) or not all(isinstance(quote, dict) for quote in quotes):
+        return JsonResponse({"status": "error", "message": "quotes must be a list of objects."}, status=400)
+    if len(quotes) > MAX_QUOTES:
+        return JsonResponse({"status": "error", "message": f"At most {MAX_QUOTES} quotes per request."}, status=400)
+
+    results = quote_vehicles(request.user, quotes)
+    quoted = sum(1 for result in results if result["status"] == QUOTED)
+    return JsonResponse({"status": "success", "quoted": quoted, "rejected": len(results) - quoted, "results": results})
+
 
 #------------------- NEWS  -------------------
 
 @login_required
-def news(request):
+async def news(request):
     """
     Render news.html with latest accident-related articles.
+    Async, so a slow news upstream does not hold a worker thread under ASGI.
     """
-    articles = fetch_accident_news(limit=10)
-    return render(request, "news.html", {"articles": articles})
+    articles = await aget_accident_news(limit=10)
+    # Context processors and template tags may touch the session or the database, so render off the event loop.
+    return await sync_to_async(render)(request, "news.html", {"articles": articles})
 
 #------------------- ABOUT  -------------------
 
@@ -641,36 +847,61 @@ def contact_view(request):
 
 #------------------- FILTER  -------------------
 @login_required
+@replica_reads
 def filter_view(request):
+    time_range = request.GET.get("time_range")
+    owner_search = (request.GET.get("owner_search") or "").strip()
+    status_search = request.GET.get("status")
+    cursor = request.GET.get("cursor")
+
+    result = search_accidents(
+        request.user,
+        time_range=time_range,
+        owner_search=owner_search,
+        status=status_search,
+        cursor=cursor,
+    )
 
-    today = timezone.now().date()
+    # Query string shared by the tab links and the "next page" link.
+    filter_params = {k: v for k, v in (("owner_search", owner_search), ("status", status_search)) if v}
+    next_page_params = None
+    if result["next_cursor"]:
+        next_page_params = urlencode({**filter_params, **({"time_range": time_range} if time_range else {}),
+                                      "cursor": result["next_cursor"]})
 
- 
-    time_range = request.GET.get("time_range")   
-    owner_search = request.GET.get("owner_search") 
-    
+    context = {
+        "accidents": result["accidents"],
+        "total_count": result["total_count"],
+        "bucket_counts": result["bucket_counts"],
+        "next_page_params": next_page_params,
+        "is_paged": bool(cursor),
+        "filter_params": urlencode(filter_params),
+        "selected_range": time_range,
+        "owner_search": owner_search,
+        "status_search": status_search,
+    }
+    return render(request, "filter.html", context)
 
-  
-    accidents = Accident.objects.all()
 
-   
-    if time_range == "10":
-        accidents = accidents.filter(date_of_accident__gte=today - timedelta(days=10))
-    elif time_range == "100":
-        accidents = accidents.filter(date_of_accident__gte=today - timedelta(days=100))
-    elif time_range == "365":
-        accidents = accidents.filter(date_of_accident__gte=today - timedelta(days=365))
-    elif time_range == "3650":
-        accidents = accidents.filter(date_of_accident__gte=today - timedelta(days=3650))
+#------------------- ANALYTICS  -------------------
+@login_required
+@replica_reads
+def analytics_view(request):
+    window = request.GET.get("window")
+    window = window if window in ANALYTICS_WINDOWS else ANALYTICS_DEFAULT_WINDOW
+    return render(request, "analytics.html", {"analytics": get_analytics(request.user, window), "window": window})
 
- 
-    if owner_search:
-        accidents = accidents.filter(owner__owner__icontains=owner_search)
 
-    context = {
-        "accidents": accidents,                 
-        "all_accidents": Accident.objects.all(), 
-        "selected_range": time_range,          
-        "owner_search": owner_search,          
-    }
-    return render(request, "filter.html", context)
\ No newline at end of file
+@login_required
+@replica_reads
+def analytics_api(request):
+    """
+    Loss ratio and claim frequency by vehicle type, model-year band and policy type,
+    plus monthly accident and payout trends. Query param: window=10|100|365|3650|all
+    (days of policy start dates; default 365). Cached per user and window.
+    """
+    window = request.GET.get("window", ANALYTICS_DEFAULT_WINDOW)
+    if window not in ANALYTICS_WINDOWS:
+        return JsonResponse({"status": "error",
+                             "message": f"window must be one of {', '.join(ANALYTICS_WINDOWS)}."}, status=400)
+    return JsonResponse({"status": "success", **get_analytics(request.user, window)})
@@ -0,0 +1,70 @@
+"""
+Optional worker warm-up, run from vehicles/wsgi.py and vehicles/asgi.py when
+WARM_UP is set.
+
+Django compiles templates and URL pattern regexes lazily, on the first request
+that needs them. warm_up() does that work before the worker accepts traffic:
+it imports the URLconf (and with it the views), compiles every URL pattern and
+loads every project template into the cached template loader. With
+WARM_UP_CHARTS it also starts the chart worker processes (insapp.charts), so
+Matplotlib and its font cache are loaded before the first chart request.
+"""
+import logging
+import time
+from pathlib import Path
+from typing import Dict
+
+from django.conf import settings
+from django.template import TemplateSyntaxError, engines
+from django.urls import URLResolver, get_resolver
+
+logger = logging.getLogger(__name__)
+
+
+def _compile_patterns(resolver: URLResolver) -> int:
+    count = 0
+    for pattern in resolver.url_patterns:
+        pattern.pattern.regex  # compiled and memoised on first access
+        count += 1
+        if isinstance(pattern, URLResolver):
+            count += _compile_patterns(pattern)
+    return count
+
+
+def compile_url_patterns() -> int:
+    """Compile every URL pattern's regex and build the reverse() lookup; returns the patterns compiled."""
+    resolver = get_resolver()
+    count = _compile_patterns(resolver)
+    resolver.reverse_dict  # populates the reverse lookup for the default language
+    return count
+
+
+def load_templates() -> int:
+    """Parse every template under the project's template directories into the cached loader."""
+    count = 0
+    for engine in engines.all():
+        for directory in getattr(engine, "template_dirs", ()):
+            # Only the project's own templates; Django's apps (admin, ...) keep loading on demand.
+            if not Path(directory).resolve().is_relative_to(Path(settings.BASE_DIR).resolve()):
+                continue
+            for path in sorted(Path(directory).rglob("*.html")):
+                try:
+                    engine.get_template(path.relative_to(directory).as_posix())
+                except TemplateSyntaxError:
+                    logger.exception("Template %s failed to compile during warm-up.", path)
+                    continue
+                count += 1
+    return count
+
+
+def warm_up(charts: bool = False) -> Dict[str, float]:
+    """Run the warm-up steps; returns counts and the elapsed milliseconds."""
+    started = time.perf_counter()
+    summary = {"url_patterns": compile_url_patterns(), "templates": load_templates()}
+    if charts:
+        from .charts import start_chart_pool
+
+        start_chart_pool()
+    summary["ms"] = round((time.perf_counter() - started) * 1000, 1)
+    logger.info("Worker warm-up: %(url_patterns)s URL patterns, %(templates)s templates in %(ms)s ms.", summary)
+    return summary
@@ -14,6 +14,25 @@ except ImportError:
 
 # External API keys
 NEWS_API_KEY = os.getenv("NEWS_API_KEY", "")
+NEWS_API_URL = os.getenv("NEWS_API_URL", "https://newsapi.org/v2/everything")
+NEWS_API_TIMEOUT = int(os.getenv("NEWS_API_TIMEOUT", "6"))
+# News cache (seconds): fresh lifetime, extra window served stale while refreshing, failure backoff
+NEWS_CACHE_TTL = int(os.getenv("NEWS_CACHE_TTL", "600"))
+NEWS_CACHE_STALE_TTL = int(os.getenv("NEWS_CACHE_STALE_TTL", "86400"))
+NEWS_CACHE_ERROR_TTL = int(os.getenv("NEWS_CACHE_ERROR_TTL", "60"))
+# False sends every /news/ request upstream (for load-testing the uncached path only)
+NEWS_CACHE_ENABLED = os.getenv("NEWS_CACHE_ENABLED", "True") == "True"
+# Claims analytics cache lifetime (seconds), per user and window
+ANALYTICS_CACHE_TTL = int(os.getenv("ANALYTICS_CACHE_TTL", "300"))
+# Owners / vehicles / payment table fragments (seconds); a write re-renders them sooner (insapp.fragments)
+FRAGMENT_CACHE_TTL = int(os.getenv("FRAGMENT_CACHE_TTL", "600"))
+# Chart rendering (insapp.charts): worker processes (0 draws in the web process), renders admitted at once
+# per web process before answering 503, and seconds a request waits for its render
+CHART_WORKERS = int(os.getenv("CHART_WORKERS", str(min(2, os.cpu_count() or 1))))
+CHART_QUEUE_SIZE = int(os.getenv("CHART_QUEUE_SIZE", str(4 * max(1, CHART_WORKERS))))
+CHART_RENDER_TIMEOUT = float(os.getenv("CHART_RENDER_TIMEOUT", "10"))
+# Largest file /api/import/ imports within the request (bytes); larger ones go through `manage.py import_data`
+IMPORT_MAX_UPLOAD_BYTES = int(os.getenv("IMPORT_MAX_UPLOAD_BYTES", str(5 * 1024 * 1024)))
 
 # SECURITY
 SECRET_KEY = os.getenv("DJANGO_SECRET_KEY", "django-insecure-v63tybz=+qs1q#&di5hmyn@$57d1wv__dj+$$asuazt1bvrfcq")
@@ -34,14 +53,27 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    # Early, so session/auth queries are counted too.
+    "insapp.middleware.QueryInstrumentationMiddleware",
+    # Before sessions, so session saves pin the client to the primary database.
+    "insapp.middleware.ReplicaRoutingMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    # Binds request.user as the tenant whose shard insapp queries go to.
+    "insapp.middleware.TenantShardMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# Per-request SQL statistics (Server-Timing header + sampled slow-request log on "insapp.sql")
+SQL_INSTRUMENTATION = {
+    "ENABLED": os.getenv("SQL_INSTRUMENTATION", "True") == "True",
+    "SLOW_REQUEST_MS": int(os.getenv("SQL_SLOW_REQUEST_MS", "500")),
+    "SAMPLE_RATE": float(os.getenv("SQL_SLOW_SAMPLE_RATE", "1.0")),
+}
+
 ROOT_URLCONF = "vehicles.urls"
 
 TEMPLATES = [
@@ -60,14 +92,87 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "vehicles.wsgi.application"
+# Same project under an ASGI server (e.g. `uvicorn vehicles.asgi:application`), where async views such as
+# news and check_policy_status wait on the network without holding a worker thread.
+ASGI_APPLICATION = "vehicles.asgi.application"
+# Compile templates and URL patterns before a worker takes traffic (insapp.warmup); _CHARTS also starts the chart pool.
+WARM_UP = os.getenv("DJANGO_WARM_UP", "False") == "True"
+WARM_UP_CHARTS = os.getenv("DJANGO_WARM_UP_CHARTS", "False") == "True"
 
 # Database (SQLite for development)
+# PRAGMAs run on every new connection: WAL lets readers proceed during a write, NORMAL
+# sync is durable in WAL mode except on power loss, mmap/cache sizes are in bytes / KiB
+# (negative), and busy_timeout (ms) makes a writer wait for the lock instead of failing.
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "20000")),
+    "temp_store": "MEMORY",
+}
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        "OPTIONS": {
+            "init_command": ";".join(f"PRAGMA {name}={value}" for name, value in SQLITE_PRAGMAS.items()),
+            # Take the write lock at BEGIN, so a transaction that reads then writes cannot
+            # fail with "database is locked" halfway through; it waits up to busy_timeout instead.
+            "transaction_mode": os.getenv("SQLITE_TRANSACTION_MODE", "IMMEDIATE"),
+            "timeout": SQLITE_PRAGMAS["busy_timeout"] / 1000,
+        },
+        # Reuse a connection for this many seconds instead of reconnecting per request
+        # (set DB_CONN_MAX_AGE=0 under ASGI, where each request gets its own connection).
+        "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", "600")),
+        "CONN_HEALTH_CHECKS": True,
+    }
+}
+
+# Read replicas: comma-separated SQLite files (relative to BASE_DIR) that read-only views
+# read from, kept in sync with `manage.py sync_replica`. Tests mirror them onto the primary.
+DATABASE_REPLICAS = []
+for index, replica_name in enumerate(filter(None, os.getenv("DB_REPLICAS", "").split(",")), start=1):
+    DATABASES[f"replica{index}"] = {
+        **DATABASES["default"],
+        "NAME": BASE_DIR / replica_name.strip(),
+        "OPTIONS": {**DATABASES["default"]["OPTIONS"], "transaction_mode": "DEFERRED"},
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(f"replica{index}")
+# After a write, the client reads from the primary for this long (should exceed the replica lag).
+REPLICA_STICKY_SECONDS = int(os.getenv("REPLICA_STICKY_SECONDS", "15"))
+
+# Tenant shards: comma-separated SQLite files (relative to BASE_DIR) holding users' insapp
+# rows alongside "default" (see insapp.sharding). Migrate each with `migrate --database shardN`.
+DATABASE_SHARDS = ["default"]
+for index, shard_name in enumerate(filter(None, os.getenv("DB_SHARDS", "").split(",")), start=1):
+    DATABASES[f"shard{index}"] = {
+        **DATABASES["default"],
+        "NAME": BASE_DIR / shard_name.strip(),
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_SHARDS.append(f"shard{index}")
+# Tenant -> shard lookups are cached this long (seconds); rebalance_tenants clears a moved tenant's entry.
+SHARD_MAP_CACHE_TTL = int(os.getenv("SHARD_MAP_CACHE_TTL", "300"))
+
+DATABASE_ROUTERS = ["insapp.routers.TenantShardRouter", "insapp.routers.PrimaryReplicaRouter"]
+
+# Cache shared by every worker process: the shard map, news, data versions and page fragments
+# depend on all workers seeing the same entries, so it must not be process-local (LocMemCache).
+# The default is a directory of files, shared by the processes on one host; with several hosts set
+# e.g. DJANGO_CACHE_BACKEND=django.core.cache.backends.redis.RedisCache and DJANGO_CACHE_LOCATION=redis://...
+CACHE_BACKEND = os.getenv("DJANGO_CACHE_BACKEND", "django.core.cache.backends.filebased.FileBasedCache")
+CACHES = {
+    "default": {
+        "BACKEND": CACHE_BACKEND,
+        "LOCATION": os.getenv("DJANGO_CACHE_LOCATION", str(BASE_DIR / "cache")),
     }
 }
+if CACHE_BACKEND.endswith("FileBasedCache"):
+    # Every set beyond the limit scans the directory to cull a third of it.
+    CACHES["default"]["OPTIONS"] = {"MAX_ENTRIES": int(os.getenv("DJANGO_CACHE_MAX_ENTRIES", "20000"))}
 
 # Authentication
 LOGIN_URL = "/login/"
@@ -37,11 +37,24 @@ urlpatterns = [
     # --- UTILITIES & CHARTS ---
     # This is the correct API path definition.
     path('api/check-policy-status/', views.check_policy_status, name='check_policy_status'), 
+    path('api/policy-status/', views.policy_status_batch, name='policy_status_batch'),
+    path('api/typeahead/', views.typeahead_search, name='typeahead'),
+    path('api/policies/', views.policy_ledger_api, name='policy_ledger'),
+    path('api/import/', views.bulk_import, name='bulk_import'),
+    path('api/settlements/', views.settlements, name='settlements'),
+    path('api/quotes/', views.premium_quotes, name='premium_quotes'),
+    path('charts/bar/', views.bar_chart, name='bar_chart'),
+    path('charts/pie/', views.pie_chart, name='pie_chart'),
    
     path('about/', views.about_view, name='about'),
     path('contact/', views.contact_view, name='contact'),
     path('explore/', views.explore, name='explore'),
     path('filter/', views.filter_view, name='filter_view'),
+    path('analytics/', views.analytics_view, name='analytics'),
+    path('api/analytics/', views.analytics_api, name='analytics_api'),
+    path('exports/accidents/', views.export_data, {'dataset': 'accidents'}, name='export_accidents'),
+    path('exports/policies/', views.export_data, {'dataset': 'policies'}, name='export_policies'),
+    path('exports/payments/', views.export_data, {'dataset': 'payments'}, name='export_payments'),
 ]
 
 # Serve static and media files during development